@@ -0,0 +1,163 @@
+"""
+Cache of serialized response bodies keyed by catalog data version.
+"""
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from pydantic import TypeAdapter
+
+from app.compression import compress
+from app.metrics import cache_hits, cache_misses
+from app.schemas import CapabilityDetailResponse, CapabilitySearchResult
+
+_capability_list = TypeAdapter(List[CapabilityDetailResponse])
+_search_results = TypeAdapter(List[CapabilitySearchResult])
+
+
+class CachedResponse(NamedTuple):
+    """Serialized JSON body, its strong ETag and the next page cursor."""
+    body: bytes
+    etag: str
+    next_cursor: Optional[int] = None
+    # Compressed copies of the body per content encoding, made on first use
+    encoded: Optional[Dict[str, bytes]] = None
+
+    def encoded_body(self, encoding: str) -> bytes:
+        """
+        The body compressed with ``encoding``, compressed once per entry.
+        """
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = self.encoded[encoding] = compress(self.body, encoding)
+        return body
+
+
+class ResponseCache:
+    """
+    Holds serialized bodies for the current data version only.
+
+    Entries from an older version are dropped as soon as a newer version is
+    stored, and at most ``max_entries`` pages are kept per version, oldest
+    first out.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._entries: Dict[str, CachedResponse] = {}
+
+    def get(self, version: str, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+        (cache_misses if entry is None else cache_hits).inc()
+        return entry
+
+    def put(self, version: str, key: str, body: bytes, next_cursor=None) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), next_cursor, {})
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries = {}
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries = {}
+
+
+response_cache = ResponseCache()
+
+
+def serialize_capabilities(capabilities, projection=None) -> bytes:
+    """
+    Serialize a list of capability responses to JSON bytes.
+
+    Only the parts of each capability selected by ``projection`` are written.
+    """
+    include = exclude = None
+    if projection is not None:
+        if projection.include is not None:
+            include = {"__all__": projection.include}
+        if projection.exclude is not None:
+            exclude = {"__all__": projection.exclude}
+    return _capability_list.dump_json(list(capabilities), include=include, exclude=exclude)
+
+
+def parse_capabilities(data: bytes) -> List[CapabilityDetailResponse]:
+    """
+    Capability responses from JSON bytes written by ``serialize_capabilities``.
+    """
+    return _capability_list.validate_json(data)
+
+
+def serialize_search_results(results, projection=None) -> bytes:
+    """
+    Serialize search results to JSON bytes; the score is always written.
+    """
+    include = exclude = None
+    if projection is not None:
+        if projection.include is not None:
+            include = {"__all__": projection.include | {"score"}}
+        if projection.exclude is not None:
+            exclude = {"__all__": projection.exclude}
+    return _search_results.dump_json(list(results), include=include, exclude=exclude)
+
+
+def serialize_batch(batch, projection=None) -> bytes:
+    """
+    Serialize a batch lookup response, projecting each capability.
+    """
+    include = exclude = None
+    if projection is not None:
+        if projection.include is not None:
+            include = {
+                "capabilities": {"__all__": projection.include},
+                "missing_names": True,
+                "missing_ids": True,
+            }
+        if projection.exclude is not None:
+            exclude = {"capabilities": {"__all__": projection.exclude}}
+    return batch.model_dump_json(include=include, exclude=exclude).encode()
+
+
+def serialize_capability(capability: CapabilityDetailResponse, projection=None) -> bytes:
+    """
+    Serialize a single capability response to JSON bytes.
+    """
+    if projection is None:
+        return capability.model_dump_json().encode()
+    return capability.model_dump_json(
+        include=projection.include, exclude=projection.exclude
+    ).encode()
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Strong ETag for a response body.
+    """
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an ``If-None-Match`` header against an ETag.
+
+    Uses the weak comparison required for ``If-None-Match``.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,236 @@
+"""
+Parsing of catalog CSVs into table rows.
+
+Kept apart from ``app.seed`` because it needs pandas: the seeder imports it
+only when a source has changed and must be parsed, so a start against an
+up-to-date database never loads pandas.
+"""
+import numpy as np
+import pandas as pd
+
+from app.models import (
+    Goal, Vertical, SubVertical, Capability, Process, ProcessLevel,
+    ProcessCategory, SubProcess, DataEntity, Application, API, DEFAULT_DATASET
+)
+from app.seed import PARTITIONED, SEED_ORDER
+
+# Source columns read by the seeder; missing columns load as empty
+COLUMNS = [
+    "Goal", "Vertical", "Sub-Vertical", "Capability", "Capability Description",
+    "Process", "Process Description", "Process Level", "Process Category",
+    "Sub-Process", "Sub-Process Description", "Data Entity", "Application",
+    "API (Assumption)",
+]
+
+
+def _clean(df: pd.DataFrame, columns: dict = None) -> pd.DataFrame:
+    """
+    Catalog columns of ``df`` as stripped strings, with empty cells as "".
+
+    Headers are renamed through ``columns`` first.
+    """
+    df = df.fillna("")
+    df.columns = df.columns.str.strip()
+    df = df.rename(columns=columns or {}).reindex(columns=COLUMNS, fill_value="")
+    return df.apply(lambda column: column.str.strip())
+
+
+def read_catalog(csv_path: str, columns: dict = None) -> pd.DataFrame:
+    """
+    Read the catalog CSV as stripped strings, with empty cells as "".
+    """
+    return _clean(pd.read_csv(csv_path, dtype=str), columns)
+
+
+def iter_catalog(csv_path: str, chunk_size: int, columns: dict = None):
+    """
+    Read the catalog CSV in chunks of ``chunk_size`` rows, cleaned as by ``read_catalog``.
+    """
+    with pd.read_csv(csv_path, dtype=str, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield _clean(chunk, columns)
+
+
+class IdMap(dict):
+    """
+    Ids of loaded nodes by key, numbering new keys on from ``start``.
+    """
+
+    def __init__(self, start: int = 1):
+        super().__init__()
+        self.next_id = start
+
+    def add(self, key) -> int:
+        row_id = self[key] = self.next_id
+        self.next_id += 1
+        return row_id
+
+
+def _assign_ids(frame: pd.DataFrame, keys, known: dict):
+    """
+    Ids for the distinct ``keys`` of ``frame``, taken from or added to ``known``.
+
+    ``known`` is an ``IdMap`` from key (the value, or tuple of values, of
+    ``keys``) to id; keys not in it yet are added in order of first
+    appearance. Distinct keys are found with
+    vectorized group numbering, so only those are looked up. Returns the
+    id of every row and a mask of the rows that introduce a new key.
+    """
+    groups = frame.groupby(keys, sort=False).ngroup().to_numpy()
+    first = ~pd.Series(groups).duplicated().to_numpy()
+    firsts = frame[first]
+    if len(keys) == 1:
+        distinct = firsts[keys[0]].tolist()
+    else:
+        distinct = zip(*(firsts[key].tolist() for key in keys))
+
+    group_ids, new = [], []
+    for key in distinct:
+        row_id = known.get(key)
+        new.append(row_id is None)
+        if row_id is None:
+            row_id = known.add(key)
+        group_ids.append(row_id)
+
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    new = np.asarray(new, dtype=bool)
+    return pd.Series(group_ids[groups], index=frame.index), first & new[groups]
+
+
+def _level(rows: pd.DataFrame, name: str, keys, column: str, known: dict):
+    """
+    Rows that have a ``name`` level, with its id as ``column``, and the rows
+    introducing a new node at that level.
+    """
+    rows = rows[rows[name] != ""]
+    ids, introduces = _assign_ids(rows, keys, known)
+    rows = rows.assign(**{column: ids})
+    return rows, rows[introduces]
+
+
+def _lookup_ids(values: pd.Series, known: dict):
+    """
+    Ids for the non-empty ``values`` from ``known``; empty values get None.
+
+    Returns the ids and the distinct values that were added to ``known``.
+    """
+    named = (values != "").to_numpy()
+    ids = np.full(len(values), None, dtype=object)
+    if not named.any():
+        return pd.Series(ids, index=values.index), []
+    named_values = values[named].to_frame("name")
+    named_ids, introduces = _assign_ids(named_values, ["name"], known)
+    ids[named] = named_ids.to_numpy().astype(object)
+    return pd.Series(ids, index=values.index), named_values.loc[introduces, "name"].tolist()
+
+
+def _split(frame: pd.DataFrame, column: str, name: str) -> pd.DataFrame:
+    """
+    One row per ``;``-separated entry of ``column``, stored as ``name``.
+    """
+    frame = frame.assign(**{name: frame[column].str.split(";")}).explode(name)
+    frame[name] = frame[name].str.strip()
+    return frame[frame[name] != ""]
+
+
+def _records(frame: pd.DataFrame, columns: dict):
+    return frame[list(columns)].rename(columns=columns).to_dict("records")
+
+
+def catalog_rows(df: pd.DataFrame, known=None, dataset: str = DEFAULT_DATASET):
+    """
+    Rows for every table of the catalog described by ``df``.
+
+    Each level is deduplicated with vectorized group numbering and gets its
+    ids in memory, so no lookups against the database are needed. Nodes are
+    keyed as before: goals, verticals, sub-verticals and capabilities by
+    name, lower levels by name within their parent. A node's attributes and
+    parent come from the first row it appears in, and a row stops at the
+    first missing level. Returns a mapping of model to a list of row dicts.
+
+    ``known`` maps each model to an ``IdMap`` of the nodes already loaded,
+    keyed as above with parents by id; it is updated in place and only rows
+    for new nodes are returned. Passing the same mapping for consecutive
+    chunks of a CSV loads it as if it were read whole. Rows of the tables
+    keyed by name are tagged with ``dataset``.
+    """
+    if known is None:
+        known = {model: IdMap() for model in SEED_ORDER}
+
+    rows, goals = _level(df, "Goal", ["Goal"], "goal_id", known[Goal])
+    rows, verticals = _level(rows, "Vertical", ["Vertical"], "vertical_id", known[Vertical])
+    rows, sub_verticals = _level(
+        rows, "Sub-Vertical", ["Sub-Vertical"], "sub_vertical_id", known[SubVertical]
+    )
+    rows, capabilities = _level(
+        rows, "Capability", ["Capability"], "capability_id", known[Capability]
+    )
+    rows, processes = _level(
+        rows, "Process", ["capability_id", "Process"], "process_id", known[Process]
+    )
+    # Levels and categories are named by the rows that introduce a process
+    level_ids, level_names = _lookup_ids(processes["Process Level"], known[ProcessLevel])
+    category_ids, category_names = _lookup_ids(
+        processes["Process Category"], known[ProcessCategory]
+    )
+    processes = processes.assign(process_level_id=level_ids, process_category_id=category_ids)
+
+    rows, sub_processes = _level(
+        rows, "Sub-Process", ["process_id", "Sub-Process"], "sub_process_id", known[SubProcess]
+    )
+    rows, data_entities = _level(
+        rows, "Data Entity", ["sub_process_id", "Data Entity"], "data_entity_id", known[DataEntity]
+    )
+
+    # Every application of a row gets every API of that row
+    rows = _split(rows, "Application", "application")
+    rows, applications = _level(
+        rows, "application", ["data_entity_id", "application"], "application_id",
+        known[Application]
+    )
+    rows = _split(rows, "API (Assumption)", "api")
+    _, apis = _level(rows, "api", ["application_id", "api"], "id", known[API])
+    apis = apis.assign(assumption="")
+
+    rows = {
+        Goal: _records(goals, {"goal_id": "id", "Goal": "name"}),
+        Vertical: _records(verticals, {
+            "vertical_id": "id", "Vertical": "name", "goal_id": "goal_id",
+        }),
+        SubVertical: _records(sub_verticals, {
+            "sub_vertical_id": "id", "Sub-Vertical": "name", "vertical_id": "vertical_id",
+        }),
+        Capability: _records(capabilities, {
+            "capability_id": "id", "Capability": "name",
+            "Capability Description": "description", "sub_vertical_id": "sub_vertical_id",
+        }),
+        ProcessLevel: [
+            {"id": known[ProcessLevel][name], "name": name} for name in level_names
+        ],
+        ProcessCategory: [
+            {"id": known[ProcessCategory][name], "name": name} for name in category_names
+        ],
+        Process: _records(processes, {
+            "process_id": "id", "Process": "name", "Process Description": "description",
+            "capability_id": "capability_id", "process_level_id": "process_level_id",
+            "process_category_id": "process_category_id",
+        }),
+        SubProcess: _records(sub_processes, {
+            "sub_process_id": "id", "Sub-Process": "name",
+            "Sub-Process Description": "description", "process_id": "process_id",
+        }),
+        DataEntity: _records(data_entities, {
+            "data_entity_id": "id", "Data Entity": "name", "sub_process_id": "sub_process_id",
+        }),
+        Application: _records(applications, {
+            "application_id": "id", "application": "name", "data_entity_id": "data_entity_id",
+        }),
+        API: _records(apis, {
+            "id": "id", "api": "name", "assumption": "assumption",
+            "application_id": "application_id",
+        }),
+    }
+    for model in PARTITIONED:
+        for row in rows[model]:
+            row["dataset"] = dataset
+    return rows
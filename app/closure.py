@@ -0,0 +1,269 @@
+"""
+Closure table over the whole catalog hierarchy.
+
+``catalog_closure`` pairs every node with each of its ancestors, across all
+eleven catalog tables, so the ancestor chain of a node and the size of the
+subtree below it are each one indexed query instead of a walk down the
+tree. Rows are written with one ``INSERT ... SELECT`` per table and
+foreign key: the seeder rewrites those of the subtrees a load inserted,
+updated or removed, and rebuilds a dataset's rows after loading it fresh,
+rewriting most of it or streaming it in.
+"""
+from typing import Optional
+
+from sqlalchemy import and_, case, delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Goal, Vertical, SubVertical, Capability, ProcessLevel, ProcessCategory,
+    Process, SubProcess, DataEntity, Application, API, CatalogClosure
+)
+from app.schemas import CatalogLevel, CatalogNodeResponse, SubtreeCountsResponse
+from app.seed import DELETE_CHUNK_SIZE, PARTITIONED, SCOPES, SEED_ORDER, _foreign_keys
+
+LEVEL_MODELS = {
+    CatalogLevel.goal: Goal,
+    CatalogLevel.vertical: Vertical,
+    CatalogLevel.sub_vertical: SubVertical,
+    CatalogLevel.capability: Capability,
+    CatalogLevel.process_level: ProcessLevel,
+    CatalogLevel.process_category: ProcessCategory,
+    CatalogLevel.process: Process,
+    CatalogLevel.sub_process: SubProcess,
+    CatalogLevel.data_entity: DataEntity,
+    CatalogLevel.application: Application,
+    CatalogLevel.api: API,
+}
+
+TABLE_LEVELS = {model.__tablename__: level for level, model in LEVEL_MODELS.items()}
+
+DESCENDANT_INDEX = next(
+    index for index in CatalogClosure.__table__.indexes
+    if index.name == "ix_catalog_closure_descendant"
+)
+
+COLUMNS = ("ancestor_table", "ancestor_id", "descendant_table", "descendant_id", "depth", "dataset")
+
+
+def _parent_rows(parent, depth: Optional[int] = None):
+    """
+    Closure rows whose descendant is a ``parent`` node, optionally at one depth.
+    """
+    criteria = [CatalogClosure.descendant_table == parent.__tablename__]
+    if depth is not None:
+        criteria.append(CatalogClosure.depth == depth)
+    return and_(*criteria)
+
+
+def _closure_statements(model, dataset: Optional[str] = None, ids=None):
+    """
+    INSERT ... SELECT statements writing the closure rows of ``model``.
+
+    Each node is paired with itself, taking its dataset from its own column
+    or from the parent that scopes it, then with every ancestor of each
+    parent it points at, so the rows of the parents must already be
+    written. Restricted to the nodes of ``dataset`` and to ``ids`` when
+    given.
+    """
+    table = model.__tablename__
+
+    def parent_id(column):
+        # Restricted to ids, the join must start from them: "+ 0" keeps
+        # SQLite from walking every closure row of the parent's table and
+        # looking its children up through the foreign key index instead
+        parent_id = getattr(model, column)
+        return parent_id if ids is None else parent_id + 0
+
+    if model in PARTITIONED:
+        own = select(
+            literal(table), model.id, literal(table), model.id, literal(0), model.dataset
+        )
+        if dataset is not None:
+            own = own.where(model.dataset == dataset)
+    else:
+        parent = _foreign_keys(model)[SCOPES[model]]
+        own = select(
+            literal(table), model.id, literal(table), model.id, literal(0), CatalogClosure.dataset
+        ).join(
+            CatalogClosure,
+            and_(
+                _parent_rows(parent, depth=0),
+                CatalogClosure.descendant_id == parent_id(SCOPES[model])
+            )
+        )
+        if dataset is not None:
+            own = own.where(CatalogClosure.dataset == dataset)
+    if ids is not None:
+        own = own.where(model.id.in_(ids))
+    yield insert(CatalogClosure).from_select(COLUMNS, own)
+
+    for column, parent in _foreign_keys(model).items():
+        inherited = select(
+            CatalogClosure.ancestor_table, CatalogClosure.ancestor_id,
+            literal(table), model.id, CatalogClosure.depth + 1, CatalogClosure.dataset
+        ).join(
+            CatalogClosure,
+            and_(_parent_rows(parent), CatalogClosure.descendant_id == parent_id(column))
+        )
+        if dataset is not None:
+            inherited = inherited.where(CatalogClosure.dataset == dataset)
+        if ids is not None:
+            inherited = inherited.where(model.id.in_(ids))
+        yield insert(CatalogClosure).from_select(COLUMNS, inherited)
+
+
+def rebuild_closure(db: Session, dataset: Optional[str] = None):
+    """
+    Repopulate the closure rows of ``dataset``, or of every dataset.
+
+    Called by the seeder after streaming a dataset in; the caller commits.
+    For a rebuild of every dataset the descendant index is dropped for the
+    rewrite and created again afterwards, which is several times faster
+    than updating it row by row. A single dataset's rebuild keeps it, as
+    the other datasets' rows are indexed by it too.
+    """
+    conn = db.connection()
+    if dataset is None:
+        DESCENDANT_INDEX.drop(conn)
+        db.execute(delete(CatalogClosure))
+    else:
+        db.execute(delete(CatalogClosure).where(CatalogClosure.dataset == dataset))
+    for model in SEED_ORDER:
+        for statement in _closure_statements(model, dataset):
+            db.execute(statement)
+    if dataset is None:
+        DESCENDANT_INDEX.create(conn)
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        yield ids[start:start + DELETE_CHUNK_SIZE]
+
+
+def update_closure(db: Session, changed, removed):
+    """
+    Rewrite the closure rows of the subtrees below changed and removed nodes.
+
+    ``changed`` and ``removed`` map models to the ids of the rows inserted
+    or updated and of those deleted. An updated node may have moved, so
+    its rows and those of everything below it, as recorded before the
+    load, are deleted and written again from the tables; nodes no longer
+    there just lose theirs. Called by ``apply_catalog``; the caller commits.
+    """
+    subtree = {model.__tablename__: set(changed.get(model, ())) for model in SEED_ORDER}
+    for model in SEED_ORDER:
+        node_ids = set(changed.get(model, ())) | set(removed.get(model, ()))
+        for chunk in _chunks(node_ids):
+            below = db.execute(
+                select(CatalogClosure.descendant_table, CatalogClosure.descendant_id).where(
+                    CatalogClosure.ancestor_table == model.__tablename__,
+                    CatalogClosure.ancestor_id.in_(chunk)
+                )
+            )
+            for table, descendant_id in below:
+                subtree[table].add(descendant_id)
+        subtree[model.__tablename__].update(removed.get(model, ()))
+
+    for model in SEED_ORDER:
+        for chunk in _chunks(subtree[model.__tablename__]):
+            db.execute(delete(CatalogClosure).where(
+                CatalogClosure.descendant_table == model.__tablename__,
+                CatalogClosure.descendant_id.in_(chunk)
+            ))
+    # Parents first, so each node's ancestors are in place when it is written
+    for model in SEED_ORDER:
+        for chunk in _chunks(subtree[model.__tablename__]):
+            for statement in _closure_statements(model, ids=chunk):
+                db.execute(statement)
+
+
+def ensure_closure(db: Session):
+    """
+    Rebuild the closure table if it does not cover the catalog.
+
+    Covers databases seeded before the closure table existed, and any
+    whose closure was left incomplete: every node must be paired with
+    itself, and with each parent its foreign keys point at.
+    """
+    closed = db.execute(
+        select(
+            func.count(case((CatalogClosure.depth == 0, 1))),
+            func.count(case((CatalogClosure.depth == 1, 1))),
+        )
+    ).one()
+    nodes = [select(func.count(model.id)).scalar_subquery() for model in SEED_ORDER]
+    links = [
+        select(func.count(getattr(model, column))).scalar_subquery()
+        for model in SEED_ORDER
+        for column in _foreign_keys(model)
+    ]
+    expected = db.execute(select(sum(nodes[1:], nodes[0]), sum(links[1:], links[0]))).one()
+    if tuple(closed) != tuple(expected):
+        rebuild_closure(db)
+        db.commit()
+
+
+def _node_name():
+    """
+    Name of the ancestor of a closure row, looked up in its own table.
+    """
+    return case(
+        {
+            model.__tablename__: select(model.name)
+            .where(model.id == CatalogClosure.ancestor_id)
+            .scalar_subquery()
+            for model in LEVEL_MODELS.values()
+        },
+        value=CatalogClosure.ancestor_table,
+    )
+
+
+def node_ancestors(db: Session, level: CatalogLevel, node_id: int):
+    """
+    Ancestors of a node, nearest first, or None if there is no such node.
+    """
+    rows = db.execute(
+        select(
+            CatalogClosure.ancestor_table, CatalogClosure.ancestor_id, CatalogClosure.depth,
+            _node_name()
+        )
+        .where(
+            CatalogClosure.descendant_table == LEVEL_MODELS[level].__tablename__,
+            CatalogClosure.descendant_id == node_id
+        )
+        .order_by(CatalogClosure.depth, CatalogClosure.ancestor_table)
+    ).all()
+    if not rows:
+        return None
+    return [
+        CatalogNodeResponse(level=TABLE_LEVELS[table], id=id_, name=name, depth=depth)
+        for table, id_, depth, name in rows
+        if depth > 0
+    ]
+
+
+def subtree_counts(db: Session, level: CatalogLevel, node_id: int):
+    """
+    Descendants of a node per level, or None if there is no such node.
+    """
+    rows = db.execute(
+        select(
+            CatalogClosure.descendant_table,
+            func.sum(case((CatalogClosure.depth > 0, 1), else_=0))
+        )
+        .where(
+            CatalogClosure.ancestor_table == LEVEL_MODELS[level].__tablename__,
+            CatalogClosure.ancestor_id == node_id
+        )
+        .group_by(CatalogClosure.descendant_table)
+    ).all()
+    if not rows:
+        return None
+    counts = {TABLE_LEVELS[table]: count for table, count in rows if count}
+    return SubtreeCountsResponse(
+        level=level,
+        id=node_id,
+        # In hierarchy order
+        counts={descendant: counts[descendant] for descendant in LEVEL_MODELS if descendant in counts},
+    )
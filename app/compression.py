@@ -0,0 +1,205 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+Bodies of at least ``COMPRESSION_MIN_BYTES`` with a textual content type
+are sent gzip-compressed, or brotli-compressed when the ``brotli`` package
+is installed and the client accepts it. ``CompressionMiddleware`` compresses
+responses as they are sent, streamed ones chunk by chunk. Cached catalog
+responses are compressed by their route instead, once per cache entry, and
+carry a separate ETag per encoding; the middleware leaves responses that
+already have a ``Content-Encoding`` alone.
+"""
+import gzip
+import zlib
+from typing import Optional
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Supported encodings, most preferred first when a client accepts several
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Encoding to send for an ``Accept-Encoding`` header, or None for identity.
+
+    The supported encoding with the highest q-value wins, ties going to the
+    server's preference; ``*`` stands for any encoding not listed.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(content_type: Optional[str], size: int) -> bool:
+    """
+    Whether a body of ``content_type`` and ``size`` bytes is worth compressing.
+    """
+    return (
+        settings.COMPRESSION
+        and size >= settings.COMPRESSION_MIN_BYTES
+        and content_type is not None
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    ``body`` compressed with ``encoding``; gzip output is reproducible.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    ETag of the ``encoding`` representation of a body with ``etag``.
+    """
+    if encoding is None:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+class StreamCompressor:
+    """
+    Incremental compressor flushing after every chunk, for streamed bodies.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+        else:
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _encoded_headers(headers, encoding: str, length: Optional[int] = None):
+    """
+    Response headers for a body compressed with ``encoding``.
+
+    Drops the identity length, suffixes a strong ETag with the encoding and
+    adds ``Vary: Accept-Encoding``.
+    """
+    result = []
+    for key, value in headers:
+        name = key.lower()
+        if name == b"content-length":
+            continue
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = encoded_etag(value.decode("latin-1"), encoding).encode("latin-1")
+        result.append((key, value))
+    result.append((b"content-encoding", encoding.encode()))
+    result.append((b"vary", b"Accept-Encoding"))
+    if length is not None:
+        result.append((b"content-length", str(length).encode()))
+    return result
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing the responses of clients that accept it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(_header(scope["headers"], b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = message.get("headers", [])
+                passthrough = _header(headers, b"content-encoding") is not None
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = start.get("headers", [])
+                content_type = _header(headers, b"content-type")
+                if not more_body:
+                    # Whole body at once: compress it only if it is large enough
+                    passthrough = True
+                    if compressible(content_type, len(body)):
+                        body = compress(body, encoding)
+                        start["headers"] = _encoded_headers(headers, encoding, len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                # Streamed: the total size is unknown, so only the type decides
+                passthrough = not compressible(content_type, settings.COMPRESSION_MIN_BYTES)
+                if passthrough:
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding)
+                start["headers"] = _encoded_headers(headers, encoding)
+                await send(start)
+
+            data = compressor.compress(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -17,6 +17,21 @@ class Settings:
         "DATABASE_URL",
         "sqlite:///./PE_compass.db"
     )
+    # URL for the async engine serving requests; derived from DATABASE_URL
+    # when unset (sqlite -> aiosqlite, postgresql -> asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = os.getenv("ASYNC_DATABASE_URL")
+    
+    # SQLite Tuning Profile
+    # Applied to every SQLite connection when SQLITE_TUNING is enabled
+    SQLITE_TUNING: bool = os.getenv("SQLITE_TUNING", "True").lower() == "true"
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # Negative values are KiB, positive values are pages
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # Open the async engine's connections with query_only; it only reads
+    SQLITE_READ_ONLY_READERS: bool = os.getenv("SQLITE_READ_ONLY_READERS", "True").lower() == "true"
     
     # Server Configuration
     HOST: str = os.getenv("HOST", "0.0.0.0")
@@ -24,6 +39,59 @@ class Settings:
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
     RELOAD: bool = os.getenv("RELOAD", "True").lower() == "true"
     
+    # Pagination Configuration
+    MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", "500"))
+    # Capabilities read from the database per chunk of the NDJSON export
+    EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", "200"))
+    
+    # Search Configuration
+    # Minimum trigram similarity (0-1) for fuzzy search hits
+    FUZZY_THRESHOLD: float = float(os.getenv("FUZZY_THRESHOLD", "0.5"))
+    
+    # Seeding Configuration
+    # Datasets loaded at startup, each from its own CSV (see app.seed.SOURCES)
+    SEED_DATASETS: str = os.getenv("SEED_DATASETS", "pe,ebrd")
+    # Most worker processes parsing large changed sources in parallel
+    SEED_WORKERS: int = int(os.getenv("SEED_WORKERS", str(os.cpu_count() or 1)))
+    # Smallest CSV in bytes worth a worker process; smaller ones are parsed
+    # in-process, as starting a worker costs more than parsing them
+    SEED_PARALLEL_MIN_BYTES: int = int(os.getenv("SEED_PARALLEL_MIN_BYTES", str(32 * 1024 * 1024)))
+    # Rows per chunk when streaming the seed CSV; 0 reads and diffs it whole
+    SEED_CHUNK_SIZE: int = int(os.getenv("SEED_CHUNK_SIZE", "0"))
+    
+    # Snapshot Configuration
+    # Serve catalog reads from an in-memory copy built at startup
+    SNAPSHOT_MODE: bool = os.getenv("SNAPSHOT_MODE", "False").lower() == "true"
+    # Prebuilt snapshot (python -m app.build_snapshot) served at startup
+    # instead of seeding; ignored when missing or older than the sources
+    SNAPSHOT_FILE: str = os.getenv("SNAPSHOT_FILE", "")
+    
+    # Query Instrumentation
+    # Report each request's SQL statement count and time in response headers
+    QUERY_STATS: bool = os.getenv("QUERY_STATS", "True").lower() == "true"
+    # Log statements slower than this many milliseconds; 0 disables the log
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "0"))
+    
+    # Metrics
+    # Collect per-route request metrics for /api/metrics
+    METRICS: bool = os.getenv("METRICS", "True").lower() == "true"
+    
+    # Response Compression
+    # Compress responses for clients that accept gzip, or brotli when installed
+    COMPRESSION: bool = os.getenv("COMPRESSION", "True").lower() == "true"
+    # Smallest body in bytes worth compressing
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "5"))
+    
+    # Request Profiling
+    # Allow requests to ask for a sampling profile (X-Profile: 1 or ?profile=1)
+    PROFILING: bool = os.getenv("PROFILING", "False").lower() == "true"
+    # Milliseconds between stack samples of a profiled request
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    # Directory collapsed-stack reports are written to; a temp directory if unset
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "")
+    
     # CORS Configuration
     CORS_ORIGINS: list = ["*"]  # Adjust in production
     
@@ -1,27 +1,149 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import time
+
+from app.config import settings
+from app.instrumentation import instrument_engine
+from app.metrics import pool_checkout_wait
 
 # Database URL - Using SQLite for simplicity, can be changed to PostgreSQL or MySQL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./PE_compass.db")
 
-# Create engine
+# Async drivers for the dialects we support
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "postgres": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def async_database_url(url: str) -> str:
+    """
+    Derive the async driver URL from a sync database URL.
+
+    ``sqlite:///x.db`` becomes ``sqlite+aiosqlite:///x.db`` and
+    ``postgresql+psycopg2://...`` becomes ``postgresql+asyncpg://...``.
+    """
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    driver = ASYNC_DRIVERS.get(dialect)
+    if driver is None:
+        return url
+    if dialect == "postgres":
+        dialect = "postgresql"
+    return f"{dialect}+{driver}://{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+
+class TimedCheckout:
+    """Pool mixin recording how long each checkout waits for a connection."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    """Queue pool with timed checkouts."""
+
+
+class TimedAsyncQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    """Async queue pool with timed checkouts."""
+
+
+# Create engine (used for schema creation and seeding, and for the
+# hierarchy loads of requests, which run in the threadpool: hydrating the
+# ORM and building responses is CPU-bound and would hold the event loop if
+# run through the async engine)
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    **({"poolclass": TimedQueuePool} if ":memory:" not in DATABASE_URL else {}),
 )
 
-# Session factory
+# Async engine serving the light reads of API requests: data versions,
+# full-text matches, impact and closure lookups. aiosqlite defaults to
+# opening a new connection (and thread) per checkout, so file databases
+# get a real pool; other databases get the same queue pool they default
+# to, timed.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **(
+        {"poolclass": TimedAsyncQueuePool}
+        if ":memory:" not in ASYNC_DATABASE_URL
+        else {}
+    ),
+)
+
+
+
+def sqlite_pragmas(read_only: bool = False):
+    """
+    PRAGMA statements of the SQLite tuning profile from ``settings``.
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}",
+        f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def configure_sqlite(target_engine, read_only: bool = False):
+    """
+    Apply the SQLite tuning profile to every new connection of an engine.
+
+    ``read_only`` connections additionally refuse writes. Does nothing for
+    other databases or when ``settings.SQLITE_TUNING`` is off.
+    """
+    if target_engine.dialect.name != "sqlite" or not settings.SQLITE_TUNING:
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas(read_only):
+            cursor.execute(pragma)
+        cursor.close()
+
+
+# Seeding writes through the sync engine; the async engine only reads
+configure_sqlite(engine)
+configure_sqlite(async_engine.sync_engine, read_only=settings.SQLITE_READ_ONLY_READERS)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session in routes."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting an async database session in routes."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def get_sync_sessions():
+    """
+    Dependency for the factory of the sync sessions routes open in the threadpool.
+    """
+    return SessionLocal
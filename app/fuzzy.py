@@ -0,0 +1,199 @@
+"""
+In-memory trigram index for typo-tolerant capability search.
+
+Capability, process and sub-process names and descriptions are split into
+character trigrams and kept in an inverted index, so a misspelt keyword
+still shares most of its trigrams with the text it was meant to match.
+"""
+import re
+import threading
+from collections import Counter
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Capability, Process, SubProcess
+
+# Relative weight of a hit per document kind: names count more than
+# descriptions, and the capability itself more than its processes
+WEIGHTS = {
+    ("capability", "name"): 1.0,
+    ("capability", "description"): 0.6,
+    ("process", "name"): 0.8,
+    ("process", "description"): 0.5,
+    ("sub_process", "name"): 0.8,
+    ("sub_process", "description"): 0.5,
+}
+
+
+def trigrams(text: str) -> frozenset:
+    """
+    Trigrams of every word in ``text``, padded as in pg_trgm.
+    """
+    grams = set()
+    for word in re.findall(r"\w+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index over documents that belong to capabilities.
+
+    Documents are keyed by ``(kind, row id, field)``. ``update`` applies only
+    the difference between the indexed and the given documents, so a
+    refresh after a small data change touches only the changed rows.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def update(self, documents, version=None):
+        """
+        Bring the index in line with ``documents``.
+
+        ``documents`` yields ``(key, capability_id, text)`` tuples. Returns
+        the number of documents added and removed; a changed document counts
+        as both.
+        """
+        wanted = {key: (capability_id, text) for key, capability_id, text in documents if text}
+        with self._lock:
+            removed = [
+                key for key, (capability_id, text, _) in self._documents.items()
+                if wanted.get(key) != (capability_id, text)
+            ]
+            for key in removed:
+                self._remove(key)
+
+            added = [key for key in wanted if key not in self._documents]
+            for key in added:
+                self._add(key, *wanted[key])
+
+            self.version = version
+        return len(added), len(removed)
+
+    def _add(self, key, capability_id, text):
+        grams = trigrams(text)
+        self._documents[key] = (capability_id, text, grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key):
+        _, _, grams = self._documents.pop(key)
+        for gram in grams:
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def search(self, query: str, threshold: float = 0.5):
+        """
+        Capabilities similar to ``query`` as ``(capability_id, score)`` pairs.
+
+        A document scores the share of the query trigrams it contains,
+        scaled by its kind weight; a capability takes the score of its best
+        document. Ties are broken by how closely the document matches as a
+        whole, then by id.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            shared = Counter()
+            for gram in query_grams:
+                for key in self._postings.get(gram, ()):
+                    shared[key] += 1
+
+            best = {}
+            for key, count in shared.items():
+                capability_id, _, grams = self._documents[key]
+                score = WEIGHTS[key[0], key[2]] * count / len(query_grams)
+                closeness = count / len(query_grams | grams)
+                if score >= threshold and (score, closeness) > best.get(capability_id, (0, 0)):
+                    best[capability_id] = (score, closeness)
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        return [(capability_id, round(score, 4)) for capability_id, (score, _) in ranked]
+
+
+fuzzy_index = TrigramIndex()
+
+
+def catalog_documents(db: Session):
+    """
+    Yield the searchable text of capabilities, processes and sub-processes.
+    """
+    for row in db.query(Capability.id, Capability.name, Capability.description):
+        yield ("capability", row.id, "name"), row.id, row.name
+        yield ("capability", row.id, "description"), row.id, row.description
+
+    for row in db.query(Process.id, Process.capability_id, Process.name, Process.description):
+        yield ("process", row.id, "name"), row.capability_id, row.name
+        yield ("process", row.id, "description"), row.capability_id, row.description
+
+    sub_processes = db.query(
+        SubProcess.id, Process.capability_id, SubProcess.name, SubProcess.description
+    ).join(Process, SubProcess.process_id == Process.id)
+    for row in sub_processes:
+        yield ("sub_process", row.id, "name"), row.capability_id, row.name
+        yield ("sub_process", row.id, "description"), row.capability_id, row.description
+
+
+def snapshot_documents(snapshot):
+    """
+    Yield the same documents as ``catalog_documents`` from a catalog snapshot.
+    """
+    for capability in snapshot.capabilities:
+        yield ("capability", capability.id, "name"), capability.id, capability.name
+        yield ("capability", capability.id, "description"), capability.id, capability.description
+        for process in capability.processes:
+            yield ("process", process.id, "name"), capability.id, process.name
+            yield ("process", process.id, "description"), capability.id, process.description
+            for sub_process in process.sub_processes:
+                yield ("sub_process", sub_process.id, "name"), capability.id, sub_process.name
+                yield (
+                    ("sub_process", sub_process.id, "description"),
+                    capability.id, sub_process.description
+                )
+
+
+def fuzzy_matches(db: Session, keyword: str, version: str, threshold: float = 0.5, dataset=None):
+    """
+    Fuzzy-match ``keyword`` against the catalog.
+
+    The index is refreshed incrementally from the database whenever the
+    data ``version`` differs from the one it was last built for. With a
+    ``dataset``, matches outside it are dropped, using the ids the dataset
+    index returns for it.
+    """
+    if fuzzy_index.version != version:
+        fuzzy_index.update(catalog_documents(db), version)
+    matches = fuzzy_index.search(keyword, threshold)
+    if dataset is None or not matches:
+        return matches
+    partition = set(db.scalars(select(Capability.id).where(Capability.dataset == dataset)))
+    return [match for match in matches if match[0] in partition]
+
+
+def snapshot_fuzzy_matches(snapshot, keyword: str, threshold: float = 0.5, dataset=None):
+    """
+    Fuzzy-match ``keyword`` against a full catalog snapshot, without the database.
+
+    With a ``dataset``, matches outside the snapshot's partition for it are
+    dropped.
+    """
+    if fuzzy_index.version != snapshot.version:
+        fuzzy_index.update(snapshot_documents(snapshot), snapshot.version)
+    matches = fuzzy_index.search(keyword, threshold)
+    if dataset is None:
+        return matches
+    partition = snapshot.partition(dataset).by_id
+    return [match for match in matches if match[0] in partition]
@@ -0,0 +1,330 @@
+"""
+Shared loader for the capability hierarchy.
+
+Fetches the complete Goal -> ... -> API tree for a set of capabilities in a
+fixed number of queries, independent of how many capabilities are returned.
+"""
+import hashlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app.models import (
+    Capability, Vertical, SubVertical, Process, SubProcess, DataEntity,
+    Application, API, SeedState
+)
+from app.schemas import (
+    CapabilityDetailResponse, ProcessResponse, SubProcessResponse,
+    DataEntityResponse, ApplicationResponse, APIResponse, HierarchyDepth,
+    CapabilitySimpleResponse
+)
+
+
+# Child collection below each level of the hierarchy
+CHILD_FIELDS = {
+    HierarchyDepth.capability: "processes",
+    HierarchyDepth.process: "sub_processes",
+    HierarchyDepth.sub_process: "data_entities",
+    HierarchyDepth.data_entity: "applications",
+    HierarchyDepth.application: "apis",
+}
+
+# Many-to-one steps from a level up to the capability it belongs to
+CAPABILITY_PATHS = {
+    Application: (
+        Application.data_entity, DataEntity.sub_process, SubProcess.process, Process.capability
+    ),
+    API: (
+        API.application, Application.data_entity, DataEntity.sub_process, SubProcess.process,
+        Process.capability
+    ),
+}
+
+# Capability fields resolved through the Sub-Vertical -> Vertical -> Goal chain
+PARENT_FIELDS = frozenset({"goal", "vertical", "sub_vertical"})
+
+DEPTHS = list(HierarchyDepth)
+
+
+class Projection:
+    """
+    Part of the capability hierarchy requested by a client.
+
+    ``depth`` is the deepest level included and ``fields`` restricts the
+    top-level capability fields. Levels and parents that are not requested
+    are neither loaded nor serialized.
+    """
+
+    def __init__(self, depth: HierarchyDepth = HierarchyDepth.api, fields=None):
+        self.fields = frozenset(fields) if fields else None
+        if self.fields is not None and "processes" not in self.fields:
+            depth = HierarchyDepth.capability
+        self.depth = depth
+        self.parents = self.fields is None or bool(self.fields & PARENT_FIELDS)
+
+    def includes(self, level: HierarchyDepth) -> bool:
+        return DEPTHS.index(level) <= DEPTHS.index(self.depth)
+
+    @property
+    def include(self):
+        """Pydantic include spec for a capability, or None for all fields."""
+        return set(self.fields) if self.fields else None
+
+    @property
+    def exclude(self):
+        """Pydantic exclude spec cutting the tree below ``depth``."""
+        if self.depth is HierarchyDepth.api:
+            return None
+        spec = {CHILD_FIELDS[self.depth]}
+        for level in reversed(DEPTHS[:DEPTHS.index(self.depth)]):
+            spec = {CHILD_FIELDS[level]: {"__all__": spec}}
+        return spec
+
+    @property
+    def cache_key(self) -> str:
+        fields = ",".join(sorted(self.fields)) if self.fields else ""
+        return f"depth={self.depth.value}&fields={fields}"
+
+
+FULL = Projection()
+
+
+def hierarchy_options(projection: Projection = FULL):
+    """
+    Loader options that eagerly fetch the hierarchy of a capability query.
+
+    Many-to-one parents are joined into the capability query itself, every
+    collection level is fetched with one batched ``IN`` query. Levels below
+    the projection depth are left out.
+    """
+    options = []
+    if projection.parents:
+        options.append(
+            joinedload(Capability.sub_vertical)
+            .joinedload(SubVertical.vertical)
+            .joinedload(Vertical.goal)
+        )
+    if not projection.includes(HierarchyDepth.process):
+        return options
+
+    options.append(selectinload(Capability.processes).joinedload(Process.process_level))
+    options.append(selectinload(Capability.processes).joinedload(Process.process_category))
+
+    chain = selectinload(Capability.processes)
+    for level, relationship in (
+        (HierarchyDepth.sub_process, Process.sub_processes),
+        (HierarchyDepth.data_entity, SubProcess.data_entities),
+        (HierarchyDepth.application, DataEntity.applications),
+        (HierarchyDepth.api, Application.apis),
+    ):
+        if not projection.includes(level):
+            break
+        chain = chain.selectinload(relationship)
+    options.append(chain)
+    return options
+
+
+def load_capabilities(db: Session, *criteria, cursor=None, limit=None, projection: Projection = FULL):
+    """
+    Load capabilities matching ``criteria`` together with their hierarchy.
+
+    ``cursor`` and ``limit`` select a keyset page on ``Capability.id``: only
+    capabilities with an id greater than the cursor are returned, at most
+    ``limit`` of them, and the hierarchy is loaded for that page only.
+    """
+    query = (
+        db.query(Capability)
+        .options(*hierarchy_options(projection))
+        .filter(*criteria)
+    )
+    if cursor is not None:
+        query = query.filter(Capability.id > cursor)
+    query = query.order_by(Capability.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def load_capability_page(db: Session, *criteria, cursor=None, limit=None, projection: Projection = FULL):
+    """
+    Load one keyset page of capabilities.
+
+    Returns the capabilities and the cursor of the next page, which is None
+    on the last page.
+    """
+    if limit is None:
+        return load_capabilities(db, *criteria, cursor=cursor, projection=projection), None
+
+    capabilities = load_capabilities(
+        db, *criteria, cursor=cursor, limit=limit + 1, projection=projection
+    )
+    if len(capabilities) > limit:
+        capabilities = capabilities[:limit]
+        return capabilities, capabilities[-1].id
+    return capabilities, None
+
+
+def load_capabilities_by_ids(db: Session, ids, projection: Projection = FULL):
+    """
+    Load the capabilities with the given ids, returned in the order of ``ids``.
+    """
+    if not ids:
+        return []
+    by_id = {
+        capability.id: capability
+        for capability in load_capabilities(db, Capability.id.in_(ids), projection=projection)
+    }
+    return [by_id[id_] for id_ in ids if id_ in by_id]
+
+
+def build_capability_page(db: Session, *criteria, cursor=None, limit=None, projection: Projection = FULL):
+    """
+    Load one keyset page of capabilities and build their responses.
+
+    Runs entirely on the given session, so async routes can call it through
+    ``AsyncSession.run_sync`` with all ORM access inside the sync context.
+    """
+    page, next_cursor = load_capability_page(
+        db, *criteria, cursor=cursor, limit=limit, projection=projection
+    )
+    return [build_capability_response(capability, projection) for capability in page], next_cursor
+
+
+def build_capabilities(db: Session, *criteria, ids=None, projection: Projection = FULL):
+    """
+    Load capabilities by ``criteria``, or by ``ids`` in that order, and build
+    their responses.
+    """
+    if ids is not None:
+        capabilities = load_capabilities_by_ids(db, ids, projection)
+    else:
+        capabilities = load_capabilities(db, *criteria, projection=projection)
+    return [build_capability_response(capability, projection) for capability in capabilities]
+
+
+def catalog_version(db: Session) -> str:
+    """
+    Fingerprint of the catalog contents, read from the seed state.
+
+    The seeder bumps a dataset's revision in the same transaction as every
+    load that changes its rows, so the source hash and revision of each
+    dataset identify the data. That is one read of ``seed_state``, a row
+    per dataset, however large the catalog grows.
+    """
+    rows = db.execute(
+        select(SeedState.dataset, SeedState.content_hash, SeedState.revision)
+        .order_by(SeedState.dataset)
+    ).all()
+    return hashlib.sha256(repr([tuple(row) for row in rows]).encode()).hexdigest()[:16]
+
+
+def build_capability_response(capability: Capability, projection: Projection = FULL) -> CapabilityDetailResponse:
+    """
+    Build the response for an eagerly loaded capability.
+
+    Only the levels included in ``projection`` are visited; deeper
+    collections are left empty.
+    """
+    sub_vertical = capability.sub_vertical if projection.parents else None
+    vertical = sub_vertical.vertical if sub_vertical else None
+    goal = vertical.goal if vertical else None
+
+    processes = []
+    if projection.includes(HierarchyDepth.process):
+        processes = [build_process_response(process, projection) for process in capability.processes]
+
+    return CapabilityDetailResponse(
+        id=capability.id,
+        name=capability.name,
+        description=capability.description,
+        goal=goal.name if goal else "",
+        vertical=vertical.name if vertical else "",
+        sub_vertical=sub_vertical.name if sub_vertical else "",
+        dataset=capability.dataset,
+        processes=processes
+    )
+
+
+def build_process_response(process: Process, projection: Projection = FULL) -> ProcessResponse:
+    """
+    Build the response for a process and the levels below it.
+    """
+    sub_processes = []
+    if projection.includes(HierarchyDepth.sub_process):
+        sub_processes = [
+            build_sub_process_response(sub_process, projection)
+            for sub_process in process.sub_processes
+        ]
+
+    return ProcessResponse(
+        id=process.id,
+        name=process.name,
+        description=process.description,
+        process_level=process.process_level.name if process.process_level else None,
+        process_category=process.process_category.name if process.process_category else None,
+        sub_processes=sub_processes
+    )
+
+
+def build_sub_process_response(sub_process: SubProcess, projection: Projection = FULL) -> SubProcessResponse:
+    """
+    Build the response for a sub-process and the levels below it.
+    """
+    data_entities = []
+    if projection.includes(HierarchyDepth.data_entity):
+        data_entities = [
+            DataEntityResponse(
+                id=data_entity.id,
+                name=data_entity.name,
+                applications=[
+                    ApplicationResponse(
+                        id=application.id,
+                        name=application.name,
+                        apis=[
+                            APIResponse(
+                                id=api.id,
+                                name=api.name,
+                                assumption=api.assumption
+                            )
+                            for api in application.apis
+                        ] if projection.includes(HierarchyDepth.api) else []
+                    )
+                    for application in data_entity.applications
+                ] if projection.includes(HierarchyDepth.application) else []
+            )
+            for data_entity in sub_process.data_entities
+        ]
+
+    return SubProcessResponse(
+        id=sub_process.id,
+        name=sub_process.name,
+        description=sub_process.description,
+        data_entities=data_entities
+    )
+
+
+def dependent_capabilities(db: Session, model, name: str, *criteria):
+    """
+    Capabilities above every ``model`` row named ``name``, in id order.
+
+    ``model`` is a level of ``CAPABILITY_PATHS``. Rows are found through the
+    name index and resolved upward with one query of primary key joins;
+    ``criteria`` restrict the capabilities. Returns None if no row has that
+    name.
+    """
+    path = CAPABILITY_PATHS[model]
+    query = select(model.id, Capability.id, Capability.name, Capability.description).select_from(model)
+    for step in path[:-1]:
+        query = query.outerjoin(step)
+    query = query.outerjoin(path[-1].and_(*criteria)).where(model.name == name)
+    rows = db.execute(query.order_by(Capability.id)).all()
+    if not rows:
+        return None
+
+    capabilities = {}
+    for _, id_, capability_name, description in rows:
+        if id_ is not None and id_ not in capabilities:
+            capabilities[id_] = CapabilitySimpleResponse(
+                id=id_, name=capability_name, description=description
+            )
+    return list(capabilities.values())
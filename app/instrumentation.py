@@ -0,0 +1,107 @@
+"""
+Per-request SQL statement counting and timing.
+
+Engines passed to ``instrument_engine`` time every statement they execute
+and add it to the ``QueryStats`` of the request being served, found through
+a context variable that ``QueryStatsMiddleware`` sets for each request. The
+middleware reports the totals in ``Server-Timing`` and ``X-DB-Queries``
+response headers, and with ``SLOW_QUERY_MS`` set, statements slower than
+that are logged with the route that ran them.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements executed for one request and their total time."""
+
+    def __init__(self, scope: dict = None):
+        self.scope = scope or {}
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """Route template of the request, or its path before routing."""
+        route = self.scope.get("route")
+        path = getattr(route, "path", None) or self.scope.get("path", "")
+        return f"{self.scope.get('method', '')} {path}".strip()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if settings.SLOW_QUERY_MS and seconds * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning(
+                f"Slow query ({seconds * 1000:.1f} ms) in {self.route or 'no request'}: "
+                f"{' '.join(statement.split())}"
+            )
+
+    def headers(self):
+        """``Server-Timing`` and ``X-DB-Queries`` headers as raw ASGI pairs."""
+        timing = f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+        return [
+            (b"server-timing", timing.encode()),
+            (b"x-db-queries", str(self.count).encode()),
+        ]
+
+
+# Stats of the request being served; None outside requests, e.g. seeding
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def instrument_engine(target_engine):
+    """
+    Time every statement of ``target_engine`` into the current request's stats.
+
+    Statements run outside a request are only checked against the slow
+    query log.
+    """
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is None:
+            stats = QueryStats()
+        stats.record(statement, seconds)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware collecting the statements of each HTTP request.
+
+    Headers go out with the start of the response, so a streamed body
+    reports the statements run before its first chunk only.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.QUERY_STATS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + stats.headers()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
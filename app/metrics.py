@@ -0,0 +1,227 @@
+"""
+Operational metrics in the Prometheus text format.
+
+Counters, gauges and histograms are kept in process, labelled by route
+template rather than raw path so label sets stay bounded, and rendered by
+``/api/metrics``. ``MetricsMiddleware`` records every HTTP request; gauges
+read at scrape time (threadpool, connection pool, response cache) are
+refreshed just before rendering.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple
+
+from anyio.to_thread import current_default_thread_limiter
+
+from app.config import settings
+
+# Latency buckets in seconds, from cache hits to full catalog builds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Connection pool checkout buckets in seconds
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self):
+        yield from self.header()
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: count per bucket (last is +Inf), sum
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def render(self):
+        yield from self.header()
+        names = self.label_names + ("le",)
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+http_requests = Counter(
+    "pe_compass_http_requests_total", "HTTP requests served.", ("method", "route", "status")
+)
+http_latency = Histogram(
+    "pe_compass_http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response.",
+    ("method", "route"),
+)
+http_in_flight = Gauge("pe_compass_http_requests_in_flight", "HTTP requests being served.")
+threadpool_busy = Gauge(
+    "pe_compass_threadpool_busy_threads", "Worker threads running sync code for requests."
+)
+threadpool_size = Gauge("pe_compass_threadpool_threads", "Worker thread limit for requests.")
+pool_checkout_wait = Histogram(
+    "pe_compass_db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the database pools.",
+    buckets=POOL_WAIT_BUCKETS,
+)
+pool_checked_out = Gauge(
+    "pe_compass_db_pool_checked_out", "Database connections checked out of the pools."
+)
+pool_size = Gauge("pe_compass_db_pool_size", "Database connections the pools keep open.")
+cache_hits = Counter("pe_compass_response_cache_hits_total", "Response cache lookups that hit.")
+cache_misses = Counter(
+    "pe_compass_response_cache_misses_total", "Response cache lookups that missed."
+)
+cache_hit_ratio = Gauge(
+    "pe_compass_response_cache_hit_ratio", "Share of response cache lookups that hit."
+)
+
+REGISTRY = (
+    http_requests, http_latency, http_in_flight, threadpool_busy, threadpool_size,
+    pool_checkout_wait, pool_checked_out, pool_size, cache_hits, cache_misses, cache_hit_ratio,
+)
+
+
+def observe_runtime(*pools):
+    """
+    Refresh the gauges read at scrape time.
+
+    Must run on the event loop, whose thread limiter sizes the threadpool
+    that sync code of requests runs in. ``pools`` are the connection pools
+    serving requests, reported together; pools that keep no connections
+    are skipped.
+    """
+    limiter = current_default_thread_limiter()
+    threadpool_busy.set(limiter.borrowed_tokens)
+    threadpool_size.set(limiter.total_tokens)
+    pools = [pool for pool in pools if hasattr(pool, "checkedout")]
+    if pools:
+        pool_checked_out.set(sum(pool.checkedout() for pool in pools))
+        pool_size.set(sum(pool.size() for pool in pools))
+    lookups = cache_hits.value() + cache_misses.value()
+    if lookups:
+        cache_hit_ratio.set(cache_hits.value() / lookups)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def route_label(scope: dict) -> str:
+    """
+    Route template of a request, so paths with ids share one label.
+
+    Requests that matched no route are grouped under ``unmatched``.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing HTTP requests per route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.inc(amount=-1)
+            route = route_label(scope)
+            http_requests.inc(scope["method"], route, str(status))
+            http_latency.observe(time.perf_counter() - start, scope["method"], route)
@@ -0,0 +1,117 @@
+"""
+In-place schema upgrades for databases created by earlier versions.
+
+``Base.metadata.create_all`` creates missing tables but never changes
+existing ones. ``upgrade_schema`` brings existing tables in line with the
+models: it adds missing columns, rebuilds the seeder's bookkeeping tables
+when their key changed, and creates or recreates indexes that are missing
+or differ.
+
+``ensure_schema`` runs both at startup, unless the fingerprint of the
+models' DDL stored in the database shows it is already current.
+"""
+import hashlib
+import logging
+
+from sqlalchemy import delete, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable, DropIndex
+
+from app.database import Base
+from app.models import (
+    CAPABILITY_SEARCH_DDL, CatalogClosure, SchemaVersion, SeedNode, SeedState
+)
+
+logger = logging.getLogger(__name__)
+
+# Tables holding only data derived by the seeder; dropped and recreated
+# rather than altered, and rebuilt on the next load
+DERIVED_TABLES = (
+    SeedState.__table__, SeedNode.__table__, SchemaVersion.__table__, CatalogClosure.__table__
+)
+
+
+def _add_missing_columns(conn, table, existing):
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        logger.info(f"Added column {table.name}.{column.name}")
+
+
+def _sync_indexes(conn, table, inspector):
+    existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        columns = [column.name for column in index.columns]
+        current = existing.get(index.name)
+        if current is not None:
+            if current["column_names"] == columns and bool(current["unique"]) == bool(index.unique):
+                continue
+            # Same name as the stale index, so it drops that one
+            conn.execute(DropIndex(index))
+        index.create(conn)
+        logger.info(f"Created index {index.name}")
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Upgrade the tables of an existing database to the current models.
+
+    Safe to run on every startup: it only changes what differs.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            if table in DERIVED_TABLES:
+                if existing != set(table.columns.keys()):
+                    table.drop(conn)
+                    table.create(conn)
+                    logger.info(f"Rebuilt table {table.name}")
+                continue
+            _add_missing_columns(conn, table, existing)
+            _sync_indexes(conn, table, inspector)
+
+
+def schema_fingerprint(dialect) -> str:
+    """
+    SHA-256 of the DDL the models compile to on ``dialect``.
+    """
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    digest.update(CAPABILITY_SEARCH_DDL.statement.encode())
+    return digest.hexdigest()
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """
+    Create and upgrade the schema unless the database records it as current.
+
+    A matching fingerprint in ``schema_version`` costs one query and skips
+    the table reflection of ``create_all`` and ``upgrade_schema``; otherwise
+    both run and the new fingerprint is stored. Returns whether they ran.
+    """
+    version = schema_fingerprint(engine.dialect)
+    try:
+        with engine.connect() as conn:
+            if conn.execute(select(SchemaVersion.version)).scalar() == version:
+                return False
+    except DBAPIError:
+        # Databases created before the fingerprint was kept have no table for it
+        pass
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(delete(SchemaVersion))
+        conn.execute(insert(SchemaVersion).values(version=version))
+    logger.info("Database schema created or upgraded")
+    return True
@@ -1,14 +1,27 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DDL, Index, event
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+# Dataset of rows loaded before datasets existed, and of the PE catalog
+DEFAULT_DATASET = "pe"
+
+
+def dataset_column(**kwargs):
+    """Dataset partition of a catalog row keyed by name."""
+    return Column(
+        String(64), nullable=False, default=DEFAULT_DATASET,
+        server_default=DEFAULT_DATASET, **kwargs
+    )
+
 
 class Goal(Base):
     """Goal entity."""
     __tablename__ = "goals"
+    __table_args__ = (Index("ix_goals_dataset_name", "dataset", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), unique=True, nullable=False, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    dataset = dataset_column()
 
     # Relationships
     verticals = relationship("Vertical", back_populates="goal")
@@ -20,9 +33,11 @@ class Goal(Base):
 class Vertical(Base):
     """Vertical entity."""
     __tablename__ = "verticals"
+    __table_args__ = (Index("ix_verticals_dataset_name", "dataset", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), unique=True, nullable=False, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    dataset = dataset_column()
     goal_id = Column(Integer, ForeignKey("goals.id"), nullable=False)
 
     # Relationships
@@ -39,6 +54,7 @@ class SubVertical(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
+    dataset = dataset_column()
     vertical_id = Column(Integer, ForeignKey("verticals.id"), nullable=False)
 
     # Relationships
@@ -52,9 +68,12 @@ class SubVertical(Base):
 class Capability(Base):
     """Capability entity."""
     __tablename__ = "capabilities"
+    __table_args__ = (Index("ix_capabilities_dataset_name", "dataset", "name", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), unique=True, nullable=False, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    # Endpoints filter on dataset and page by id: the index covers both
+    dataset = dataset_column(index=True)
     description = Column(Text, nullable=True)
     sub_vertical_id = Column(Integer, ForeignKey("sub_verticals.id"), nullable=False)
 
@@ -69,6 +88,9 @@ class Capability(Base):
 class Process(Base):
     """Process entity."""
     __tablename__ = "processes"
+    # Rows below capabilities are loaded by parent id and keyed by name
+    # within their parent; (parent id, name) indexes serve both
+    __table_args__ = (Index("ix_processes_capability_id_name", "capability_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -93,6 +115,7 @@ class ProcessLevel(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
+    dataset = dataset_column()
 
     # Relationships
     processes = relationship("Process", back_populates="process_level")
@@ -107,6 +130,7 @@ class ProcessCategory(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
+    dataset = dataset_column()
 
     # Relationships
     processes = relationship("Process", back_populates="process_category")
@@ -118,6 +142,7 @@ class ProcessCategory(Base):
 class SubProcess(Base):
     """Sub-Process entity."""
     __tablename__ = "sub_processes"
+    __table_args__ = (Index("ix_sub_processes_process_id_name", "process_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=True, index=True)
@@ -135,6 +160,7 @@ class SubProcess(Base):
 class DataEntity(Base):
     """Data Entity."""
     __tablename__ = "data_entities"
+    __table_args__ = (Index("ix_data_entities_sub_process_id_name", "sub_process_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=True, index=True)
@@ -151,6 +177,7 @@ class DataEntity(Base):
 class Application(Base):
     """Application entity."""
     __tablename__ = "applications"
+    __table_args__ = (Index("ix_applications_data_entity_id_name", "data_entity_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=True, index=True)
@@ -167,6 +194,7 @@ class Application(Base):
 class API(Base):
     """API entity."""
     __tablename__ = "apis"
+    __table_args__ = (Index("ix_apis_application_id_name", "application_id", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=True, index=True)
@@ -178,3 +206,92 @@ class API(Base):
 
     def __repr__(self):
         return f"<API(id={self.id}, name={self.name})>"
+
+
+class SeedState(Base):
+    """Content hash of a dataset's seed source, as of the last load from it."""
+    __tablename__ = "seed_state"
+
+    dataset = Column(String(64), primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    # Bumped on every load that changed the catalog
+    revision = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SeedState(dataset={self.dataset}, revision={self.revision})>"
+
+
+class SeedNode(Base):
+    """Fingerprint of a seeded catalog row, keyed by its natural key."""
+    __tablename__ = "seed_nodes"
+
+    dataset = Column(String(64), primary_key=True)
+    table_name = Column(String(64), primary_key=True)
+    natural_key = Column(Text, primary_key=True)
+    row_id = Column(Integer, nullable=False)
+    fingerprint = Column(String(16), nullable=False)
+
+    def __repr__(self):
+        return f"<SeedNode(table_name={self.table_name}, row_id={self.row_id})>"
+
+
+class CatalogClosure(Base):
+    """
+    Ancestor and descendant pair of the catalog hierarchy, ``depth`` levels apart.
+
+    Every node is paired with itself at depth 0. Processes descend from
+    their process level and category as well as their capability.
+    Maintained per dataset by the seeder through app.closure.
+    """
+    __tablename__ = "catalog_closure"
+    __table_args__ = (
+        # Ancestor chains are read by descendant, subtrees by the primary key
+        Index("ix_catalog_closure_descendant", "descendant_table", "descendant_id", "depth"),
+        {"sqlite_with_rowid": False},
+    )
+
+    ancestor_table = Column(String(64), primary_key=True)
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_table = Column(String(64), primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
+    # Only read when a dataset's rows are rebuilt, so left unindexed
+    dataset = Column(String(64), nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<CatalogClosure({self.ancestor_table}={self.ancestor_id}, "
+            f"{self.descendant_table}={self.descendant_id}, depth={self.depth})>"
+        )
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the schema the database was last created or upgraded to."""
+    __tablename__ = "schema_version"
+
+    version = Column(String(64), primary_key=True)
+
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version})>"
+
+
+# Full-text index over the capability hierarchy, one row per capability with
+# the capability id as rowid. SQLite only; populated by app.search.
+CAPABILITY_SEARCH_TABLE = "capability_search"
+
+CAPABILITY_SEARCH_DDL = DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CAPABILITY_SEARCH_TABLE} USING fts5("
+    "capability, process, sub_process, data_entity, application, api, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+event.listen(
+    Base.metadata,
+    "after_create",
+    CAPABILITY_SEARCH_DDL.execute_if(dialect="sqlite"),
+)
+event.listen(
+    Base.metadata,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {CAPABILITY_SEARCH_TABLE}").execute_if(dialect="sqlite"),
+)
@@ -0,0 +1,219 @@
+"""
+On-demand sampling profiler for single requests.
+
+With ``PROFILING`` enabled, a request sent with an ``X-Profile: 1`` header
+or a ``profile=1`` query parameter is sampled: a background thread records
+the stack of the thread serving it every ``PROFILE_INTERVAL_MS``. The
+samples are written to ``PROFILE_DIR`` as collapsed stacks, one
+``frame;frame;frame count`` line per distinct stack, ready for
+flamegraph.pl or speedscope. The response reports the time split into SQL,
+ORM, serialization, I/O wait and other code in ``Server-Timing``, and names
+the report in ``X-Profile-Report``.
+
+Route code runs on the event loop thread, so that is the thread sampled,
+except while the request has work in the threadpool: code run under
+``sampled_thread`` there, like the hierarchy loads, is sampled in the
+worker thread instead, while the loop only waits for it. Drivers that
+execute statements in a thread of their own, like aiosqlite, show up as
+``wait``: the loop idle in its selector until the result arrives. Samples
+are taken until the response starts; the body of a streamed response is
+not covered. Busy Python code only yields the GIL every
+``sys.getswitchinterval()``, which bounds the effective sampling rate, and
+concurrent requests share the loop thread, so profile on a quiet instance.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs
+
+from app.config import settings
+
+# Categories of a sample, by the module of the innermost frame that has
+# one; checked in this order
+CATEGORIES = (
+    ("sql", (
+        "sqlalchemy.engine", "sqlalchemy.dialects", "sqlalchemy.pool", "sqlalchemy.sql",
+        "aiosqlite", "sqlite3", "asyncpg",
+    )),
+    ("orm", ("sqlalchemy.orm",)),
+    ("serialization", ("pydantic", "pydantic_core", "json", "app.cache")),
+    ("wait", ("selectors",)),
+)
+OTHER = "other"
+
+
+def frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def categorize(stack) -> str:
+    """
+    Category of a sample, given its stack of frame labels from root to leaf.
+    """
+    for label in reversed(stack):
+        module = label.partition(":")[0]
+        for category, prefixes in CATEGORIES:
+            if any(module == prefix or module.startswith(prefix + ".") for prefix in prefixes):
+                return category
+    return OTHER
+
+
+class Sampler:
+    """
+    Samples the stack of one thread from a background thread.
+
+    While ``workers`` holds threads doing work for it, those are sampled
+    instead.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.workers = set()
+        self.stacks = Counter()
+        self.started = self.stopped = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.workers) or [self.thread_id]:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def breakdown(self):
+        """
+        Milliseconds per category, the sampled time split by sample share.
+        """
+        elapsed = (self.stopped - self.started) * 1000
+        totals = Counter()
+        for stack, count in self.stacks.items():
+            totals[categorize(stack)] += count
+        samples = self.samples or 1
+        return {
+            category: elapsed * totals[category] / samples
+            for category in [name for name, _ in CATEGORIES] + [OTHER]
+        }
+
+    def collapsed(self) -> str:
+        """
+        Collapsed stacks, one ``root;...;leaf count`` line per stack.
+        """
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+# Sampler of the request being served, if it is profiled; carried over to
+# the worker threads the request runs code in
+_current: ContextVar[Optional[Sampler]] = ContextVar("profile_sampler", default=None)
+
+
+@contextmanager
+def sampled_thread():
+    """
+    Sample the calling thread while it works for a profiled request.
+
+    For code a request runs in the threadpool; does nothing when the
+    request is not profiled.
+    """
+    sampler = _current.get()
+    if sampler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.workers.add(thread_id)
+    try:
+        yield
+    finally:
+        sampler.workers.discard(thread_id)
+
+
+def profile_requested(scope) -> bool:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile" and value.strip() in (b"1", b"true"):
+            return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[-1] in ("1", "true")
+
+
+def write_report(sampler: Sampler, scope) -> str:
+    """
+    Write the collapsed stacks of a request to ``PROFILE_DIR``; returns the path.
+    """
+    directory = settings.PROFILE_DIR or os.path.join(tempfile.gettempdir(), "pe-compass-profiles")
+    os.makedirs(directory, exist_ok=True)
+    route = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+    slug = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(directory, f"{stamp}-{scope.get('method', '')}-{slug}.folded")
+    with open(path, "w") as f:
+        f.write(sampler.collapsed())
+    return path
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware sampling the requests that ask for it.
+
+    Does nothing unless ``PROFILING`` is enabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.PROFILING or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = Sampler(threading.get_ident(), settings.PROFILE_INTERVAL_MS / 1000)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start" and sampler.stopped is None:
+                sampler.stop()
+                timing = ",".join(
+                    f"prof-{category};dur={ms:.2f}"
+                    for category, ms in sampler.breakdown().items()
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"x-profile-samples", str(sampler.samples).encode()),
+                    (b"x-profile-report", os.path.basename(write_report(sampler, scope)).encode()),
+                ]
+            await send(message)
+
+        token = _current.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current.reset(token)
+            if sampler.stopped is None:
+                sampler.stop()
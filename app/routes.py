@@ -1,431 +1,578 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.database import get_db
-from app.models import (
-    Capability, Goal, Vertical, SubVertical, Process, SubProcess, 
-    DataEntity, Application, API, ProcessLevel, ProcessCategory
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import async_engine, engine, get_db, get_sync_sessions
+from app.models import API, Application, Capability
+from app.schemas import (
+    CapabilityDetailResponse, CapabilitySearchResult, CapabilityBatchRequest,
+    CapabilityBatchResponse, HierarchyDepth, CatalogLevel, CatalogNodeResponse,
+    SubtreeCountsResponse, CapabilitySimpleResponse
 )
-from app.schemas import CapabilityDetailResponse, CapabilitySimpleResponse, ProcessResponse, SubProcessResponse, DataEntityResponse, ApplicationResponse, APIResponse
-from typing import List
+from app.hierarchy import (
+    Projection, build_capability_page, build_capabilities, catalog_version,
+    dependent_capabilities
+)
+from app.snapshot import get_snapshot, paginate
+from app.search import ranked_matches, page_matches
+from app.closure import TABLE_LEVELS, node_ancestors, subtree_counts
+from app.metrics import observe_runtime, render_metrics
+from app.compression import compressible, encoded_etag, negotiate
+from app.profiling import sampled_thread
+from app.fuzzy import fuzzy_matches, snapshot_fuzzy_matches
+from app.cache import (
+    response_cache, serialize_capabilities, serialize_capability,
+    serialize_search_results, serialize_batch, etag_matches
+)
+from typing import List, Optional
 
 router = APIRouter(prefix="/api", tags=["pe-compass"])
 
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def in_threadpool(function, *args, **kwargs):
+    """
+    Run CPU-bound ``function`` in the threadpool rather than on the event loop.
+    """
+    def call():
+        with sampled_thread():
+            return function(*args, **kwargs)
+    return await run_in_threadpool(call)
+
+
+async def run_in_session(sessions, function, *args, **kwargs):
+    """
+    Call ``function`` with a new sync session from ``sessions``, in the threadpool.
+
+    Hydrating the ORM and building the responses of a hierarchy load is
+    CPU-bound: run on the event loop through ``AsyncSession.run_sync``, it
+    would stall every other request for the whole build.
+    """
+    def call():
+        with sessions() as db:
+            return function(db, *args, **kwargs)
+    return await in_threadpool(call)
+
+
+async def data_version(db: AsyncSession) -> str:
+    """
+    Version of the data the catalog endpoints are served from.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.version
+    return await db.run_sync(catalog_version)
+
+
+def dataset_snapshot(dataset: Optional[str]):
+    """
+    The active snapshot, narrowed to ``dataset`` when one is given.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None or dataset is None:
+        return snapshot
+    return snapshot.partition(dataset)
+
+
+async def impacted_capabilities(db: AsyncSession, model, name: str, dataset: Optional[str]):
+    """
+    Capabilities above every ``model`` node named ``name``, or None if there is none.
+
+    Answered from the active snapshot when there is one, and otherwise by
+    ``dependent_capabilities``.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return await db.run_sync(dependent_capabilities, model, name, *dataset_criteria(dataset))
+    capabilities = snapshot.dependents(TABLE_LEVELS[model.__tablename__], name, dataset)
+    if capabilities is None:
+        return None
+    return [
+        CapabilitySimpleResponse(id=c.id, name=c.name, description=c.description)
+        for c in capabilities
+    ]
+
+
+def dataset_criteria(dataset: Optional[str]) -> tuple:
+    """
+    Capability criteria restricting a query to ``dataset``, if any.
+    """
+    if dataset is None:
+        return ()
+    return (Capability.dataset == dataset,)
+
+
+def page_headers(request: Request, next_cursor: Optional[int]) -> dict:
+    """
+    Headers pointing at the next keyset page, empty on the last page.
+    """
+    if next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    return {
+        "X-Next-Cursor": str(next_cursor),
+        "Link": f'<{next_url}>; rel="next"',
+    }
+
+
+async def get_dataset(
+    dataset: Optional[str] = Query(
+        None,
+        description="Only capabilities loaded from this dataset, e.g. pe or ebrd"
+    )
+) -> Optional[str]:
+    """
+    Dependency parsing the ``dataset`` query parameter.
+    """
+    return dataset
+
+
+async def require_database():
+    """
+    Dependency answering 503 on routes only the database can serve, while
+    the catalog is served from a snapshot file.
+
+    Startup skips preparing the database when it loads a snapshot file, so
+    there may be no database, or only an out of date one, behind it.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.path is not None:
+        raise HTTPException(
+            status_code=503,
+            detail="Not available while the catalog is served from a snapshot file"
+        )
+
+
+async def get_projection(
+    depth: HierarchyDepth = Query(
+        HierarchyDepth.api,
+        description="Deepest hierarchy level to include"
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated capability fields to include, e.g. id,name,processes"
+    )
+) -> Projection:
+    """
+    Dependency parsing the ``depth`` and ``fields`` query parameters.
+
+    Asking for ``processes`` with ``depth=capability`` is contradictory,
+    as that depth leaves processes out, and is rejected.
+    """
+    if fields is None:
+        return Projection(depth)
+
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(CapabilityDetailResponse.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown capability fields: {', '.join(sorted(unknown))}"
+        )
+    if "processes" in requested and depth is HierarchyDepth.capability:
+        raise HTTPException(
+            status_code=422,
+            detail="fields=processes needs a depth of process or deeper"
+        )
+    return Projection(depth, requested)
+
 
 @router.get("/capabilities", response_model=List[CapabilityDetailResponse])
-def get_all_capabilities(db: Session = Depends(get_db)):
+async def get_all_capabilities(
+    request: Request,
+    limit: int = Query(settings.MAX_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0),
+    projection: Projection = Depends(get_projection),
+    dataset: Optional[str] = Depends(get_dataset),
+    db: AsyncSession = Depends(get_db),
+    sessions=Depends(get_sync_sessions)
+):
     """
     Get all capabilities with complete details.
-    
+
     Returns all capabilities with their full hierarchy:
     - Capability details (name, description)
     - Goal, Vertical, and Sub-Vertical information
     - All associated processes with their sub-processes
     - Data entities, applications, and APIs
+
+    The catalog is returned in keyset pages by capability id, of ``limit``
+    capabilities, ``MAX_PAGE_SIZE`` by default, so no request loads more
+    than one page however large the catalog is; ``/capabilities/export``
+    streams the whole catalog. The cursor of the next page is returned in
+    the ``X-Next-Cursor`` and ``Link`` headers and is passed back as
+    ``cursor``. ``depth`` and
+    ``fields`` trim the hierarchy to the levels and fields needed, and
+    ``dataset`` restricts the catalog to one source dataset.
+
+    The serialized body is cached per data version and carries a strong
+    ETag; a matching If-None-Match is answered with 304 Not Modified.
+    Compressed copies are cached alongside it, one per content encoding
+    negotiated, each with its own ETag.
     """
-    capabilities = db.query(Capability).all()
-    if not capabilities:
-        raise HTTPException(status_code=404, detail="No capabilities found")
-    
-    result = []
-    for capability in capabilities:
-        # Get related information
-        sub_vertical = db.query(SubVertical).filter(
-            SubVertical.id == capability.sub_vertical_id
-        ).first()
-
-        vertical = db.query(Vertical).filter(
-            Vertical.id == sub_vertical.vertical_id
-        ).first()
-
-        goal = db.query(Goal).filter(
-            Goal.id == vertical.goal_id
-        ).first()
-
-        # Get processes with related data
-        processes = db.query(Process).filter(
-            Process.capability_id == capability.id
-        ).all()
-
-        processes_data = []
-        for process in processes:
-            sub_processes = db.query(SubProcess).filter(
-                SubProcess.process_id == process.id
-            ).all()
-
-            sub_processes_data = []
-            for sub_process in sub_processes:
-                data_entities = db.query(DataEntity).filter(
-                    DataEntity.sub_process_id == sub_process.id
-                ).all()
-
-                data_entities_data = []
-                for data_entity in data_entities:
-                    applications = db.query(Application).filter(
-                        Application.data_entity_id == data_entity.id
-                    ).all()
-
-                    applications_data = []
-                    for application in applications:
-                        apis = db.query(API).filter(
-                            API.application_id == application.id
-                        ).all()
-
-                        apis_data = [
-                            APIResponse(
-                                id=api.id,
-                                name=api.name,
-                                assumption=api.assumption
-                            )
-                            for api in apis
-                        ]
-
-                        applications_data.append(
-                            ApplicationResponse(
-                                id=application.id,
-                                name=application.name,
-                                apis=apis_data
-                            )
-                        )
-
-                    data_entities_data.append(
-                        DataEntityResponse(
-                            id=data_entity.id,
-                            name=data_entity.name,
-                            applications=applications_data
-                        )
-                    )
-
-                sub_processes_data.append(
-                    SubProcessResponse(
-                        id=sub_process.id,
-                        name=sub_process.name,
-                        description=sub_process.description,
-                        data_entities=data_entities_data
-                    )
-                )
-
-            process_level = None
-            process_category = None
-            if process.process_level_id:
-                pl = db.query(ProcessLevel).filter(
-                    ProcessLevel.id == process.process_level_id
-                ).first()
-                process_level = pl.name if pl else None
-
-            if process.process_category_id:
-                pc = db.query(ProcessCategory).filter(
-                    ProcessCategory.id == process.process_category_id
-                ).first()
-                process_category = pc.name if pc else None
-
-            processes_data.append(
-                ProcessResponse(
-                    id=process.id,
-                    name=process.name,
-                    description=process.description,
-                    process_level=process_level,
-                    process_category=process_category,
-                    sub_processes=sub_processes_data
-                )
-            )
+    version = await data_version(db)
+    cache_key = (
+        f"capabilities?limit={limit}&cursor={cursor}&dataset={dataset or ''}&{projection.cache_key}"
+    )
+    cached = response_cache.get(version, cache_key)
 
-        result.append(
-            CapabilityDetailResponse(
-                id=capability.id,
-                name=capability.name,
-                description=capability.description,
-                goal=goal.name if goal else "",
-                vertical=vertical.name if vertical else "",
-                sub_vertical=sub_vertical.name if sub_vertical else "",
-                processes=processes_data
+    if cached is None:
+        snapshot = dataset_snapshot(dataset)
+        if snapshot is not None:
+            capabilities, next_cursor = paginate(
+                snapshot.capabilities, cursor=cursor, limit=limit
+            )
+        else:
+            capabilities, next_cursor = await run_in_session(
+                sessions, build_capability_page, *dataset_criteria(dataset),
+                cursor=cursor, limit=limit, projection=projection
             )
+        if not capabilities and cursor is None:
+            raise HTTPException(status_code=404, detail="No capabilities found")
+        body = await in_threadpool(serialize_capabilities, capabilities, projection)
+        cached = response_cache.put(version, cache_key, body, next_cursor)
+
+    encoding = None
+    if compressible("application/json", len(cached.body)):
+        encoding = negotiate(request.headers.get("accept-encoding"))
+    etag = encoded_etag(cached.etag, encoding)
+    headers = {
+        "ETag": etag, "Vary": "Accept-Encoding", **page_headers(request, cached.next_cursor)
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = cached.body
+    if encoding is not None:
+        body = cached.encoded.get(encoding) or await in_threadpool(cached.encoded_body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=headers
+    )
+
+
+@router.get("/capabilities/export")
+async def export_capabilities(
+    projection: Projection = Depends(get_projection),
+    dataset: Optional[str] = Depends(get_dataset),
+    sessions=Depends(get_sync_sessions)
+):
+    """
+    Stream all capabilities as newline-delimited JSON.
+
+    Each line is one capability with its full hierarchy, in the same shape
+    as ``/capabilities``. Capabilities are read and written in chunks, each
+    in a session of its own, so the first lines are sent before the rest
+    of the catalog is loaded.
+    """
+    snapshot = dataset_snapshot(dataset)
+
+    def ndjson_chunk(db, cursor):
+        chunk, cursor = build_capability_page(
+            db,
+            *dataset_criteria(dataset),
+            cursor=cursor,
+            limit=settings.EXPORT_CHUNK_SIZE,
+            projection=projection
         )
-    
-    return result
+        return b"".join(serialize_capability(c, projection) + b"\n" for c in chunk), cursor
+
+    async def ndjson_lines():
+        if snapshot is not None:
+            for capability in snapshot.capabilities:
+                yield serialize_capability(capability, projection) + b"\n"
+            return
+
+        cursor = None
+        while True:
+            lines, cursor = await run_in_session(sessions, ndjson_chunk, cursor)
+            if lines:
+                yield lines
+            if cursor is None:
+                return
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 
 @router.get("/capability/{capability_name}", response_model=CapabilityDetailResponse)
-def get_capability_by_name(capability_name: str, db: Session = Depends(get_db)):
+async def get_capability_by_name(
+    capability_name: str,
+    projection: Projection = Depends(get_projection),
+    dataset: Optional[str] = Depends(get_dataset),
+    sessions=Depends(get_sync_sessions)
+):
     """
     Get capability details by capability name.
-    
+
     This endpoint returns comprehensive information about a capability including:
     - Capability name and description
     - Goal, Vertical, and Sub-Vertical information
     - All associated processes with their sub-processes
     - Data entities, applications, and APIs
+
+    A name loaded from several datasets resolves to the first one loaded;
+    pass ``dataset`` to pick the dataset.
     """
-    # Query capability
-    capability = db.query(Capability).filter(
-        Capability.name == capability_name
-    ).first()
+    snapshot = dataset_snapshot(dataset)
+    if snapshot is not None:
+        capability = snapshot.by_name.get(capability_name)
+    else:
+        capabilities = await run_in_session(
+            sessions, build_capabilities, Capability.name == capability_name,
+            *dataset_criteria(dataset), projection=projection
+        )
+        capability = capabilities[0] if capabilities else None
 
-    if not capability:
+    if capability is None:
         raise HTTPException(
             status_code=404,
             detail=f"Capability '{capability_name}' not found"
         )
 
-    # Get related information
-    sub_vertical = db.query(SubVertical).filter(
-        SubVertical.id == capability.sub_vertical_id
-    ).first()
-
-    vertical = db.query(Vertical).filter(
-        Vertical.id == sub_vertical.vertical_id
-    ).first()
-
-    goal = db.query(Goal).filter(
-        Goal.id == vertical.goal_id
-    ).first()
-
-    # Get processes with related data
-    processes = db.query(Process).filter(
-        Process.capability_id == capability.id
-    ).all()
-
-    processes_data = []
-    for process in processes:
-        sub_processes = db.query(SubProcess).filter(
-            SubProcess.process_id == process.id
-        ).all()
-
-        sub_processes_data = []
-        for sub_process in sub_processes:
-            data_entities = db.query(DataEntity).filter(
-                DataEntity.sub_process_id == sub_process.id
-            ).all()
-
-            data_entities_data = []
-            for data_entity in data_entities:
-                applications = db.query(Application).filter(
-                    Application.data_entity_id == data_entity.id
-                ).all()
-
-                applications_data = []
-                for application in applications:
-                    apis = db.query(API).filter(
-                        API.application_id == application.id
-                    ).all()
-
-                    apis_data = [
-                        APIResponse(
-                            id=api.id,
-                            name=api.name,
-                            assumption=api.assumption
-                        )
-                        for api in apis
-                    ]
-
-                    applications_data.append(
-                        ApplicationResponse(
-                            id=application.id,
-                            name=application.name,
-                            apis=apis_data
-                        )
-                    )
-
-                data_entities_data.append(
-                    DataEntityResponse(
-                        id=data_entity.id,
-                        name=data_entity.name,
-                        applications=applications_data
-                    )
-                )
-
-            sub_processes_data.append(
-                SubProcessResponse(
-                    id=sub_process.id,
-                    name=sub_process.name,
-                    description=sub_process.description,
-                    data_entities=data_entities_data
-                )
-            )
+    return Response(
+        content=serialize_capability(capability, projection),
+        media_type="application/json"
+    )
 
-        process_level = None
-        process_category = None
-        if process.process_level_id:
-            pl = db.query(ProcessLevel).filter(
-                ProcessLevel.id == process.process_level_id
-            ).first()
-            process_level = pl.name if pl else None
-
-        if process.process_category_id:
-            pc = db.query(ProcessCategory).filter(
-                ProcessCategory.id == process.process_category_id
-            ).first()
-            process_category = pc.name if pc else None
-
-        processes_data.append(
-            ProcessResponse(
-                id=process.id,
-                name=process.name,
-                description=process.description,
-                process_level=process_level,
-                process_category=process_category,
-                sub_processes=sub_processes_data
-            )
-        )
 
-    return CapabilityDetailResponse(
-        id=capability.id,
-        name=capability.name,
-        description=capability.description,
-        goal=goal.name if goal else "",
-        vertical=vertical.name if vertical else "",
-        sub_vertical=sub_vertical.name if sub_vertical else "",
-        processes=processes_data
+@router.post("/capabilities/batch", response_model=CapabilityBatchResponse)
+async def get_capabilities_batch(
+    batch: CapabilityBatchRequest,
+    projection: Projection = Depends(get_projection),
+    dataset: Optional[str] = Depends(get_dataset),
+    sessions=Depends(get_sync_sessions)
+):
+    """
+    Get several capabilities by name and/or id in one call.
+
+    All capabilities are resolved together with ``IN`` queries, so a page
+    needing many capabilities costs one request instead of one per name.
+    Capabilities are returned in request order, names first, each at most
+    once; names and ids that were not found are listed separately.
+    """
+    snapshot = dataset_snapshot(dataset)
+    if snapshot is not None:
+        by_name, by_id = snapshot.by_name, snapshot.by_id
+    else:
+        found = await run_in_session(
+            sessions,
+            build_capabilities,
+            or_(Capability.name.in_(batch.names), Capability.id.in_(batch.ids)),
+            *dataset_criteria(dataset),
+            projection=projection
+        ) if batch.names or batch.ids else []
+        # Found in id order, so a name shared by datasets keeps its lowest id
+        by_name = {capability.name: capability for capability in reversed(found)}
+        by_id = {capability.id: capability for capability in found}
+
+    result = CapabilityBatchResponse(
+        missing_names=[name for name in batch.names if name not in by_name],
+        missing_ids=[id_ for id_ in batch.ids if id_ not in by_id],
+    )
+    seen = set()
+    requested = [by_name.get(name) for name in batch.names] + [by_id.get(id_) for id_ in batch.ids]
+    for capability in requested:
+        if capability is not None and capability.id not in seen:
+            seen.add(capability.id)
+            result.capabilities.append(capability)
+
+    return Response(
+        content=await in_threadpool(serialize_batch, result, projection),
+        media_type="application/json"
     )
 
 
-@router.get("/capabilities/search", response_model=List[CapabilityDetailResponse])
-def search_capabilities(keyword: str, db: Session = Depends(get_db)):
+@router.get("/capabilities/search", response_model=List[CapabilitySearchResult])
+async def search_capabilities(
+    keyword: str,
+    request: Request,
+    fuzzy: bool = Query(False, description="Typo-tolerant trigram matching"),
+    limit: int = Query(settings.MAX_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0),
+    projection: Projection = Depends(get_projection),
+    dataset: Optional[str] = Depends(get_dataset),
+    db: AsyncSession = Depends(get_db),
+    sessions=Depends(get_sync_sessions)
+):
     """
-    Search capabilities by keyword in name or description.
-    
+    Search capabilities by keyword.
+
+    On SQLite, and from a snapshot, the keyword is matched against the
+    text of the whole hierarchy (capability, process, sub-process, data
+    entity, application and API) and results are ranked by relevance.
+    Other databases match capability name and description only. With
+    ``fuzzy=true`` the keyword is matched by trigram similarity against
+    capability, process and sub-process names and descriptions, so
+    misspellings still match.
+
     Returns all matching capabilities with their full hierarchy:
     - Capability details (name, description)
     - Goal, Vertical, and Sub-Vertical information
     - All associated processes with their sub-processes
     - Data entities, applications, and APIs
+
+    Each result carries a ``score``, higher meaning more relevant, when
+    the search is ranked. Results come in pages like ``/capabilities``,
+    ``MAX_PAGE_SIZE`` by default, with the same ``limit``/``cursor``
+    parameters, ``depth``/``fields`` projection and ``dataset`` filter.
     """
-    from sqlalchemy import or_
-    
-    capabilities = db.query(Capability).filter(
-        or_(
-            Capability.name.ilike(f"%{keyword}%"),
-            Capability.description.ilike(f"%{keyword}%")
+    snapshot = dataset_snapshot(dataset)
+    if fuzzy and snapshot is not None:
+        matches = snapshot_fuzzy_matches(
+            get_snapshot(), keyword, settings.FUZZY_THRESHOLD, dataset
+        )
+    elif fuzzy:
+        version = await data_version(db)
+        matches = await run_in_session(
+            sessions, fuzzy_matches, keyword, version, settings.FUZZY_THRESHOLD, dataset
         )
-    ).all()
+    elif snapshot is not None:
+        matches = get_snapshot().search(keyword, dataset)
+    else:
+        matches = await db.run_sync(ranked_matches, keyword, dataset)
 
-    if not capabilities:
+    if not matches and cursor is None:
         raise HTTPException(
             status_code=404,
             detail=f"No capabilities found matching keyword '{keyword}'"
         )
 
-    result = []
-    for capability in capabilities:
-        # Get related information
-        sub_vertical = db.query(SubVertical).filter(
-            SubVertical.id == capability.sub_vertical_id
-        ).first()
-
-        vertical = db.query(Vertical).filter(
-            Vertical.id == sub_vertical.vertical_id
-        ).first()
-
-        goal = db.query(Goal).filter(
-            Goal.id == vertical.goal_id
-        ).first()
-
-        # Get processes with related data
-        processes = db.query(Process).filter(
-            Process.capability_id == capability.id
-        ).all()
-
-        processes_data = []
-        for process in processes:
-            sub_processes = db.query(SubProcess).filter(
-                SubProcess.process_id == process.id
-            ).all()
-
-            sub_processes_data = []
-            for sub_process in sub_processes:
-                data_entities = db.query(DataEntity).filter(
-                    DataEntity.sub_process_id == sub_process.id
-                ).all()
-
-                data_entities_data = []
-                for data_entity in data_entities:
-                    applications = db.query(Application).filter(
-                        Application.data_entity_id == data_entity.id
-                    ).all()
-
-                    applications_data = []
-                    for application in applications:
-                        apis = db.query(API).filter(
-                            API.application_id == application.id
-                        ).all()
-
-                        apis_data = [
-                            APIResponse(
-                                id=api.id,
-                                name=api.name,
-                                assumption=api.assumption
-                            )
-                            for api in apis
-                        ]
-
-                        applications_data.append(
-                            ApplicationResponse(
-                                id=application.id,
-                                name=application.name,
-                                apis=apis_data
-                            )
-                        )
-
-                    data_entities_data.append(
-                        DataEntityResponse(
-                            id=data_entity.id,
-                            name=data_entity.name,
-                            applications=applications_data
-                        )
-                    )
-
-                sub_processes_data.append(
-                    SubProcessResponse(
-                        id=sub_process.id,
-                        name=sub_process.name,
-                        description=sub_process.description,
-                        data_entities=data_entities_data
-                    )
-                )
-
-            process_level = None
-            process_category = None
-            if process.process_level_id:
-                pl = db.query(ProcessLevel).filter(
-                    ProcessLevel.id == process.process_level_id
-                ).first()
-                process_level = pl.name if pl else None
-
-            if process.process_category_id:
-                pc = db.query(ProcessCategory).filter(
-                    ProcessCategory.id == process.process_category_id
-                ).first()
-                process_category = pc.name if pc else None
-
-            processes_data.append(
-                ProcessResponse(
-                    id=process.id,
-                    name=process.name,
-                    description=process.description,
-                    process_level=process_level,
-                    process_category=process_category,
-                    sub_processes=sub_processes_data
-                )
-            )
+    page, next_cursor = page_matches(matches, cursor=cursor, limit=limit)
+    ids = [capability_id for capability_id, _ in page]
+    if snapshot is not None:
+        capabilities = [snapshot.by_id[capability_id] for capability_id in ids]
+    else:
+        capabilities = await run_in_session(
+            sessions, build_capabilities, ids=ids, projection=projection
+        )
 
-        result.append(
-            CapabilityDetailResponse(
-                id=capability.id,
-                name=capability.name,
-                description=capability.description,
-                goal=goal.name if goal else "",
-                vertical=vertical.name if vertical else "",
-                sub_vertical=sub_vertical.name if sub_vertical else "",
-                processes=processes_data
-            )
+    def search_results():
+        scores = dict(page)
+        result = [
+            CapabilitySearchResult.model_construct(**dict(capability), score=scores[capability.id])
+            for capability in capabilities
+        ]
+        return serialize_search_results(result, projection)
+
+    return Response(
+        content=await in_threadpool(search_results),
+        media_type="application/json",
+        headers=page_headers(request, next_cursor)
+    )
+
+
+@router.get(
+    "/applications/{application_name}/capabilities",
+    response_model=List[CapabilitySimpleResponse]
+)
+async def get_application_capabilities(
+    application_name: str,
+    dataset: Optional[str] = Depends(get_dataset),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the capabilities that depend on an application.
+
+    Answers which capabilities are affected when the application goes
+    down: every application with this name is followed up through its data
+    entity, sub-process and process to its capability, in one query, or
+    from a name index of the snapshot in snapshot mode. Capabilities are
+    returned once each, in id order.
+    """
+    capabilities = await impacted_capabilities(db, Application, application_name, dataset)
+    if capabilities is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Application '{application_name}' not found"
         )
+    return capabilities
+
+
+@router.get("/apis/{api_name}/capabilities", response_model=List[CapabilitySimpleResponse])
+async def get_api_capabilities(
+    api_name: str,
+    dataset: Optional[str] = Depends(get_dataset),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the capabilities that depend on an API.
+
+    Like ``/applications/{application_name}/capabilities``, starting one
+    level lower from every API with this name.
+    """
+    capabilities = await impacted_capabilities(db, API, api_name, dataset)
+    if capabilities is None:
+        raise HTTPException(status_code=404, detail=f"API '{api_name}' not found")
+    return capabilities
+
+
+@router.get(
+    "/hierarchy/{level}/{node_id}/ancestors", response_model=List[CatalogNodeResponse],
+    dependencies=[Depends(require_database)]
+)
+async def get_ancestors(
+    level: CatalogLevel,
+    node_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get every ancestor of a node of the catalog hierarchy, nearest first.
+
+    ``level`` is the kind of node and ``node_id`` its id. Each ancestor
+    carries its ``depth`` above the node; a process has its capability,
+    process level and category at depth 1. Read from the closure table in
+    one query, whatever the depth of the node; 503 while the catalog is
+    served from a snapshot file.
+    """
+    ancestors = await db.run_sync(node_ancestors, level, node_id)
+    if ancestors is None:
+        raise HTTPException(status_code=404, detail=f"No {level.value} with id {node_id}")
+    return ancestors
+
+
+@router.get(
+    "/hierarchy/{level}/{node_id}/counts", response_model=SubtreeCountsResponse,
+    dependencies=[Depends(require_database)]
+)
+async def get_subtree_counts(
+    level: CatalogLevel,
+    node_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Count the descendants of a node of the catalog hierarchy per level.
 
-    return result
+    For example, the number of APIs below a vertical is ``counts.api`` of
+    ``/hierarchy/vertical/{id}/counts``. Levels without descendants are
+    left out. Read from the closure table in one query; 503 while the
+    catalog is served from a snapshot file.
+    """
+    counts = await db.run_sync(subtree_counts, level, node_id)
+    if counts is None:
+        raise HTTPException(status_code=404, detail=f"No {level.value} with id {node_id}")
+    return counts
 
 
 @router.get("/health")
-def health_check():
+async def health_check():
     """
     Health check endpoint.
     """
     return {"status": "ok", "message": "PE Compass API is running"}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Operational metrics in the Prometheus text format.
+
+    Request counts and latency histograms per route, in-flight requests,
+    threadpool occupancy, database pool checkouts and response cache hits.
+    """
+    observe_runtime(engine.pool, async_engine.pool)
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,5 +1,31 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from enum import Enum
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class HierarchyDepth(str, Enum):
+    """Deepest level of the capability hierarchy included in a response."""
+    capability = "capability"
+    process = "process"
+    sub_process = "sub_process"
+    data_entity = "data_entity"
+    application = "application"
+    api = "api"
+
+
+class CatalogLevel(str, Enum):
+    """Level of a node anywhere in the catalog hierarchy."""
+    goal = "goal"
+    vertical = "vertical"
+    sub_vertical = "sub_vertical"
+    capability = "capability"
+    process_level = "process_level"
+    process_category = "process_category"
+    process = "process"
+    sub_process = "sub_process"
+    data_entity = "data_entity"
+    application = "application"
+    api = "api"
 
 
 class APIResponse(BaseModel):
@@ -64,12 +90,31 @@ class CapabilityDetailResponse(BaseModel):
     goal: str
     vertical: str
     sub_vertical: str
+    dataset: Optional[str] = None
     processes: List[ProcessResponse] = []
 
     class Config:
         from_attributes = True
 
 
+class CapabilitySearchResult(CapabilityDetailResponse):
+    """Capability search hit with its relevance score (higher is better)."""
+    score: Optional[float] = None
+
+
+class CapabilityBatchRequest(BaseModel):
+    """Capabilities to look up in one call, by name and/or id."""
+    names: List[str] = Field(default=[], max_length=500)
+    ids: List[int] = Field(default=[], max_length=500)
+
+
+class CapabilityBatchResponse(BaseModel):
+    """Capabilities found for a batch lookup, in request order."""
+    capabilities: List[CapabilityDetailResponse] = []
+    missing_names: List[str] = []
+    missing_ids: List[int] = []
+
+
 class CapabilitySimpleResponse(BaseModel):
     """Simple capability response for list."""
     id: int
@@ -78,3 +123,18 @@ class CapabilitySimpleResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class CatalogNodeResponse(BaseModel):
+    """Node of the catalog hierarchy, ``depth`` levels from the node asked about."""
+    level: CatalogLevel
+    id: int
+    name: Optional[str] = None
+    depth: int
+
+
+class SubtreeCountsResponse(BaseModel):
+    """Number of descendants per level below a node of the catalog hierarchy."""
+    level: CatalogLevel
+    id: int
+    counts: Dict[CatalogLevel, int] = {}
@@ -0,0 +1,282 @@
+"""
+Full-text search over the capability hierarchy.
+
+On SQLite, capability, process, sub-process, data entity, application and
+API text is indexed in an FTS5 table and matches are ranked with BM25. Other
+databases fall back to a LIKE match on capability name and description.
+Catalog snapshots are indexed the same way in an in-memory SQLite database.
+"""
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+from sqlalchemy import bindparam, func, or_, text
+from sqlalchemy.orm import Session
+
+from app.models import Capability, CAPABILITY_SEARCH_TABLE, CAPABILITY_SEARCH_DDL
+
+# Per-column BM25 weights: a hit in the capability itself ranks highest
+BM25_WEIGHTS = "10.0, 5.0, 3.0, 2.0, 2.0, 1.0"
+
+
+def _index_statement(where: str = ""):
+    """
+    INSERT ... SELECT writing the index row of every capability.
+
+    Each level's text is aggregated per capability in one grouped pass over
+    its table, rather than a subquery per capability. ``where`` restricts
+    the capabilities, with ``{column}`` standing for the capability id
+    column of each pass.
+    """
+    def restrict(column):
+        return where.format(column=column)
+
+    return f"""
+    INSERT INTO {CAPABILITY_SEARCH_TABLE}
+        (rowid, capability, process, sub_process, data_entity, application, api)
+    SELECT
+        c.id,
+        c.name || ' ' || coalesce(c.description, ''),
+        process.text, sub_process.text, data_entity.text, application.text, api.text
+    FROM capabilities c
+    LEFT JOIN (
+        SELECT p.capability_id, group_concat(p.name || ' ' || coalesce(p.description, ''), ' ') AS text
+        FROM processes p {restrict("p.capability_id")}
+        GROUP BY p.capability_id
+    ) process ON process.capability_id = c.id
+    LEFT JOIN (
+        SELECT p.capability_id,
+               group_concat(coalesce(sp.name, '') || ' ' || coalesce(sp.description, ''), ' ') AS text
+        FROM sub_processes sp
+        JOIN processes p ON p.id = sp.process_id {restrict("p.capability_id")}
+        GROUP BY p.capability_id
+    ) sub_process ON sub_process.capability_id = c.id
+    LEFT JOIN (
+        SELECT p.capability_id, group_concat(de.name, ' ') AS text
+        FROM data_entities de
+        JOIN sub_processes sp ON sp.id = de.sub_process_id
+        JOIN processes p ON p.id = sp.process_id {restrict("p.capability_id")}
+        GROUP BY p.capability_id
+    ) data_entity ON data_entity.capability_id = c.id
+    LEFT JOIN (
+        SELECT p.capability_id, group_concat(a.name, ' ') AS text
+        FROM applications a
+        JOIN data_entities de ON de.id = a.data_entity_id
+        JOIN sub_processes sp ON sp.id = de.sub_process_id
+        JOIN processes p ON p.id = sp.process_id {restrict("p.capability_id")}
+        GROUP BY p.capability_id
+    ) application ON application.capability_id = c.id
+    LEFT JOIN (
+        SELECT p.capability_id,
+               group_concat(coalesce(api.name, '') || ' ' || coalesce(api.assumption, ''), ' ') AS text
+        FROM apis api
+        JOIN applications a ON a.id = api.application_id
+        JOIN data_entities de ON de.id = a.data_entity_id
+        JOIN sub_processes sp ON sp.id = de.sub_process_id
+        JOIN processes p ON p.id = sp.process_id {restrict("p.capability_id")}
+        GROUP BY p.capability_id
+    ) api ON api.capability_id = c.id
+    {restrict("c.id")}
+    """
+
+
+_INDEX_STATEMENT = _index_statement()
+
+# Refresh only the rows of selected capabilities
+_REFRESH_STATEMENTS = (
+    text(f"DELETE FROM {CAPABILITY_SEARCH_TABLE} WHERE rowid IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    ),
+    text(_index_statement("WHERE {column} IN :ids")).bindparams(
+        bindparam("ids", expanding=True)
+    ),
+)
+
+# Bound parameters per refresh statement, well below SQLite's limit
+REFRESH_CHUNK_SIZE = 500
+
+
+def fts_enabled(db: Session) -> bool:
+    """
+    Whether the full-text index is available for this session's database.
+    """
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def rebuild_search_index(db: Session, capability_ids=None):
+    """
+    Repopulate the full-text index from the catalog tables.
+
+    With ``capability_ids`` only the rows of those capabilities are
+    refreshed, and rows of capabilities that no longer exist are dropped.
+    Called by the seeder after every load; the caller commits.
+    """
+    if not fts_enabled(db):
+        return
+    if capability_ids is None:
+        db.execute(text(f"DELETE FROM {CAPABILITY_SEARCH_TABLE}"))
+        db.execute(text(_INDEX_STATEMENT))
+        return
+
+    capability_ids = sorted(capability_ids)
+    for start in range(0, len(capability_ids), REFRESH_CHUNK_SIZE):
+        chunk = capability_ids[start:start + REFRESH_CHUNK_SIZE]
+        for statement in _REFRESH_STATEMENTS:
+            db.execute(statement, {"ids": chunk})
+
+
+def ensure_search_index(db: Session):
+    """
+    Rebuild the full-text index if it does not have a row per capability.
+
+    Covers databases seeded before the index existed, or indexed only in
+    part since.
+    """
+    if not fts_enabled(db):
+        return
+    indexed = db.execute(text(f"SELECT count(*) FROM {CAPABILITY_SEARCH_TABLE}")).scalar()
+    if indexed != db.query(func.count(Capability.id)).scalar():
+        rebuild_search_index(db)
+        db.commit()
+
+
+def match_expression(keyword: str) -> str:
+    """
+    FTS5 query matching every word of ``keyword`` as a prefix.
+
+    Words are quoted, so FTS5 operators in user input are matched literally.
+    """
+    words = re.findall(r"\w+", keyword)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def ranked_matches(db: Session, keyword: str, dataset: Optional[str] = None):
+    """
+    Capabilities matching ``keyword`` as ``(capability_id, score)`` pairs.
+
+    With the full-text index the pairs are ordered best match first and the
+    score is the negated BM25 rank, so higher is better. The LIKE fallback
+    returns matches in id order without a score. ``dataset`` restricts the
+    matches to one dataset.
+    """
+    if not fts_enabled(db):
+        query = db.query(Capability.id).filter(
+            or_(
+                Capability.name.ilike(f"%{keyword}%"),
+                Capability.description.ilike(f"%{keyword}%")
+            )
+        )
+        if dataset is not None:
+            query = query.filter(Capability.dataset == dataset)
+        return [(row.id, None) for row in query.order_by(Capability.id)]
+
+    expression = match_expression(keyword)
+    if not expression:
+        return []
+    partition = ""
+    if dataset is not None:
+        partition = (
+            f"AND {CAPABILITY_SEARCH_TABLE}.rowid IN "
+            "(SELECT id FROM capabilities WHERE dataset = :dataset) "
+        )
+    rows = db.execute(
+        text(
+            f"SELECT rowid, bm25({CAPABILITY_SEARCH_TABLE}, {BM25_WEIGHTS}) AS bm25_rank "
+            f"FROM {CAPABILITY_SEARCH_TABLE} "
+            f"WHERE {CAPABILITY_SEARCH_TABLE} MATCH :expression {partition}"
+            "ORDER BY bm25_rank, rowid"
+        ),
+        {"expression": expression, "dataset": dataset}
+    )
+    return [(row.rowid, round(-row.bm25_rank, 4)) for row in rows]
+
+
+def _joined(texts):
+    """
+    Non-empty ``texts`` joined by spaces, or None, as ``group_concat`` does.
+    """
+    texts = [text for text in texts if text is not None]
+    return " ".join(texts) if texts else None
+
+
+def snapshot_document(capability):
+    """
+    The index row of a snapshot capability, with the text of ``_index_statement``.
+    """
+    processes = capability.processes
+    sub_processes = [sp for p in processes for sp in p.sub_processes]
+    entities = [de for sp in sub_processes for de in sp.data_entities]
+    applications = [a for de in entities for a in de.applications]
+    apis = [api for a in applications for api in a.apis]
+    return (
+        capability.id,
+        f"{capability.name} {capability.description or ''}",
+        _joined(
+            f"{p.name} {p.description or ''}" if p.name is not None else None for p in processes
+        ),
+        _joined(f"{sp.name or ''} {sp.description or ''}" for sp in sub_processes),
+        _joined(de.name for de in entities),
+        _joined(a.name for a in applications),
+        _joined(f"{api.name or ''} {api.assumption or ''}" for api in apis),
+    )
+
+
+class SnapshotSearchIndex:
+    """
+    Full-text index of snapshot capabilities in an in-memory SQLite database.
+
+    Rows hold the same text as the database index and are ranked by the
+    same query, so matches and scores agree with ``ranked_matches``.
+    """
+
+    def __init__(self, capabilities):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self._connection.execute(CAPABILITY_SEARCH_DDL.statement)
+        self._connection.executemany(
+            f"INSERT INTO {CAPABILITY_SEARCH_TABLE} "
+            "(rowid, capability, process, sub_process, data_entity, application, api) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            map(snapshot_document, capabilities)
+        )
+
+    def search(self, keyword: str):
+        """
+        Capabilities matching ``keyword`` as ``(capability_id, score)`` pairs.
+        """
+        expression = match_expression(keyword)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT rowid, bm25({CAPABILITY_SEARCH_TABLE}, {BM25_WEIGHTS}) AS bm25_rank "
+                f"FROM {CAPABILITY_SEARCH_TABLE} "
+                f"WHERE {CAPABILITY_SEARCH_TABLE} MATCH ? "
+                "ORDER BY bm25_rank, rowid",
+                (expression,)
+            ).fetchall()
+        return [(rowid, round(-bm25_rank, 4)) for rowid, bm25_rank in rows]
+
+
+def page_matches(matches, cursor=None, limit=None):
+    """
+    Page through ranked matches, continuing after the ``cursor`` capability id.
+
+    Returns the matches of the page and the cursor of the next page, or None
+    on the last page.
+    """
+    start = 0
+    if cursor is not None:
+        ids = [capability_id for capability_id, _ in matches]
+        try:
+            start = ids.index(cursor) + 1
+        except ValueError:
+            return [], None
+    if limit is None:
+        return matches[start:], None
+
+    page = matches[start:start + limit]
+    if start + limit < len(matches):
+        return page, page[-1][0]
+    return page, None
@@ -1,287 +1,521 @@
-import pandas as pd
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import SessionLocal
+from app.snapshot import get_snapshot, rebuild_snapshot
+from app.search import rebuild_search_index
 from app.models import (
     Goal, Vertical, SubVertical, Capability, Process, ProcessLevel,
-    ProcessCategory, SubProcess, DataEntity, Application, API
+    ProcessCategory, SubProcess, DataEntity, Application, API, SeedState, SeedNode,
+    DEFAULT_DATASET
 )
 import os
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..")
+CSV_PATH = os.path.join(DATA_DIR, "PEcapability.csv")
+
+# Tables in foreign key order
+SEED_ORDER = (
+    Goal, Vertical, SubVertical, Capability, ProcessLevel, ProcessCategory,
+    Process, SubProcess, DataEntity, Application, API
+)
+
+# Tables keyed by name within a dataset; the others belong to the dataset
+# of their parent
+PARTITIONED = tuple(model for model in SEED_ORDER if "dataset" in model.__table__.columns)
+
+# Parent whose natural key scopes a row's name; other rows are keyed by name
+SCOPES = {
+    Process: "capability_id",
+    SubProcess: "process_id",
+    DataEntity: "sub_process_id",
+    Application: "data_entity_id",
+    API: "application_id",
+}
+
+# Joins the parts of a natural key as stored in the seed fingerprints
+KEY_SEPARATOR = "\x1f"
+
+# Rows per DELETE ... WHERE id IN statement
+DELETE_CHUNK_SIZE = 500
+
+# Share of a dataset's rows a load may change before its closure rows
+# are rebuilt whole rather than rewritten subtree by subtree
+CLOSURE_REBUILD_SHARE = 0.25
+
+
+class SeedSource:
+    """
+    A catalog CSV and the dataset it is loaded into.
+
+    ``columns`` maps headers of the file to the seeder's column names, for
+    sources whose header differs from ``app.catalog.COLUMNS``.
+    """
+
+    def __init__(self, dataset: str, path: str, columns: dict = None):
+        self.dataset = dataset
+        self.path = path
+        self.columns = columns or {}
+
+    def __repr__(self):
+        return f"<SeedSource(dataset={self.dataset}, path={self.path})>"
+
+
+# Known sources by dataset; SEED_DATASETS selects the ones loaded at startup
+SOURCES = {
+    "pe": SeedSource("pe", CSV_PATH, {"API": "API (Assumption)"}),
+    "ebrd": SeedSource("ebrd", os.path.join(DATA_DIR, "EBRD_Compass.csv")),
+}
 
-def is_null_or_empty(value):
+
+def configured_sources():
     """
-    Check if a value is None, NaN, or empty string.
+    The sources named in ``SEED_DATASETS``.
     """
-    if value is None:
-        return True
-    if isinstance(value, float) and pd.isna(value):
-        return True
-    if isinstance(value, str) and value.strip() == "":
-        return True
-    return False
+    names = [name.strip() for name in settings.SEED_DATASETS.split(",") if name.strip()]
+    return [SOURCES[name] for name in names]
 
 
-def safe_get(row, key, default=""):
+def write_catalog(db: Session, rows):
     """
-    Safely get a value from a row, handling nulls and NaNs.
+    Insert catalog rows with one executemany per table; the caller commits.
     """
-    value = row.get(key, default)
-    if is_null_or_empty(value):
-        return default
-    return str(value).strip()
+    for model in SEED_ORDER:
+        if rows.get(model):
+            db.execute(insert(model), rows[model])
 
 
-def seed_database():
+def file_hash(path: str) -> str:
     """
-    Seed the database from CSV file.
+    SHA-256 of the file at ``path``.
     """
-    # Read CSV file
-    csv_path = os.path.join(os.path.dirname(__file__), "..", "PEcapability.csv")
-    
-    if not os.path.exists(csv_path):
-        print(f"CSV file not found at {csv_path}")
-        return False
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    df = pd.read_csv(csv_path)
-    db: Session = SessionLocal()
 
-    try:
-        # Dictionary to cache created records (to avoid duplicates)
-        goals_cache = {}
-        verticals_cache = {}
-        sub_verticals_cache = {}
-        capabilities_cache = {}
-        processes_cache = {}
-        process_levels_cache = {}
-        process_categories_cache = {}
-        sub_processes_cache = {}
-        data_entities_cache = {}
-        applications_cache = {}
-
-        for idx, row in df.iterrows():
-            # Goal
-            goal_name = safe_get(row, "Goal")
-            if not goal_name:
-                continue  # Skip rows with no goal
-            
-            if goal_name not in goals_cache:
-                goal = db.query(Goal).filter(Goal.name == goal_name).first()
-                if not goal:
-                    goal = Goal(name=goal_name)
-                    db.add(goal)
-                    db.flush()
-                goals_cache[goal_name] = goal
-            goal = goals_cache[goal_name]
-
-            # Vertical
-            vertical_name = safe_get(row, "Vertical")
-            if not vertical_name:
-                continue  # Skip rows with no vertical
-            
-            if vertical_name not in verticals_cache:
-                vertical = db.query(Vertical).filter(Vertical.name == vertical_name).first()
-                if not vertical:
-                    vertical = Vertical(name=vertical_name, goal_id=goal.id)
-                    db.add(vertical)
-                    db.flush()
-                verticals_cache[vertical_name] = vertical
-            vertical = verticals_cache[vertical_name]
-
-            # Sub-Vertical
-            sub_vertical_name = safe_get(row, "Sub-Vertical")
-            if not sub_vertical_name:
-                continue  # Skip rows with no sub-vertical
-            
-            if sub_vertical_name not in sub_verticals_cache:
-                sub_vertical = db.query(SubVertical).filter(
-                    SubVertical.name == sub_vertical_name
-                ).first()
-                if not sub_vertical:
-                    sub_vertical = SubVertical(name=sub_vertical_name, vertical_id=vertical.id)
-                    db.add(sub_vertical)
-                    db.flush()
-                sub_verticals_cache[sub_vertical_name] = sub_vertical
-            sub_vertical = sub_verticals_cache[sub_vertical_name]
-
-            # Capability
-            capability_name = safe_get(row, "Capability")
-            if not capability_name:
-                continue  # Skip rows with no capability
-            
-            if capability_name not in capabilities_cache:
-                capability = db.query(Capability).filter(
-                    Capability.name == capability_name
-                ).first()
-                if not capability:
-                    capability = Capability(
-                        name=capability_name,
-                        description=safe_get(row, "Capability Description", ""),
-                        sub_vertical_id=sub_vertical.id,
-                    )
-                    db.add(capability)
-                    db.flush()
-                capabilities_cache[capability_name] = capability
-            capability = capabilities_cache[capability_name]
-
-            # Process
-            process_name = safe_get(row, "Process")
-            if not process_name:
-                continue  # Skip rows with no process
-            
-            process_key = f"{process_name}_{capability.id}"
-            if process_key not in processes_cache:
-                process = db.query(Process).filter(
-                    Process.name == process_name,
-                    Process.capability_id == capability.id
-                ).first()
-                if not process:
-                    # Process Level
-                    process_level_name = safe_get(row, "Process Level", "")
-                    process_level_id = None
-                    if process_level_name and process_level_name not in process_levels_cache:
-                        process_level = db.query(ProcessLevel).filter(
-                            ProcessLevel.name == process_level_name
-                        ).first()
-                        if not process_level:
-                            process_level = ProcessLevel(name=process_level_name)
-                            db.add(process_level)
-                            db.flush()
-                        process_levels_cache[process_level_name] = process_level
-                    
-                    process_level_cache_entry = process_levels_cache.get(process_level_name)
-                    if process_level_cache_entry:
-                        process_level_id = process_level_cache_entry.id
-
-                    # Process Category
-                    process_category_name = safe_get(row, "Process Category", "")
-                    process_category_id = None
-                    if process_category_name and process_category_name not in process_categories_cache:
-                        process_category = db.query(ProcessCategory).filter(
-                            ProcessCategory.name == process_category_name
-                        ).first()
-                        if not process_category:
-                            process_category = ProcessCategory(name=process_category_name)
-                            db.add(process_category)
-                            db.flush()
-                        process_categories_cache[process_category_name] = process_category
-                    
-                    process_category_cache_entry = process_categories_cache.get(process_category_name)
-                    if process_category_cache_entry:
-                        process_category_id = process_category_cache_entry.id
-
-                    process = Process(
-                        name=process_name,
-                        description=safe_get(row, "Process Description", ""),
-                        capability_id=capability.id,
-                        process_level_id=process_level_id,
-                        process_category_id=process_category_id,
-                    )
-                    db.add(process)
-                    db.flush()
-                processes_cache[process_key] = process
-            process = processes_cache[process_key]
-
-            # Sub-Process
-            sub_process_name = safe_get(row, "Sub-Process", "")
-            if not sub_process_name:
-                continue  # Skip if no sub-process
-            
-            sub_process_key = f"{sub_process_name}_{process.id}"
-            if sub_process_key not in sub_processes_cache:
-                sub_process = db.query(SubProcess).filter(
-                    SubProcess.name == sub_process_name,
-                    SubProcess.process_id == process.id
-                ).first()
-                if not sub_process:
-                    sub_process = SubProcess(
-                        name=sub_process_name,
-                        description=safe_get(row, "Sub-Process Description", ""),
-                        process_id=process.id,
-                    )
-                    db.add(sub_process)
-                    db.flush()
-                sub_processes_cache[sub_process_key] = sub_process
-            
-            sub_process = sub_processes_cache.get(sub_process_key)
-
-            # Data Entity
-            data_entity_name = safe_get(row, "Data Entity", "")
-            if data_entity_name and sub_process:
-                data_entity_key = f"{data_entity_name}_{sub_process.id}"
-                if data_entity_key not in data_entities_cache:
-                    data_entity = db.query(DataEntity).filter(
-                        DataEntity.name == data_entity_name,
-                        DataEntity.sub_process_id == sub_process.id
-                    ).first()
-                    if not data_entity:
-                        data_entity = DataEntity(
-                            name=data_entity_name,
-                            sub_process_id=sub_process.id,
-                        )
-                        db.add(data_entity)
-                        db.flush()
-                    data_entities_cache[data_entity_key] = data_entity
-                data_entity = data_entities_cache[data_entity_key]
-
-                # Applications (can be multiple, separated by semicolon)
-                applications_str = safe_get(row, "Application", "")
-                if applications_str:
-                    app_names = [app.strip() for app in str(applications_str).split(";") if app.strip()]
-                    for app_name in app_names:
-                        if app_name:
-                            app_key = f"{app_name}_{data_entity.id}"
-                            if app_key not in applications_cache:
-                                application = db.query(Application).filter(
-                                    Application.name == app_name,
-                                    Application.data_entity_id == data_entity.id
-                                ).first()
-                                if not application:
-                                    application = Application(
-                                        name=app_name,
-                                        data_entity_id=data_entity.id,
-                                    )
-                                    db.add(application)
-                                    db.flush()
-                                applications_cache[app_key] = application
-                            application = applications_cache[app_key]
-
-                            # APIs (can be multiple, separated by semicolon)
-                            apis_str = safe_get(row, "API (Assumption)", "")
-                            if apis_str:
-                                api_names = [api.strip() for api in str(apis_str).split(";") if api.strip()]
-                                for api_name in api_names:
-                                    if api_name:
-                                        api = db.query(API).filter(
-                                            API.name == api_name,
-                                            API.application_id == application.id
-                                        ).first()
-                                        if not api:
-                                            api = API(
-                                                name=api_name,
-                                                assumption="",
-                                                application_id=application.id,
-                                            )
-                                            db.add(api)
+def source_hashes(sources=None):
+    """
+    Content hash of each source file that exists, by dataset.
+
+    ``sources`` defaults to the ones named in ``SEED_DATASETS``.
+    """
+    if sources is None:
+        sources = configured_sources()
+    return {
+        source.dataset: file_hash(source.path)
+        for source in sources
+        if os.path.exists(source.path)
+    }
+
+
+def _foreign_keys(model):
+    """
+    Foreign key columns of ``model`` mapped to the model they point at.
+    """
+    return {
+        column.name: next(
+            parent for parent in SEED_ORDER
+            if parent.__table__ is foreign_key.column.table
+        )
+        for column in model.__table__.columns
+        for foreign_key in column.foreign_keys
+    }
+
+
+def catalog_nodes(rows):
+    """
+    Natural key, values and fingerprint of every catalog row.
+
+    A row's natural key is its name, prefixed by the key of its parent for
+    the levels below capability. Foreign keys in the values are replaced by
+    the natural key they point at, so the fingerprint of a row does not
+    depend on the ids it happens to have. Returns a mapping of model to
+    ``{natural key: (id, values, fingerprint)}``.
+    """
+    keys = {}
+    nodes = {}
+    for model in SEED_ORDER:
+        foreign_keys = _foreign_keys(model)
+        columns = [column.name for column in model.__table__.columns if column.name != "id"]
+        scope = SCOPES.get(model)
+        keys[model], nodes[model] = {}, {}
+        for row in rows.get(model, ()):
+            values = {column: row.get(column) for column in columns}
+            for column, parent in foreign_keys.items():
+                if values[column] is not None:
+                    values[column] = keys[parent].get(values[column])
+            natural_key = (values[scope] or ()) + (row["name"],) if scope else (row["name"],)
+            fingerprint = hashlib.blake2b(
+                repr(tuple(values.values())).encode(), digest_size=8
+            ).hexdigest()
+            keys[model][row["id"]] = natural_key
+            nodes[model][natural_key] = (row["id"], values, fingerprint)
+    return nodes
+
+
+def _stored_key(key) -> str:
+    return KEY_SEPARATOR.join(part or "" for part in key)
+
+
+def _fingerprint_rows(dataset: str, model, nodes):
+    return [
+        {
+            "dataset": dataset,
+            "table_name": model.__tablename__,
+            "natural_key": _stored_key(key),
+            "row_id": row_id,
+            "fingerprint": fingerprint,
+        }
+        for key, (row_id, fingerprint) in nodes
+    ]
+
+
+def partition_rows(db: Session, dataset: str):
+    """
+    Every catalog row of ``dataset`` as a mapping of model to row dicts.
+    """
+    rows = {}
+    for model in SEED_ORDER:
+        if model in PARTITIONED:
+            query = select(model.__table__).where(model.dataset == dataset)
+            rows[model] = [dict(row._mapping) for row in db.execute(query)]
+        else:
+            parent = _foreign_keys(model)[SCOPES[model]]
+            parent_ids = {row["id"] for row in rows[parent]}
+            rows[model] = [
+                dict(row._mapping) for row in db.execute(select(model.__table__))
+                if row._mapping[SCOPES[model]] in parent_ids
+            ]
+    return rows
+
+
+def stored_nodes(db: Session, dataset: str = DEFAULT_DATASET):
+    """
+    Natural key, id and fingerprint of the rows currently in ``dataset``.
+
+    Read from the seed fingerprints. A catalog loaded before fingerprints
+    were kept is fingerprinted from its tables, and the fingerprints are
+    written so later loads can diff against them. Returns a mapping of
+    model to ``{natural key: (id, fingerprint)}``.
+    """
+    by_table = {model.__tablename__: model for model in SEED_ORDER}
+    stored = {model: {} for model in SEED_ORDER}
+    nodes = db.execute(
+        select(SeedNode.table_name, SeedNode.natural_key, SeedNode.row_id, SeedNode.fingerprint)
+        .where(SeedNode.dataset == dataset)
+    )
+    for table_name, natural_key, row_id, fingerprint in nodes:
+        stored[by_table[table_name]][tuple(natural_key.split(KEY_SEPARATOR))] = (
+            row_id, fingerprint
+        )
+    if any(stored.values()) or db.query(Goal.id).filter(Goal.dataset == dataset).first() is None:
+        return stored
+
+    for model, model_nodes in catalog_nodes(partition_rows(db, dataset)).items():
+        stored[model] = {
+            key: (row_id, fingerprint) for key, (row_id, _, fingerprint) in model_nodes.items()
+        }
+        if stored[model]:
+            db.execute(insert(SeedNode), _fingerprint_rows(dataset, model, stored[model].items()))
+    return stored
+
+
+def apply_catalog(db: Session, rows, dataset: str = DEFAULT_DATASET):
+    """
+    Bring ``dataset`` in line with ``rows`` by applying only the differences.
+
+    Rows are matched on natural key: new rows are inserted with fresh ids,
+    rows whose fingerprint changed are updated in place, and rows no longer
+    present are deleted, children first. Ids of unchanged rows are kept, and
+    the search index and the closure table are refreshed for the affected
+    capabilities and subtrees only, unless so much changed that rebuilding
+    the dataset's closure rows is cheaper. Other datasets are left untouched. The caller commits. Returns the number of
+    rows inserted, updated and removed.
+    """
+    from app.closure import rebuild_closure, update_closure
+
+    nodes = catalog_nodes(rows)
+    stored = stored_nodes(db, dataset)
+    ids = {}
+    removed = {}
+    changed_ids, removed_ids = {}, {}
+    counts = {"inserted": 0, "updated": 0, "removed": 0}
+    affected = set()
 
+    for model in SEED_ORDER:
+        new, old = nodes[model], stored[model]
+        foreign_keys = _foreign_keys(model)
+        next_id = (db.query(func.max(model.id)).scalar() or 0) + 1
+        ids[model] = {}
+        inserts, updates = [], []
+        new_fingerprints, changed_fingerprints = [], []
+
+        for key, (_, values, fingerprint) in new.items():
+            if key in old:
+                row_id, old_fingerprint = old[key]
+                if old_fingerprint == fingerprint:
+                    ids[model][key] = row_id
+                    continue
+                changes, fingerprints = updates, changed_fingerprints
+            else:
+                row_id, next_id = next_id, next_id + 1
+                changes, fingerprints = inserts, new_fingerprints
+            ids[model][key] = row_id
+            row = dict(values, id=row_id)
+            for column, parent in foreign_keys.items():
+                if row[column] is not None:
+                    row[column] = ids[parent][row[column]]
+            changes.append(row)
+            fingerprints.append((key, (row_id, fingerprint)))
+            if model is Capability or model in SCOPES:
+                affected.add(key[0])
+
+        if inserts:
+            db.execute(insert(model), inserts)
+            db.execute(insert(SeedNode), _fingerprint_rows(dataset, model, new_fingerprints))
+        if updates:
+            db.execute(update(model), updates)
+            db.execute(update(SeedNode), _fingerprint_rows(dataset, model, changed_fingerprints))
+
+        removed[model] = [key for key in old if key not in new]
+        changed_ids[model] = [row["id"] for row in inserts + updates]
+        counts["inserted"] += len(inserts)
+        counts["updated"] += len(updates)
+
+    for model in reversed(SEED_ORDER):
+        keys = removed[model]
+        row_ids = removed_ids[model] = [stored[model][key][0] for key in keys]
+        for start in range(0, len(row_ids), DELETE_CHUNK_SIZE):
+            chunk = row_ids[start:start + DELETE_CHUNK_SIZE]
+            db.execute(delete(model).where(model.id.in_(chunk)))
+            db.execute(delete(SeedNode).where(
+                SeedNode.dataset == dataset,
+                SeedNode.table_name == model.__tablename__,
+                SeedNode.row_id.in_(chunk),
+            ))
+        if model is Capability or model in SCOPES:
+            affected.update(key[0] for key in keys)
+        counts["removed"] += len(keys)
+
+    capability_ids = {
+        ids[Capability].get((name,), stored[Capability].get((name,), (None,))[0])
+        for name in affected
+    }
+    rebuild_search_index(db, capability_ids - {None})
+    # A fresh dataset, or one mostly rewritten, is rebuilt in one pass
+    # instead of looking up the subtree of every changed row
+    touched = sum(map(len, changed_ids.values())) + sum(map(len, removed_ids.values()))
+    total = sum(map(len, stored.values())) + counts["inserted"]
+    if touched > total * CLOSURE_REBUILD_SHARE:
+        rebuild_closure(db, dataset)
+    else:
+        update_closure(db, changed_ids, removed_ids)
+    return counts
+
+
+def _partition_ids(model, dataset: str):
+    """
+    SELECT of the ids of ``model`` rows that belong to ``dataset``.
+    """
+    if model in PARTITIONED:
+        return select(model.id).where(model.dataset == dataset)
+    parent = _foreign_keys(model)[SCOPES[model]]
+    return select(model.id).where(
+        getattr(model, SCOPES[model]).in_(_partition_ids(parent, dataset))
+    )
+
+
+def clear_catalog(db: Session, dataset: str = DEFAULT_DATASET) -> int:
+    """
+    Delete every catalog row and seed fingerprint of ``dataset``; the caller commits.
+
+    Returns the number of catalog rows deleted.
+    """
+    db.execute(delete(SeedNode).where(SeedNode.dataset == dataset))
+    capability_ids = db.scalars(_partition_ids(Capability, dataset)).all()
+    deleted = sum(
+        db.execute(delete(model).where(model.id.in_(_partition_ids(model, dataset)))).rowcount
+        for model in reversed(SEED_ORDER)
+    )
+    rebuild_search_index(db, capability_ids)
+    return deleted
+
+
+def stream_catalog(db: Session, source: SeedSource, chunk_size: int) -> int:
+    """
+    Load a source into its empty dataset in chunks of ``chunk_size`` rows.
+
+    Each chunk is written and committed before the next is read, so memory
+    holds one chunk plus the id of every loaded node, keyed by name and
+    parent id, rather than the whole file or ORM instances. Returns the
+    number of rows inserted.
+    """
+    from app.catalog import IdMap, catalog_rows, iter_catalog
+
+    known = {
+        model: IdMap((db.query(func.max(model.id)).scalar() or 0) + 1)
+        for model in SEED_ORDER
+    }
+    inserted = 0
+    capability_ids = []
+    for chunk in iter_catalog(source.path, chunk_size, source.columns):
+        rows = catalog_rows(chunk, known, source.dataset)
+        write_catalog(db, rows)
         db.commit()
-        print("Database seeded successfully!")
-        return True
+        inserted += sum(len(model_rows) for model_rows in rows.values())
+        capability_ids.extend(row["id"] for row in rows[Capability])
+    rebuild_search_index(db, capability_ids)
+    return inserted
 
-    except Exception as e:
-        print(f"Error seeding database: {e}")
-        db.rollback()
-        return False
-    finally:
-        db.close()
 
+def parse_source(source: SeedSource):
+    """
+    Catalog rows of a source, as loaded by ``apply_catalog``.
 
-def is_database_seeded():
+    Module-level so it can run in a worker process.
     """
-    Check if database has been seeded already.
+    from app.catalog import catalog_rows, read_catalog
+
+    return catalog_rows(read_catalog(source.path, source.columns), dataset=source.dataset)
+
+
+def _parse_sources(sources):
+    """
+    Parse ``sources``, the large ones in parallel worker processes.
+
+    Sources of at least ``SEED_PARALLEL_MIN_BYTES`` go to worker processes
+    when there are several of them; the others are parsed in-process, as
+    spawning a worker and importing the app in it takes longer than
+    parsing a small CSV.
+    """
+    large = [
+        index for index, source in enumerate(sources)
+        if os.path.getsize(source.path) >= settings.SEED_PARALLEL_MIN_BYTES
+    ]
+    workers = min(len(large), settings.SEED_WORKERS)
+    if workers <= 1:
+        return map(parse_source, sources)
+    # Spawned rather than forked: the parent may hold engine and event loop state
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    with pool:
+        futures = {index: pool.submit(parse_source, sources[index]) for index in large}
+        # The small sources are parsed here while the workers run
+        parsed = [
+            None if index in futures else parse_source(source)
+            for index, source in enumerate(sources)
+        ]
+        return [
+            futures[index].result() if index in futures else rows
+            for index, rows in enumerate(parsed)
+        ]
+
+
+def seed_database(sources=None, db: Session = None, chunk_size: int = None):
+    """
+    Seed each source's dataset from its CSV file, applying only what changed.
+
+    ``sources`` defaults to the ones named in ``SEED_DATASETS``. The content
+    hash of each CSV is kept per dataset; when it matches the last load the
+    source is skipped without being read. The changed sources are parsed,
+    large ones in parallel worker processes, then each dataset is diffed
+    against the fingerprints of its last load and the changes are written
+    in one transaction per dataset.
+
+    With a ``chunk_size`` (``SEED_CHUNK_SIZE`` by default) each changed CSV
+    is instead streamed in chunks with bounded memory, for catalogs too
+    large to diff in memory. Its dataset is then reloaded in full, and each
+    chunk is committed as it is written.
+
+    Either way, the closure table is brought up to date before a load is
+    committed: ``apply_catalog`` rewrites the rows of the subtrees it
+    changed, and a streamed dataset's rows are rebuilt.
+
+    Returns whether every source was loaded.
     """
-    db: Session = SessionLocal()
+    from app.closure import rebuild_closure
+
+    if sources is None:
+        sources = configured_sources()
+    if chunk_size is None:
+        chunk_size = settings.SEED_CHUNK_SIZE
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+
+    ok = True
+    changed = False
     try:
-        count = db.query(Goal).count()
-        return count > 0
+        pending = []
+        for source in sources:
+            if not os.path.exists(source.path):
+                print(f"CSV file not found at {source.path}")
+                ok = False
+                continue
+            content_hash = file_hash(source.path)
+            state = db.get(SeedState, source.dataset)
+            if state is not None and state.content_hash == content_hash:
+                print(f"Dataset '{source.dataset}' already up to date with {source.path}")
+                continue
+            pending.append((source, content_hash))
+
+        if chunk_size:
+            loads = (
+                (source, content_hash, None)
+                for source, content_hash in pending
+            )
+        else:
+            parsed = _parse_sources([source for source, _ in pending])
+            loads = (
+                (source, content_hash, rows)
+                for (source, content_hash), rows in zip(pending, parsed)
+            )
+
+        for source, content_hash, rows in loads:
+            try:
+                if rows is None:
+                    counts = {"inserted": 0, "updated": 0, "removed": 0}
+                    counts["removed"] = clear_catalog(db, source.dataset)
+                    counts["inserted"] = stream_catalog(db, source, chunk_size)
+                else:
+                    counts = apply_catalog(db, rows, source.dataset)
+                state = db.get(SeedState, source.dataset)
+                if state is None:
+                    state = SeedState(dataset=source.dataset, revision=0)
+                    db.add(state)
+                state.content_hash = content_hash
+                if any(counts.values()):
+                    state.revision += 1
+                    changed = True
+                    if rows is None:
+                        rebuild_closure(db, source.dataset)
+                db.commit()
+                print(
+                    "Dataset '{dataset}' seeded successfully: {inserted} inserted, "
+                    "{updated} updated, {removed} removed".format(dataset=source.dataset, **counts)
+                )
+            except Exception as e:
+                print(f"Error seeding dataset '{source.dataset}': {e}")
+                db.rollback()
+                ok = False
+
+        # Keep an active snapshot in step with the reseeded data
+        if changed and get_snapshot() is not None:
+            rebuild_snapshot(None if own_session else db)
+        return ok
+
+    except Exception as e:
+        print(f"Error seeding database: {e}")
+        db.rollback()
+        return False
     finally:
-        db.close()
+        if own_session:
+            db.close()
+
@@ -0,0 +1,224 @@
+"""
+In-memory snapshot of the capability catalog.
+
+The catalog is seeded once and only read afterwards, so in snapshot mode the
+full hierarchy is built into memory at startup and requests are answered
+without touching the database. A snapshot can also be written to a file at
+build time and loaded from it, so a new process serves the catalog without
+seeding or querying the database at all.
+"""
+import json
+import logging
+import mmap
+import os
+from bisect import bisect_right
+from types import MappingProxyType
+from typing import Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.cache import parse_capabilities, serialize_capabilities
+from app.database import SessionLocal
+from app.hierarchy import load_capabilities, build_capability_response, catalog_version
+from app.schemas import CapabilityDetailResponse
+from app.search import SnapshotSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Layout of snapshot files; files of another format are ignored
+SNAPSHOT_FILE_FORMAT = 1
+
+
+class CapabilitySnapshot:
+    """
+    Immutable view of all capabilities, keyed by name and id.
+
+    ``path`` is the snapshot file it was loaded from, if any; such a
+    snapshot may be served with no database behind it.
+    """
+
+    def __init__(
+        self, capabilities: Sequence[CapabilityDetailResponse], version: str = "",
+        path: Optional[str] = None
+    ):
+        self.version = version
+        self.path = path
+        self.capabilities = tuple(capabilities)
+        # A name used in several datasets resolves to its lowest id
+        self.by_name = MappingProxyType({c.name: c for c in reversed(self.capabilities)})
+        self.by_id = MappingProxyType({c.id: c for c in self.capabilities})
+        self._partitions = {}
+        self._dependents = None
+        self._search_index = None
+
+    def partition(self, dataset: str) -> "CapabilitySnapshot":
+        """
+        Snapshot of the capabilities of one dataset.
+        """
+        partition = self._partitions.get(dataset)
+        if partition is None:
+            partition = self._partitions[dataset] = CapabilitySnapshot(
+                [c for c in self.capabilities if c.dataset == dataset], self.version, self.path
+            )
+        return partition
+
+    def dependents(self, level: str, name: str, dataset: Optional[str] = None):
+        """
+        Capabilities above every ``level`` node named ``name``, in id order.
+
+        ``level`` is ``application`` or ``api``; both are indexed by name on
+        first use. Same contract as ``dependent_capabilities``: restricted to
+        ``dataset`` when given, and None if no node has that name.
+        """
+        if self._dependents is None:
+            self._dependents = self._index_dependents()
+        capabilities = self._dependents[level].get(name)
+        if capabilities is None:
+            return None
+        return [c for c in capabilities if dataset is None or c.dataset == dataset]
+
+    def _index_dependents(self):
+        applications, apis = {}, {}
+        for capability in self.capabilities:
+            for process in capability.processes:
+                for sub_process in process.sub_processes:
+                    for entity in sub_process.data_entities:
+                        for application in entity.applications:
+                            applications.setdefault(application.name, {})[capability.id] = capability
+                            for api in application.apis:
+                                apis.setdefault(api.name, {})[capability.id] = capability
+        # Capabilities are walked in id order, so each list is too
+        return {
+            level: {name: list(capabilities.values()) for name, capabilities in index.items()}
+            for level, index in (("application", applications), ("api", apis))
+        }
+
+    def search(self, keyword: str, dataset: Optional[str] = None):
+        """
+        Capabilities matching ``keyword`` as ``(capability_id, score)`` pairs.
+
+        Same contract as ``ranked_matches`` on SQLite: the snapshot is
+        indexed like the database on first use, so matches and scores agree.
+        Restricted to ``dataset`` when given; scores stay relative to the
+        whole catalog, as in the database.
+        """
+        if self._search_index is None:
+            self._search_index = SnapshotSearchIndex(self.capabilities)
+        matches = self._search_index.search(keyword)
+        if dataset is None:
+            return matches
+        return [match for match in matches if self.by_id[match[0]].dataset == dataset]
+
+
+def paginate(capabilities: Sequence[CapabilityDetailResponse], cursor=None, limit=None):
+    """
+    Keyset page over capabilities ordered by id.
+
+    Same contract as ``load_capability_page``: returns the page and the
+    cursor of the next page, or None on the last page.
+    """
+    start = 0
+    if cursor is not None:
+        start = bisect_right(capabilities, cursor, key=lambda c: c.id)
+    if limit is None:
+        return list(capabilities[start:]), None
+
+    page = list(capabilities[start:start + limit])
+    if start + limit < len(capabilities):
+        return page, page[-1].id
+    return page, None
+
+
+_snapshot: Optional[CapabilitySnapshot] = None
+
+
+def get_snapshot() -> Optional[CapabilitySnapshot]:
+    """
+    Return the active snapshot, or None when reads go to the database.
+    """
+    return _snapshot
+
+
+def rebuild_snapshot(db: Optional[Session] = None) -> CapabilitySnapshot:
+    """
+    Build a fresh snapshot from the database and make it the active one.
+
+    Must be called after every reseed so the snapshot reflects the new data.
+    """
+    global _snapshot
+
+    session = db or SessionLocal()
+    try:
+        version = catalog_version(session)
+        capabilities = [
+            build_capability_response(capability)
+            for capability in load_capabilities(session)
+        ]
+    finally:
+        if db is None:
+            session.close()
+
+    _snapshot = CapabilitySnapshot(capabilities, version)
+    return _snapshot
+
+
+def clear_snapshot():
+    """
+    Drop the active snapshot so reads go to the database again.
+    """
+    global _snapshot
+    _snapshot = None
+
+
+def write_snapshot_file(path: str, snapshot: CapabilitySnapshot, sources: dict = None):
+    """
+    Write ``snapshot`` to ``path`` for ``load_snapshot_file``.
+
+    The file is one line of JSON header, with the format, the data version
+    and the content hash of each source by dataset, followed by the
+    capabilities as a JSON array. It is written to a temporary file first
+    and renamed, so readers never see a partial file.
+    """
+    header = {
+        "format": SNAPSHOT_FILE_FORMAT,
+        "version": snapshot.version,
+        "sources": sources or {},
+    }
+    partial = f"{path}.tmp"
+    with open(partial, "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        f.write(serialize_capabilities(snapshot.capabilities))
+    os.replace(partial, path)
+
+
+def load_snapshot_file(path: str, sources: dict = None) -> Optional[CapabilitySnapshot]:
+    """
+    Load the snapshot written to ``path`` and make it the active one.
+
+    The file is memory-mapped and its capabilities are validated straight
+    from the mapped bytes. ``sources`` maps datasets to the content hash of
+    their current source; a file built from other contents is stale. Returns
+    None, leaving the active snapshot as it was, when the file is missing,
+    stale or of another format.
+    """
+    global _snapshot
+
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        end = mapped.find(b"\n")
+        header = json.loads(mapped[:end])
+        if header.get("format") != SNAPSHOT_FILE_FORMAT:
+            logger.warning(f"Ignoring snapshot file {path} of format {header.get('format')}")
+            return None
+        stale = [
+            dataset for dataset, content_hash in (sources or {}).items()
+            if header["sources"].get(dataset) != content_hash
+        ]
+        if stale:
+            logger.warning(f"Ignoring snapshot file {path}, built before changes to {stale}")
+            return None
+        capabilities = parse_capabilities(mapped[end + 1:])
+
+    _snapshot = CapabilitySnapshot(capabilities, header["version"], path)
+    return _snapshot
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the PE Compass API.
+
+Each benchmark is a module run with ``python -m benchmarks.<name>``.
+"""
@@ -0,0 +1,191 @@
+"""
+Throughput and responsiveness of the async routes against sync threadpool routes.
+
+Serves a synthetic catalog at increasing concurrency, once through the
+app's async handlers and once through equivalent sync handlers that run
+in Starlette's threadpool, as the routes did before they were async, and
+prints for each:
+
+- ``detail``: req/s of uncached ``/api/capability/{name}`` lookups, a
+  CPU-bound hierarchy build per request
+- ``list_cached``: req/s of ``/api/capabilities`` served from the
+  response cache, as polling dashboards do
+- ``health_p99``: 99th percentile milliseconds of ``/api/health`` pings
+  sent every 10 ms while the detail lookups run, lower being better
+
+Hierarchy builds are CPU-bound and run in the threadpool either way, so
+throughput is at parity; what the async routes buy is an event loop that
+keeps answering light requests while builds run.
+
+    python -m benchmarks.bench_async --capabilities 500 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.cache import response_cache, serialize_capabilities, serialize_capability
+from app.compression import negotiate
+from app.config import settings
+from app.database import AsyncSessionLocal, Base, SessionLocal
+from app.database import async_engine as app_async_engine, engine as app_engine
+from app.hierarchy import build_capabilities, build_capability_page, catalog_version
+from app.models import Capability
+from benchmarks.synthetic import seed_synthetic_catalog
+from main import app as async_app
+
+
+def sync_app(session_factory) -> FastAPI:
+    """
+    The benchmarked routes as sync handlers, for comparison.
+
+    Served through the same middleware stack as the app, so only the
+    handlers differ.
+    """
+    app = FastAPI()
+    for middleware in reversed(async_app.user_middleware):
+        app.add_middleware(middleware.cls, **middleware.options)
+
+    def get_sync_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/api/capability/{capability_name}")
+    def get_capability_by_name(capability_name: str, db: Session = Depends(get_sync_db)):
+        capabilities = build_capabilities(db, Capability.name == capability_name)
+        if not capabilities:
+            raise HTTPException(status_code=404)
+        return Response(serialize_capability(capabilities[0]), media_type="application/json")
+
+    @app.get("/api/capabilities")
+    def get_all_capabilities(request: Request, db: Session = Depends(get_sync_db)):
+        version = catalog_version(db)
+        cached = response_cache.get(version, "sync")
+        if cached is None:
+            capabilities, next_cursor = build_capability_page(db, limit=settings.MAX_PAGE_SIZE)
+            cached = response_cache.put(
+                version, "sync", serialize_capabilities(capabilities), next_cursor
+            )
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        if encoding is None:
+            return Response(cached.body, media_type="application/json")
+        return Response(
+            cached.encoded_body(encoding), media_type="application/json",
+            headers={"Content-Encoding": encoding}
+        )
+
+    @app.get("/api/health")
+    def health_check():
+        return {"status": "ok", "message": "PE Compass API is running"}
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, urls, requests: int, concurrency: int) -> float:
+    """
+    Issue ``requests`` requests with ``concurrency`` in flight; return req/s.
+    """
+    queue = list(range(requests))
+
+    async def worker():
+        while queue:
+            queue.pop()
+            response = await client.get(urls())
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def ping_under_load(client: httpx.AsyncClient, urls, requests: int, concurrency: int) -> float:
+    """
+    99th percentile ms of health pings sent every 10 ms during a load of ``urls``.
+    """
+    latencies = []
+    load = asyncio.ensure_future(measure(client, urls, requests, concurrency))
+    while not load.done():
+        start = time.perf_counter()
+        await client.get("/api/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    await load
+    latencies.sort()
+    return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+
+async def run(capabilities: int, requests: int, levels):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autoflush=False, bind=engine)
+    with session_factory() as db:
+        seed_synthetic_catalog(db, capabilities)
+
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, pool_size=40
+    )
+    # Point the app's own session factories at the benchmark database:
+    # with dependency overrides registered, FastAPI rebuilds every
+    # dependency of every request, which would be measured too
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    baseline = sync_app(session_factory)
+
+    def detail():
+        return f"/api/capability/Capability {random.randrange(capabilities)}"
+
+    def list_cached():
+        return "/api/capabilities"
+
+    random.seed(0)
+    print(f"{'workload':<12} {'concurrency':>11} {'sync':>9} {'async':>9} {'ratio':>6}")
+    try:
+        for name, benchmark, urls in (
+            ("detail", measure, detail),
+            ("list_cached", measure, list_cached),
+            ("health_p99", ping_under_load, detail),
+        ):
+            for concurrency in levels:
+                results = []
+                for app in (baseline, async_app):
+                    transport = httpx.ASGITransport(app=app)
+                    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                        await client.get(list_cached())
+                        results.append(await benchmark(client, urls, requests, concurrency))
+                sync_result, async_result = results
+                print(
+                    f"{name:<12} {concurrency:>11} {sync_result:>9.1f} {async_result:>9.1f} "
+                    f"{async_result / sync_result:>6.2f}"
+                )
+    finally:
+        SessionLocal.configure(bind=app_engine)
+        AsyncSessionLocal.configure(bind=app_async_engine)
+        await async_engine.dispose()
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capabilities", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+    asyncio.run(run(args.capabilities, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Seeding time of the vectorized seeder against the row-by-row seeder.
+
+Writes a synthetic catalog CSV, seeds it into fresh SQLite databases with
+each seeder, and prints wall time, rows per second and the number of SQL
+statements issued, checking that both produce the same row counts. Then
+times an incremental reseed of the largest catalog after a one-line edit.
+
+    python -m benchmarks.bench_seed --capabilities 200 500 --skip-rowwise-above 500
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.catalog import catalog_rows, read_catalog
+from app.seed import SEED_ORDER, SeedSource, seed_database, write_catalog
+from benchmarks.legacy_seed import seed_rowwise
+from benchmarks.synthetic import write_synthetic_csv
+
+
+def timed_seed(path: str, csv_path: str, vectorized: bool):
+    """
+    Seed ``csv_path`` into a new database at ``path``.
+
+    Returns seconds taken, statements executed and row counts per table.
+    """
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+    with sessionmaker(autoflush=False, bind=engine)() as db:
+        start = time.perf_counter()
+        df = read_catalog(csv_path)
+        if vectorized:
+            write_catalog(db, catalog_rows(df))
+        else:
+            seed_rowwise(db, df)
+        db.commit()
+        elapsed = time.perf_counter() - start
+        counts = {model.__tablename__: db.query(model).count() for model in SEED_ORDER}
+    engine.dispose()
+    return elapsed, len(statements), counts
+
+
+def timed_reseed(path: str, csv_path: str):
+    """
+    Seed ``csv_path``, edit one line of it and reseed.
+
+    Returns seconds taken by the full seed, by an unchanged reseed and by
+    the reseed after the edit.
+    """
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autoflush=False, bind=engine)
+    timings = []
+
+    def seed():
+        with session_factory() as db:
+            start = time.perf_counter()
+            assert seed_database([SeedSource("pe", csv_path)], db)
+            timings.append(time.perf_counter() - start)
+
+    seed()
+    seed()
+    with open(csv_path) as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace("for benchmarking", "for incremental benchmarking")
+    with open(csv_path, "w") as f:
+        f.writelines(lines)
+    seed()
+    engine.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capabilities", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument(
+        "--skip-rowwise-above", type=int, default=2000,
+        help="Only time the vectorized seeder for larger catalogs"
+    )
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    print(f"{'capabilities':>12} {'csv rows':>9} {'seeder':>10} {'seconds':>8} "
+          f"{'rows/s':>9} {'statements':>10} {'speedup':>8}")
+    try:
+        for capabilities in args.capabilities:
+            csv_path = os.path.join(directory, f"catalog_{capabilities}.csv")
+            csv_rows = write_synthetic_csv(csv_path, capabilities, args.fanout)
+
+            vectorized = timed_seed(
+                os.path.join(directory, f"vectorized_{capabilities}.db"), csv_path, True
+            )
+            results = [("vectorized", vectorized)]
+            if capabilities <= args.skip_rowwise_above:
+                rowwise = timed_seed(
+                    os.path.join(directory, f"rowwise_{capabilities}.db"), csv_path, False
+                )
+                assert rowwise[2] == vectorized[2], (rowwise[2], vectorized[2])
+                results.append(("row-wise", rowwise))
+
+            for label, (seconds, statements, _) in results:
+                speedup = seconds / vectorized[0]
+                print(f"{capabilities:>12} {csv_rows:>9} {label:>10} {seconds:>8.2f} "
+                      f"{csv_rows / seconds:>9.0f} {statements:>10} {speedup:>7.1f}x")
+
+        capabilities = max(args.capabilities)
+        full, unchanged, edited = timed_reseed(
+            os.path.join(directory, "incremental.db"),
+            os.path.join(directory, f"catalog_{capabilities}.csv"),
+        )
+        print(f"\nincremental reseed of {capabilities} capabilities: full seed {full:.2f} s, "
+              f"unchanged {unchanged * 1000:.1f} ms, one-line edit {edited * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
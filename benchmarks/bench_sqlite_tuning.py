@@ -0,0 +1,87 @@
+"""
+Read latency with and without the SQLite tuning profile.
+
+Seeds one synthetic catalog, copies it, and runs the same capability lookups
+against the default connection settings and against the tuning profile from
+``app.config.settings`` (WAL, mmap, page cache, in-memory temp store,
+query_only readers). Prints latency percentiles for each.
+
+    python -m benchmarks.bench_sqlite_tuning --capabilities 2000 --lookups 500
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, configure_sqlite
+from app.hierarchy import build_capabilities
+from app.models import Capability
+from benchmarks.synthetic import seed_synthetic_catalog
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def lookup_latencies(path: str, tuned: bool, names, lookups: int):
+    """
+    Milliseconds per capability lookup on a fresh engine over ``path``.
+    """
+    engine = create_engine(f"sqlite:///{path}")
+    if tuned:
+        configure_sqlite(engine, read_only=True)
+    session_factory = sessionmaker(autoflush=False, bind=engine)
+
+    random.seed(0)
+    samples = []
+    with session_factory() as db:
+        # Warm up the page cache before measuring
+        for name in names[:20]:
+            build_capabilities(db, Capability.name == name)
+        for _ in range(lookups):
+            name = random.choice(names)
+            start = time.perf_counter()
+            build_capabilities(db, Capability.name == name)
+            samples.append((time.perf_counter() - start) * 1000)
+            db.expunge_all()
+    engine.dispose()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capabilities", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    default_path = os.path.join(directory, "default.db")
+    tuned_path = os.path.join(directory, "tuned.db")
+
+    engine = create_engine(f"sqlite:///{default_path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        seed_synthetic_catalog(db, args.capabilities)
+    engine.dispose()
+    shutil.copyfile(default_path, tuned_path)
+
+    names = [f"Capability {i}" for i in range(args.capabilities)]
+    print(f"{'profile':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for label, path, tuned in (("default", default_path, False), ("tuned", tuned_path, True)):
+        samples = lookup_latencies(path, tuned, names, args.lookups)
+        print(
+            f"{label:>8} {percentile(samples, 0.5):>8.2f} {percentile(samples, 0.95):>8.2f} "
+            f"{percentile(samples, 0.99):>8.2f} {statistics.mean(samples):>8.2f}"
+        )
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
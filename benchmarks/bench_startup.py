@@ -0,0 +1,122 @@
+"""
+Cold start time of the API process.
+
+Starts fresh interpreters against a temporary SQLite database and times
+importing ``main``, running the startup lifespan and answering a first
+``/api/capabilities`` request, and reports whether pandas was loaded:
+
+- first boot: empty database, schema created and both datasets seeded
+- restart: seeded database with the current schema version recorded
+- restart, no schema version: the stored version removed, so the tables
+  are reflected and upgraded as before the short-circuit existed
+- restart, eager pandas: pandas imported up front, as ``app.seed`` used to
+- snapshot file: a file from ``python -m app.build_snapshot`` loaded as
+  ``SNAPSHOT_FILE`` in place of the seed phase, on an empty database
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+if {eager_pandas}:
+    import pandas
+import main
+from fastapi.testclient import TestClient
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    assert client.get("/api/capabilities?fields=id").status_code == 200
+    served = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "lifespan": started - imported,
+    "first_request": served - started,
+    "pandas": "pandas" in sys.modules,
+}}))
+"""
+
+
+def environment(db_path: str, **settings):
+    return dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PYTHONPATH=ROOT, **settings)
+
+
+def boot(db_path: str, eager_pandas: bool = False, **settings):
+    """
+    Start one API process on ``db_path`` and return its timings.
+    """
+    env = environment(db_path, **settings)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(eager_pandas=eager_pandas)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    wall = time.perf_counter() - start
+    return dict(json.loads(output.strip().splitlines()[-1]), wall=wall)
+
+
+def forget_schema_version(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM schema_version")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, "startup.db")
+    snapshot_path = os.path.join(directory, "catalog.snapshot")
+    scenarios = {
+        "first boot": [],
+        "restart": [],
+        "restart, no schema version": [],
+        "restart, eager pandas": [],
+        "snapshot file": [],
+    }
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "app.build_snapshot", "--output", snapshot_path],
+            cwd=ROOT, env=environment(os.path.join(directory, "build.db")),
+            capture_output=True, check=True
+        )
+        for _ in range(args.runs):
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            scenarios["first boot"].append(boot(db_path))
+            scenarios["restart"].append(boot(db_path))
+            forget_schema_version(db_path)
+            scenarios["restart, no schema version"].append(boot(db_path))
+            scenarios["restart, eager pandas"].append(boot(db_path, eager_pandas=True))
+            os.remove(db_path)
+            scenarios["snapshot file"].append(boot(db_path, SNAPSHOT_FILE=snapshot_path))
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"{'scenario':>27} {'import ms':>10} {'lifespan ms':>12} {'request ms':>11} "
+          f"{'process ms':>11} {'pandas':>7}")
+    for label, runs in scenarios.items():
+        median = {
+            key: statistics.median(run[key] for run in runs) * 1000
+            for key in ("import", "lifespan", "first_request", "wall")
+        }
+        print(f"{label:>27} {median['import']:>10.1f} {median['lifespan']:>12.1f} "
+              f"{median['first_request']:>11.1f} {median['wall']:>11.1f} "
+              f"{'yes' if any(run['pandas'] for run in runs) else 'no':>7}")
+
+
+if __name__ == "__main__":
+    main()
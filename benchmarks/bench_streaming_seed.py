@@ -0,0 +1,77 @@
+"""
+Peak memory of a streamed seed against a whole-file seed.
+
+Writes a synthetic catalog CSV and seeds it into fresh SQLite databases,
+once read and diffed whole and once streamed in chunks, each in its own
+process, and prints wall time and how far the process's peak resident set
+grew during the seed.
+
+    python -m benchmarks.bench_streaming_seed --capabilities 5000 --chunk-size 5000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import write_synthetic_csv
+
+
+def resident_kib() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def seed_in_process(db_path: str, csv_path: str, chunk_size: int, results):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.database import Base
+    from app.seed import SeedSource, seed_database
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(autoflush=False, bind=engine)() as db:
+        before = resident_kib()
+        start = time.perf_counter()
+        assert seed_database([SeedSource("pe", csv_path)], db, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, peak - before))
+
+
+def measure(db_path: str, csv_path: str, chunk_size: int):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=seed_in_process, args=(db_path, csv_path, chunk_size, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capabilities", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    print(f"{'capabilities':>12} {'csv MiB':>8} {'mode':>9} {'seconds':>8} {'peak growth MiB':>16}")
+    try:
+        for capabilities in args.capabilities:
+            csv_path = os.path.join(directory, f"catalog_{capabilities}.csv")
+            write_synthetic_csv(csv_path, capabilities)
+            size = os.path.getsize(csv_path) / 2 ** 20
+            for label, chunk_size in (("whole", 0), ("streamed", args.chunk_size)):
+                db_path = os.path.join(directory, f"{label}_{capabilities}.db")
+                seconds, growth = measure(db_path, csv_path, chunk_size)
+                print(f"{capabilities:>12} {size:>8.1f} {label:>9} {seconds:>8.2f} {growth / 1024:>16.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Benchmark suite of the API endpoints and the seeder on synthetic catalogs.
+
+For each catalog size a deterministic synthetic CSV (every model, fixed
+fan-out) is seeded into a fresh SQLite database, timing the seed in its
+own process for peak memory, and every endpoint is then exercised through
+the ASGI app. Per endpoint it records latency percentiles, SQL statements
+per request, peak traced memory of one request and response size, both
+decoded and as sent (compressed when ``COMPRESSION`` is on, as the client
+accepts gzip); bodies are not served from the response cache unless the
+target says so.
+
+Results are written as JSON with the commit they were measured on, and a
+previous results file can be compared against to flag regressions:
+
+    python -m benchmarks.bench_suite --capabilities 1000 10000 --output results.json
+    python -m benchmarks.bench_suite --capabilities 1000 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.cache import response_cache
+from app.database import get_db, get_sync_sessions
+from app.fuzzy import fuzzy_index
+from app.seed import SeedSource, seed_database
+from benchmarks.bench_streaming_seed import measure as measure_seed
+from benchmarks.synthetic import write_synthetic_csv
+from main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics compared against a baseline, where higher is worse
+COMPARED = (
+    "p50_ms", "p95_ms", "queries", "peak_kib", "bytes", "wire_bytes", "seconds", "reseed_ms"
+)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def targets(capabilities: int):
+    """
+    Endpoints to measure as ``(name, method, url factory, json factory, cached)``.
+
+    URL and body factories draw names and ids from the random generator
+    they are given, so each request asks for something different.
+    """
+    def name(rng):
+        return f"Capability {rng.randrange(capabilities)}"
+
+    middle = capabilities // 2
+    return [
+        ("list", "GET", lambda rng: "/api/capabilities", None, False),
+        ("list_cached", "GET", lambda rng: "/api/capabilities", None, True),
+        ("list_shallow", "GET", lambda rng: "/api/capabilities?depth=capability", None, False),
+        ("list_page", "GET",
+         lambda rng: f"/api/capabilities?limit=100&cursor={middle}", None, False),
+        ("detail", "GET", lambda rng: f"/api/capability/{name(rng)}", None, False),
+        ("batch", "POST", lambda rng: "/api/capabilities/batch",
+         lambda rng: {"names": [name(rng) for _ in range(50)]}, False),
+        ("search", "GET",
+         lambda rng: f"/api/capabilities/search?keyword={rng.randrange(capabilities)}&limit=50",
+         None, False),
+        ("search_fuzzy", "GET",
+         lambda rng: f"/api/capabilities/search?keyword=Capabilty%20{rng.randrange(capabilities)}"
+                     "&fuzzy=true&limit=50", None, False),
+        ("export", "GET", lambda rng: "/api/capabilities/export", None, False),
+        ("impact_app", "GET",
+         lambda rng: f"/api/applications/Application%20{rng.randrange(50)}.0/capabilities",
+         None, False),
+        ("impact_api", "GET",
+         lambda rng: f"/api/apis/API%20{rng.randrange(50)}.0/capabilities", None, False),
+    ]
+
+
+async def measure_endpoint(client, statements, target, iterations: int, max_seconds: float):
+    """
+    Latency, statements, memory and size of one endpoint.
+
+    Runs up to ``iterations`` requests, at least three, stopping early once
+    ``max_seconds`` have passed; then one more request under tracemalloc for
+    its peak memory. Requests are drawn from a generator seeded with the
+    endpoint name, so every run sends the same sequence.
+    """
+    name, method, url, body, cached = target
+    rng = random.Random(name)
+
+    async def request():
+        if not cached:
+            response_cache.clear()
+        response = await client.request(method, url(rng), json=body(rng) if body else None)
+        assert response.status_code == 200, (name, response.status_code)
+        return response
+
+    await request()
+    latencies, queries = [], []
+    started = time.perf_counter()
+    while len(latencies) < iterations:
+        statements.clear()
+        start = time.perf_counter()
+        response = await request()
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(statements))
+        if len(latencies) >= 3 and time.perf_counter() - started > max_seconds:
+            break
+
+    tracemalloc.start()
+    await request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "method": method,
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": max(latencies),
+        "mean_ms": statistics.mean(latencies),
+        "queries": max(queries),
+        "peak_kib": peak // 1024,
+        "bytes": len(response.content),
+        "wire_bytes": response.num_bytes_downloaded,
+    }
+
+
+async def measure_api(db_path: str, capabilities: int, iterations: int, max_seconds: float):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=AsyncAdaptedQueuePool)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    # Hierarchy builds open sync sessions in the threadpool
+    sync_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    sync_session_factory = sessionmaker(autoflush=False, bind=sync_engine)
+    statements = []
+    for target in (engine.sync_engine, sync_engine):
+        event.listen(target, "before_cursor_execute", lambda *args: statements.append(1))
+
+    async def get_bench_db():
+        async with session_factory() as db:
+            yield db
+
+    async def get_bench_sessions():
+        return sync_session_factory
+
+    app.dependency_overrides[get_db] = get_bench_db
+    app.dependency_overrides[get_sync_sessions] = get_bench_sessions
+    fuzzy_index.update((), None)
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for target in targets(capabilities):
+                results.append(
+                    await measure_endpoint(client, statements, target, iterations, max_seconds)
+                )
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_sync_sessions, None)
+        response_cache.clear()
+        await engine.dispose()
+        sync_engine.dispose()
+    return results
+
+
+def measure_seeder(db_path: str, csv_path: str, csv_rows: int):
+    """
+    Seed ``csv_path`` into a new database, then time an unchanged reseed.
+    """
+    seconds, growth = measure_seed(db_path, csv_path, 0)
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    with sessionmaker(autoflush=False, bind=engine)() as db:
+        start = time.perf_counter()
+        assert seed_database([SeedSource("pe", csv_path)], db)
+        reseed = (time.perf_counter() - start) * 1000
+    engine.dispose()
+
+    return {
+        "name": "seed",
+        "csv_rows": csv_rows,
+        "csv_bytes": os.path.getsize(csv_path),
+        "seconds": seconds,
+        "rows_per_second": csv_rows / seconds,
+        "peak_kib": growth,
+        "reseed_ms": reseed,
+        "reseed_queries": len(statements),
+    }
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "capabilities": args.capabilities,
+        "fanout": args.fanout,
+        "iterations": args.iterations,
+    }
+
+
+def compare(results, baseline, threshold: float) -> int:
+    """
+    Print how ``results`` differ from ``baseline``; return the regression count.
+
+    A metric regresses when it grew by more than ``threshold`` (a fraction),
+    except query counts, which regress on any increase.
+    """
+    previous = {(r["capabilities"], r["name"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for result in results:
+        before = previous.get((result["capabilities"], result["name"]))
+        if before is None:
+            continue
+        changes = []
+        for metric in COMPARED:
+            if metric not in result or not before.get(metric):
+                continue
+            change = result[metric] / before[metric] - 1
+            limit = 0 if metric == "queries" else threshold
+            flag = " REGRESSION" if change > limit else ""
+            regressions += bool(flag)
+            changes.append(f"{metric} {change:+.0%}{flag}")
+        print(f"{result['capabilities']:>8} {result['name']:>13}  " + ", ".join(changes))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'size':>8} {'target':>13} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'queries':>7} {'peak KiB':>9} {'bytes':>11} {'wire':>11}")
+    for r in results:
+        if r["name"] == "seed":
+            print(f"{r['capabilities']:>8} {'seed':>13} {'':>4} {r['seconds'] * 1000:>9.0f} "
+                  f"{'':>9} {'':>9} {'':>7} {r['peak_kib']:>9} {r['csv_bytes']:>11}"
+                  f"   reseed unchanged {r['reseed_ms']:.1f} ms")
+            continue
+        print(f"{r['capabilities']:>8} {r['name']:>13} {r['requests']:>4} {r['p50_ms']:>9.2f} "
+              f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['queries']:>7} "
+              f"{r['peak_kib']:>9} {r['bytes']:>11} {r['wire_bytes']:>11}")
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capabilities", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per endpoint at most")
+    parser.add_argument(
+        "--max-seconds", type=float, default=10,
+        help="Stop measuring an endpoint after this long, once it has three samples"
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="Relative growth of a metric reported as a regression"
+    )
+    args = parser.parse_args()
+
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for capabilities in args.capabilities:
+            csv_path = os.path.join(directory, f"catalog_{capabilities}.csv")
+            db_path = os.path.join(directory, f"catalog_{capabilities}.db")
+            csv_rows = write_synthetic_csv(csv_path, capabilities, args.fanout)
+            size_results = [measure_seeder(db_path, csv_path, csv_rows)]
+            size_results += asyncio.run(
+                measure_api(db_path, capabilities, args.iterations, args.max_seconds)
+            )
+            for result in size_results:
+                result["capabilities"] = capabilities
+            print_results(size_results)
+            results += size_results
+    finally:
+        shutil.rmtree(directory)
+
+    report = {"meta": metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
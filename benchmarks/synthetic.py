@@ -0,0 +1,140 @@
+"""
+Deterministic synthetic catalog for benchmarks.
+
+Builds a catalog of any size with a fixed fan-out at every level of the
+hierarchy, written with one bulk insert per table or as a seed CSV.
+"""
+import csv
+
+from sqlalchemy import insert
+
+from app.models import (
+    Goal, Vertical, SubVertical, Capability, Process, ProcessLevel,
+    ProcessCategory, SubProcess, DataEntity, Application, API
+)
+from app.catalog import COLUMNS
+
+
+def synthetic_rows(capabilities: int, fanout: int = 2):
+    """
+    Rows for every table of a catalog with ``capabilities`` capabilities.
+
+    Every process, sub-process, data entity and application has ``fanout``
+    children. Returns a mapping of model to a list of row dicts with ids
+    assigned, in insertion order.
+    """
+    rows = {model: [] for model in (
+        Goal, Vertical, SubVertical, ProcessLevel, ProcessCategory, Capability,
+        Process, SubProcess, DataEntity, Application, API
+    )}
+    counters = {model: 0 for model in rows}
+
+    def add(model, **values):
+        counters[model] += 1
+        rows[model].append({"id": counters[model], **values})
+        return counters[model]
+
+    goals = max(1, capabilities // 1000)
+    for g in range(goals):
+        add(Goal, name=f"Goal {g}")
+    for v in range(goals * 4):
+        add(Vertical, name=f"Vertical {v}", goal_id=v % goals + 1)
+    sub_verticals = max(1, capabilities // 10)
+    for s in range(sub_verticals):
+        add(SubVertical, name=f"Sub-Vertical {s}", vertical_id=s % (goals * 4) + 1)
+    for level in range(3):
+        add(ProcessLevel, name=f"Process level {level + 1}")
+    for category in ("Front office", "Middle office", "Back office"):
+        add(ProcessCategory, name=category)
+
+    for c in range(capabilities):
+        capability_id = add(
+            Capability,
+            name=f"Capability {c}",
+            description=f"Synthetic capability {c} for benchmarking",
+            sub_vertical_id=c % sub_verticals + 1,
+        )
+        for p in range(fanout):
+            process_id = add(
+                Process,
+                name=f"Process {c}.{p}",
+                description=f"Process {p} of capability {c}",
+                capability_id=capability_id,
+                process_level_id=p % 3 + 1,
+                process_category_id=c % 3 + 1,
+            )
+            for s in range(fanout):
+                sub_process_id = add(
+                    SubProcess,
+                    name=f"Sub-Process {c}.{p}.{s}",
+                    description=f"Sub-process {s} of process {c}.{p}",
+                    process_id=process_id,
+                )
+                for d in range(fanout):
+                    data_entity_id = add(
+                        DataEntity,
+                        name=f"Data Entity {c}.{p}.{s}.{d}",
+                        sub_process_id=sub_process_id,
+                    )
+                    for a in range(fanout):
+                        application_id = add(
+                            Application,
+                            name=f"Application {c % 50}.{a}",
+                            data_entity_id=data_entity_id,
+                        )
+                        for i in range(fanout):
+                            add(
+                                API,
+                                name=f"API {c % 50}.{a}.{i}",
+                                assumption="",
+                                application_id=application_id,
+                            )
+    return rows
+
+
+def seed_synthetic_catalog(db, capabilities: int, fanout: int = 2):
+    """
+    Write a synthetic catalog through the given session and commit it.
+    """
+    for model, model_rows in synthetic_rows(capabilities, fanout).items():
+        if model_rows:
+            db.execute(insert(model), model_rows)
+    db.commit()
+
+
+def write_synthetic_csv(path: str, capabilities: int, fanout: int = 2):
+    """
+    Write a catalog CSV in the seeder's column layout.
+
+    One row per data entity, each listing ``fanout`` applications and
+    ``fanout`` APIs; returns the number of rows written.
+    """
+    goals = max(1, capabilities // 1000)
+    sub_verticals = max(1, capabilities // 10)
+    written = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for c in range(capabilities):
+            s_v = c % sub_verticals
+            v = s_v % (goals * 4)
+            prefix = [
+                f"Goal {v % goals}", f"Vertical {v}", f"Sub-Vertical {s_v}",
+                f"Capability {c}", f"Synthetic capability {c} for benchmarking",
+            ]
+            applications = "; ".join(f"Application {c % 50}.{a}" for a in range(fanout))
+            apis = "; ".join(f"API {c % 50}.{i}" for i in range(fanout))
+            for p in range(fanout):
+                process = [
+                    f"Process {c}.{p}", f"Process {p} of capability {c}",
+                    f"Process level {p % 3 + 1}", ("Front office", "Middle office", "Back office")[c % 3],
+                ]
+                for s in range(fanout):
+                    sub_process = [f"Sub-Process {c}.{p}.{s}", f"Sub-process {s} of process {c}.{p}"]
+                    for d in range(fanout):
+                        writer.writerow(
+                            prefix + process + sub_process
+                            + [f"Data Entity {c}.{p}.{s}.{d}", applications, apis]
+                        )
+                        written += 1
+    return written
@@ -3,19 +3,55 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from app.database import engine, Base
+from app.config import settings
+from app.database import engine, async_engine, SessionLocal
 from app.models import (
     Goal, Vertical, SubVertical, Capability, Process, 
     ProcessLevel, ProcessCategory, SubProcess, DataEntity, Application, API
 )
-from app.seed import seed_database, is_database_seeded
+from app.seed import seed_database, source_hashes
+from app.migrations import ensure_schema
+from app.compression import CompressionMiddleware
+from app.instrumentation import QueryStatsMiddleware
+from app.metrics import MetricsMiddleware
+from app.profiling import ProfilingMiddleware
 from app.routes import router
+from app.snapshot import rebuild_snapshot, load_snapshot_file
+from app.search import ensure_search_index
+from app.closure import ensure_closure
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def prepare_database():
+    """
+    Create, upgrade and seed the database, and build the snapshot if enabled.
+    """
+    # Create and upgrade the tables, unless the stored schema version
+    # shows the database is already current
+    schema_changed = ensure_schema(engine)
+    if schema_changed:
+        # Index catalogs seeded before the full-text index or the closure
+        # table existed first: the seeder only refreshes what it changes
+        db = SessionLocal()
+        try:
+            ensure_search_index(db)
+            ensure_closure(db)
+        finally:
+            db.close()
+
+    # Seed the database; only changes since the last load are applied, and
+    # sources that did not change are not parsed at all
+    seed_database()
+
+    # Build the in-memory catalog snapshot
+    if settings.SNAPSHOT_MODE:
+        snapshot = rebuild_snapshot()
+        logger.info(f"Snapshot built with {len(snapshot.capabilities)} capabilities")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -24,22 +60,22 @@ async def lifespan(app: FastAPI):
     # Startup logic
     logger.info("Starting up PE Compass API...")
     
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-    
-    # Seed database if not already seeded
-    if not is_database_seeded():
-        logger.info("Database not seeded. Seeding now...")
-        seed_database()
-        logger.info("Database seeded successfully")
+    # A prebuilt snapshot file replaces the whole seed phase
+    snapshot = None
+    if settings.SNAPSHOT_FILE:
+        snapshot = load_snapshot_file(settings.SNAPSHOT_FILE, source_hashes())
+    if snapshot is not None:
+        logger.info(
+            f"Serving {len(snapshot.capabilities)} capabilities from {settings.SNAPSHOT_FILE}"
+        )
     else:
-        logger.info("Database already seeded, skipping seed process")
-    
+        prepare_database()
+
     yield
     
     # Shutdown logic
     logger.info("Shutting down PE Compass API...")
+    await async_engine.dispose()
 
 
 # Create FastAPI app
@@ -59,12 +95,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses for clients that accept it
+app.add_middleware(CompressionMiddleware)
+
+# Count and time the SQL statements of each request
+app.add_middleware(QueryStatsMiddleware)
+
+# Per-route request metrics for /api/metrics
+app.add_middleware(MetricsMiddleware)
+
+# Sampling profiles of requests that ask for one, when PROFILING is on
+app.add_middleware(ProfilingMiddleware)
+
 # Include routes
 app.include_router(router)
 
 
 @app.get("/")
-def root():
+async def root():
     """Root endpoint."""
     return {
         "message": "PE Compass API",
@@ -74,6 +122,13 @@ def root():
             "all_capabilities": "/api/capabilities",
             "capability_details": "/api/capability/{capability_name}",
             "search_capabilities": "/api/capabilities/search?keyword=your_keyword",
+            "export_capabilities": "/api/capabilities/export",
+            "batch_capabilities": "POST /api/capabilities/batch",
+            "application_capabilities": "/api/applications/{application_name}/capabilities",
+            "api_capabilities": "/api/apis/{api_name}/capabilities",
+            "ancestors": "/api/hierarchy/{level}/{node_id}/ancestors",
+            "subtree_counts": "/api/hierarchy/{level}/{node_id}/counts",
+            "metrics": "/api/metrics",
             "docs": "/docs",
             "openapi": "/openapi.json"
         }
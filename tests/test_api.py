@@ -1,16 +1,41 @@
 """
 Test suite for PE Compass API
 """
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
-from app.database import get_db, Base
+from app.database import get_db, get_sync_sessions, Base, async_database_url, configure_sqlite
+from app.snapshot import (
+    rebuild_snapshot, clear_snapshot, get_snapshot, write_snapshot_file, load_snapshot_file
+)
+from app.cache import response_cache
+from app.search import rebuild_search_index, ensure_search_index
+from app.closure import rebuild_closure, ensure_closure
+from app.fuzzy import TrigramIndex, fuzzy_index
+from app.seed import (
+    seed_database, write_catalog, apply_catalog, source_hashes, SEED_ORDER, SeedSource,
+    parse_source, _parse_sources
+)
+from app.catalog import read_catalog, iter_catalog, catalog_rows, IdMap
+from app.hierarchy import catalog_version
+from app.migrations import ensure_schema, upgrade_schema
+from app.instrumentation import instrument_engine
 from app.models import (
     Goal, Vertical, SubVertical, Capability, Process,
-    ProcessLevel, ProcessCategory, SubProcess, DataEntity, Application, API
+    ProcessLevel, ProcessCategory, SubProcess, DataEntity, Application, API,
+    SeedState, SeedNode, CatalogClosure
 )
 
 # Create test database
@@ -21,18 +46,27 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs each request on its own event loop, so async connections
+# are not pooled across requests
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base.metadata.create_all(bind=engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def override_get_sync_sessions():
+    return TestingSessionLocal
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_sync_sessions] = override_get_sync_sessions
 
 client = TestClient(app)
 
@@ -62,28 +96,28 @@ def seed_test_data():
     db.add(capability)
     db.flush()
 
+    process_level = ProcessLevel(name="Level 1")
+    db.add(process_level)
+    db.flush()
+
+    process_category = ProcessCategory(name="Test Category")
+    db.add(process_category)
+    db.flush()
+
     process = Process(
         name="Test Process",
         description="Test Process Description",
         capability_id=capability.id,
+        process_level_id=process_level.id,
+        process_category_id=process_category.id,
     )
     db.add(process)
     db.flush()
 
-    process_level = ProcessLevel(level="Level 1")
-    db.add(process_level)
-    db.flush()
-
-    process_category = ProcessCategory(name="Test Category")
-    db.add(process_category)
-    db.flush()
-
     sub_process = SubProcess(
         name="Test Sub-Process",
         description="Test Sub-Process Description",
         process_id=process.id,
-        process_level_id=process_level.id,
-        process_category_id=process_category.id,
     )
     db.add(sub_process)
     db.flush()
@@ -99,10 +133,114 @@ def seed_test_data():
     api = API(name="Test API", application_id=application.id)
     db.add(api)
 
+    db.flush()
+    rebuild_search_index(db)
+    bump_revision(db)
+    db.commit()
+    db.close()
+
+
+def bump_revision(db):
+    """Record a write to the catalog in the seed state, as the seeder does."""
+    state = db.get(SeedState, "fixtures")
+    if state is None:
+        state = SeedState(dataset="fixtures", revision=0)
+        db.add(state)
+    # Fresh per write, so versions differ across databases recreated by tests
+    state.content_hash = os.urandom(8).hex()
+    state.revision += 1
+
+
+def seed_catalog(count, start=0):
+    """Seed ``count`` capabilities, each with a full two-way fan-out below it."""
+    db = TestingSessionLocal()
+
+    goal = db.query(Goal).filter(Goal.name == "Catalog Goal").first()
+    if not goal:
+        goal = Goal(name="Catalog Goal")
+        vertical = Vertical(name="Catalog Vertical", goal=goal)
+        sub_vertical = SubVertical(name="Catalog Sub-Vertical", vertical=vertical)
+        db.add(goal)
+    else:
+        sub_vertical = goal.verticals[0].sub_verticals[0]
+
+    level = ProcessLevel(name=f"Level {start}")
+    category = ProcessCategory(name=f"Category {start}")
+
+    for i in range(start, start + count):
+        capability = Capability(name=f"Capability {i}", sub_vertical=sub_vertical)
+        for p in range(2):
+            process = Process(
+                name=f"Process {i}.{p}",
+                capability=capability,
+                process_level=level,
+                process_category=category,
+            )
+            for s in range(2):
+                sub_process = SubProcess(name=f"Sub-Process {i}.{p}.{s}", process=process)
+                data_entity = DataEntity(name=f"Data Entity {i}.{p}.{s}", sub_process=sub_process)
+                for a in range(2):
+                    application = Application(
+                        name=f"Application {i}.{p}.{s}.{a}", data_entity=data_entity
+                    )
+                    API(name=f"API {i}.{p}.{s}.{a}", application=application)
+        db.add(capability)
+
+    db.flush()
+    rebuild_search_index(db)
+    bump_revision(db)
     db.commit()
     db.close()
 
 
+class QueryCounter:
+    """Count the SQL statements executed against the test engines."""
+
+    engines = (engine, async_engine.sync_engine)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        for target in self.engines:
+            event.listen(target, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        for target in self.engines:
+            event.remove(target, "before_cursor_execute", self)
+
+
+class QueryPlanChecker(QueryCounter):
+    """Collect the SELECTs run against the test engines and check their plans."""
+
+    # A table walked end to end, directly or through one of its indexes
+    # ("SCAN t USING [COVERING] INDEX i"), rather than searched
+    FULL_SCAN = re.compile(r"SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?")
+
+    def __init__(self):
+        super().__init__()
+        self.statements = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.setdefault(statement, parameters)
+
+    def full_scans(self) -> dict:
+        """Tables scanned in full, mapped to a statement that scans them."""
+        scans = {}
+        with engine.connect() as conn:
+            for statement, parameters in self.statements.items():
+                for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                    match = self.FULL_SCAN.fullmatch(row[3])
+                    if match:
+                        scans.setdefault(match.group(1), " ".join(statement.split()))
+        return scans
+
+
 class TestHealthEndpoint:
     def test_health_check(self):
         """Test health check endpoint."""
@@ -145,6 +283,1858 @@ class TestCapabilityEndpoints:
         assert response.status_code == 200
         assert isinstance(response.json(), list)
 
+    def test_capability_hierarchy(self):
+        """Test that the full hierarchy is returned for a capability."""
+        response = client.get("/api/capability/Test%20Capability")
+        process = response.json()["processes"][0]
+        assert process["process_level"] == "Level 1"
+        assert process["process_category"] == "Test Category"
+        sub_process = process["sub_processes"][0]
+        assert sub_process["name"] == "Test Sub-Process"
+        application = sub_process["data_entities"][0]["applications"][0]
+        assert application["name"] == "Test Application"
+        assert application["apis"][0]["name"] == "Test API"
+
+    def test_builds_off_event_loop(self, monkeypatch):
+        """Test that hierarchy builds run in the threadpool, leaving the event loop free."""
+        import asyncio
+        import app.routes
+        from app.hierarchy import build_capabilities, build_capability_page
+
+        loops = []
+
+        def on_loop():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return False
+            return True
+
+        def recording(build):
+            def wrapper(*args, **kwargs):
+                loops.append(on_loop())
+                return build(*args, **kwargs)
+            return wrapper
+
+        monkeypatch.setattr(app.routes, "build_capabilities", recording(build_capabilities))
+        monkeypatch.setattr(app.routes, "build_capability_page", recording(build_capability_page))
+        response_cache.clear()
+        assert client.get("/api/capabilities").status_code == 200
+        assert client.get("/api/capability/Test%20Capability").status_code == 200
+        assert client.post("/api/capabilities/batch", json={"names": ["Test Capability"]}).status_code == 200
+        assert loops == [False, False, False]
+
+
+class TestHierarchyQueryCount:
+    @classmethod
+    def setup_class(cls):
+        """Reset the database before counting queries."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+    @pytest.mark.parametrize("url, start", [
+        ("/api/capabilities", 0),
+        ("/api/capabilities/search?keyword=Capability", 1000),
+    ])
+    def test_query_count_is_constant(self, url, start):
+        """Test that the number of queries does not grow with the catalog."""
+        seed_catalog(2, start=start)
+        with QueryCounter() as small:
+            response = client.get(url)
+        assert response.status_code == 200
+        small_size = len(response.json())
+
+        seed_catalog(20, start=start + 100)
+        with QueryCounter() as large:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert len(response.json()) == small_size + 20
+        assert large.count == small.count
+
+    def test_capability_by_name_query_count(self):
+        """Test that a single capability is loaded in a fixed number of queries."""
+        seed_catalog(1, start=2000)
+        with QueryCounter() as counter:
+            response = client.get("/api/capability/Capability%202000")
+        assert response.status_code == 200
+        assert len(response.json()["processes"]) == 2
+        assert counter.count <= 6
+
+
+class TestSnapshotMode:
+    @classmethod
+    def setup_class(cls):
+        """Build a snapshot over a small catalog."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_test_data()
+        seed_catalog(3)
+        db = TestingSessionLocal()
+        rebuild_snapshot(db)
+        db.close()
+
+    @classmethod
+    def teardown_class(cls):
+        clear_snapshot()
+
+    @pytest.mark.parametrize("url", [
+        "/api/capabilities",
+        "/api/capability/Test%20Capability",
+        "/api/capabilities/search?keyword=capability%201",
+    ])
+    def test_served_without_sql(self, url):
+        """Test that snapshot reads do not touch the database."""
+        with QueryCounter() as counter:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert counter.count == 0
+
+    def test_matches_database(self):
+        """Test that the snapshot serves the same payload as the database."""
+        from_snapshot = client.get("/api/capabilities").json()
+        clear_snapshot()
+        response_cache.clear()
+        try:
+            from_database = client.get("/api/capabilities").json()
+        finally:
+            db = TestingSessionLocal()
+            rebuild_snapshot(db)
+            db.close()
+        assert from_snapshot == from_database
+
+    def test_search(self):
+        """Test ranked search against the snapshot."""
+        response = client.get("/api/capabilities/search?keyword=capability%201")
+        assert response.json()[0]["name"] == "Capability 1"
+        response = client.get("/api/capabilities/search?keyword=nothing")
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("query", [
+        "keyword=capability%201",
+        "keyword=api",
+        "keyword=data%20entity%201",
+        "keyword=process",
+        "keyword=application&dataset=pe",
+    ])
+    def test_search_matches_database(self, query):
+        """Test that the snapshot matches and scores like the full-text index."""
+        url = f"/api/capabilities/search?{query}"
+        from_snapshot = client.get(url).json()
+        clear_snapshot()
+        try:
+            from_database = client.get(url).json()
+        finally:
+            db = TestingSessionLocal()
+            rebuild_snapshot(db)
+            db.close()
+        assert len(from_database) > 1
+        assert [(c["name"], c["score"]) for c in from_snapshot] == [
+            (c["name"], c["score"]) for c in from_database
+        ]
+
+    def test_not_found(self):
+        """Test a missing capability in snapshot mode."""
+        assert get_snapshot() is not None
+        response = client.get("/api/capability/Nonexistent")
+        assert response.status_code == 404
+
+
+class TestSnapshotFile:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_test_data()
+        seed_catalog(3)
+        response_cache.clear()
+
+    def teardown_method(self):
+        clear_snapshot()
+
+    def write(self, path, sources=None):
+        db = TestingSessionLocal()
+        try:
+            snapshot = rebuild_snapshot(db)
+        finally:
+            db.close()
+        write_snapshot_file(str(path), snapshot, sources)
+        clear_snapshot()
+        return snapshot
+
+    def test_round_trip(self, tmp_path):
+        """Test that a loaded snapshot file serves the catalog without SQL."""
+        from_database = client.get("/api/capabilities").json()
+        built = self.write(tmp_path / "catalog.snapshot", {"pe": "abc"})
+
+        loaded = load_snapshot_file(str(tmp_path / "catalog.snapshot"), {"pe": "abc"})
+        assert get_snapshot() is loaded
+        assert loaded.version == built.version
+        assert loaded.capabilities == built.capabilities
+
+        with QueryCounter() as counter:
+            assert client.get("/api/capabilities").json() == from_database
+            fuzzy = client.get("/api/capabilities/search?keyword=capabilty&fuzzy=true")
+        assert fuzzy.status_code == 200
+        assert counter.count == 0
+
+    def test_unusable_files(self, tmp_path):
+        """Test that missing, stale and foreign snapshot files are ignored."""
+        path = tmp_path / "catalog.snapshot"
+        assert load_snapshot_file(str(path)) is None
+
+        self.write(path, {"pe": "abc"})
+        assert load_snapshot_file(str(path), {"pe": "def"}) is None
+        assert load_snapshot_file(str(path), {"ebrd": "abc"}) is None
+
+        header, body = path.read_bytes().split(b"\n", 1)
+        path.write_bytes(json.dumps(dict(json.loads(header), format=0)).encode() + b"\n" + body)
+        assert load_snapshot_file(str(path), {"pe": "abc"}) is None
+        assert get_snapshot() is None
+
+    def test_startup_from_file(self, tmp_path, monkeypatch):
+        """Test that startup serves a current snapshot file instead of seeding."""
+        import main
+        from app.config import settings
+        path = tmp_path / "catalog.snapshot"
+        self.write(path, source_hashes())
+
+        def seed_phase():
+            raise AssertionError("seed phase ran")
+
+        monkeypatch.setattr(settings, "SNAPSHOT_FILE", str(path))
+        monkeypatch.setattr(main, "prepare_database", seed_phase)
+        with TestClient(app) as started:
+            assert get_snapshot() is not None
+            assert started.get("/api/capability/Test%20Capability").status_code == 200
+
+    def test_impact_lookup(self, tmp_path):
+        """Test that impact lookups are answered from a loaded snapshot file without SQL."""
+        urls = (
+            "/api/applications/Test%20Application/capabilities",
+            "/api/applications/Application%201.0.1.1/capabilities",
+            "/api/apis/API%202.1.0.0/capabilities",
+            "/api/apis/API%202.1.0.0/capabilities?dataset=ebrd",
+            "/api/apis/Unknown/capabilities",
+        )
+        from_database = [(client.get(url).status_code, client.get(url).json()) for url in urls]
+        assert [status for status, _ in from_database] == [200, 200, 200, 200, 404]
+        assert from_database[3][1] == []
+
+        path = tmp_path / "catalog.snapshot"
+        self.write(path)
+        load_snapshot_file(str(path))
+        with QueryCounter() as counter:
+            from_snapshot = [(client.get(url).status_code, client.get(url).json()) for url in urls]
+        assert from_snapshot == from_database
+        assert counter.count == 0
+
+    def test_closure_routes_unavailable(self, tmp_path):
+        """Test that routes needing the closure table are 503 rather than failing on the database."""
+        path = tmp_path / "catalog.snapshot"
+        self.write(path)
+        load_snapshot_file(str(path))
+        urls = ("/api/hierarchy/capability/1/ancestors", "/api/hierarchy/goal/1/counts")
+        with QueryCounter() as counter:
+            for url in urls:
+                response = client.get(url)
+                assert response.status_code == 503
+                assert "snapshot file" in response.json()["detail"]
+        assert counter.count == 0
+
+        # A snapshot built from the database leaves them to it
+        db = TestingSessionLocal()
+        try:
+            rebuild_closure(db)
+            db.commit()
+            rebuild_snapshot(db)
+        finally:
+            db.close()
+        assert all(client.get(url).status_code == 200 for url in urls)
+
+
+class TestQueryStats:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_test_data()
+        response_cache.clear()
+
+    def test_headers_count_statements(self):
+        """Test that the reported statement count matches the statements run."""
+        with QueryCounter() as counter:
+            response = client.get("/api/capability/Test%20Capability")
+        assert response.status_code == 200
+        assert int(response.headers["X-DB-Queries"]) == counter.count > 0
+        timing = response.headers["Server-Timing"]
+        assert timing.startswith("db;dur=")
+        assert f'desc="{counter.count} queries"' in timing
+
+    def test_requests_counted_separately(self):
+        """Test that each request reports only its own statements."""
+        first = client.get("/api/capability/Test%20Capability")
+        second = client.get("/api/capability/Test%20Capability")
+        assert first.headers["X-DB-Queries"] == second.headers["X-DB-Queries"]
+        assert client.get("/api/health").headers["X-DB-Queries"] == "0"
+
+    def test_streamed_response(self):
+        """Test that a streamed response still carries the headers."""
+        response = client.get("/api/capabilities/export")
+        assert response.status_code == 200
+        assert "X-DB-Queries" in response.headers
+
+    def test_slow_query_log(self, monkeypatch, caplog):
+        """Test that slow statements are logged with the route that ran them."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-6)
+        with caplog.at_level("WARNING", logger="app.instrumentation"):
+            client.get("/api/capability/Test%20Capability")
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages
+        assert all("GET /api/capability/{capability_name}" in message for message in messages)
+        assert any("FROM capabilities" in message for message in messages)
+
+    def test_disabled(self, monkeypatch):
+        """Test that the headers can be switched off."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "QUERY_STATS", False)
+        response = client.get("/api/capability/Test%20Capability")
+        assert "X-DB-Queries" not in response.headers
+
+
+def metric_samples(text):
+    """Samples of a Prometheus text exposition by series."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+class TestMetrics:
+    DETAIL = 'route="/api/capability/{capability_name}"'
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_test_data()
+        response_cache.clear()
+
+    def scrape(self):
+        response = client.get("/api/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        return metric_samples(response.text)
+
+    def test_requests_by_route(self):
+        """Test that requests are counted and timed per route template."""
+        requests = f'pe_compass_http_requests_total{{method="GET",{self.DETAIL},status="200"}}'
+        missing = f'pe_compass_http_requests_total{{method="GET",{self.DETAIL},status="404"}}'
+        count = f'pe_compass_http_request_duration_seconds_count{{method="GET",{self.DETAIL}}}'
+        before = self.scrape()
+        client.get("/api/capability/Test%20Capability")
+        client.get("/api/capability/Test%20Capability")
+        client.get("/api/capability/Nonexistent")
+        client.get("/no/such/path")
+        after = self.scrape()
+
+        assert after[requests] - before.get(requests, 0) == 2
+        assert after[missing] - before.get(missing, 0) == 1
+        assert after[count] - before.get(count, 0) == 3
+        assert after[f'pe_compass_http_request_duration_seconds_bucket{{method="GET",{self.DETAIL},le="+Inf"}}'] == after[count]
+        assert 'pe_compass_http_requests_total{method="GET",route="unmatched",status="404"}' in after
+        assert after["pe_compass_http_requests_in_flight"] == 1
+
+    def test_runtime_gauges(self):
+        """Test that threadpool and response cache figures are reported."""
+        client.get("/api/capabilities")
+        client.get("/api/capabilities")
+        samples = self.scrape()
+        assert samples["pe_compass_threadpool_threads"] > 0
+        assert samples["pe_compass_threadpool_busy_threads"] >= 0
+        assert samples["pe_compass_response_cache_hits_total"] >= 1
+        assert 0 < samples["pe_compass_response_cache_hit_ratio"] <= 1
+
+    def test_pool_checkout_wait(self):
+        """Test that checkouts from the timed pool are observed."""
+        from sqlalchemy import select
+        from app.database import TimedAsyncQueuePool
+        from app.metrics import pool_checkout_wait
+
+        before = pool_checkout_wait.count()
+        timed = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=TimedAsyncQueuePool)
+
+        async def query():
+            async with timed.connect() as conn:
+                await conn.execute(select(Capability.id))
+            await timed.dispose()
+
+        asyncio.run(query())
+        assert pool_checkout_wait.count() == before + 1
+
+    def test_label_escaping(self):
+        """Test that label values are escaped as the text format requires."""
+        from app.metrics import Counter
+        counter = Counter("test_total", "Test.", ("path",))
+        counter.inc('a"b\\c')
+        assert list(counter.render())[-1] == 'test_total{path="a\\"b\\\\c"} 1'
+
+
+class TestProfiling:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(20)
+
+    def setup_method(self):
+        response_cache.clear()
+
+    def enable(self, monkeypatch, tmp_path):
+        from app.config import settings
+        monkeypatch.setattr(settings, "PROFILING", True)
+        monkeypatch.setattr(settings, "PROFILE_INTERVAL_MS", 0.1)
+        monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    def test_disabled_by_default(self, tmp_path):
+        """Test that the profile flag is ignored unless profiling is enabled."""
+        response = client.get("/api/capabilities", headers={"X-Profile": "1"})
+        assert response.status_code == 200
+        assert "x-profile-report" not in response.headers
+
+    def test_unflagged_requests_not_profiled(self, monkeypatch, tmp_path):
+        """Test that only requests asking for a profile are sampled."""
+        self.enable(monkeypatch, tmp_path)
+        response = client.get("/api/capabilities")
+        assert "x-profile-report" not in response.headers
+        assert not list(tmp_path.iterdir())
+
+    def test_profile_report(self, monkeypatch, tmp_path):
+        """Test that a flagged request writes collapsed stacks and reports a breakdown."""
+        import re
+        self.enable(monkeypatch, tmp_path)
+        for flag in ({"headers": {"X-Profile": "1"}}, {"params": {"profile": "1"}}):
+            response = client.get("/api/capabilities", **flag)
+            assert response.status_code == 200
+            assert len(response.json()) == 20
+
+            timing = ",".join(response.headers.get_list("server-timing"))
+            for category in ("sql", "orm", "serialization", "wait", "other"):
+                assert f"prof-{category};dur=" in timing
+            assert "db;dur=" in timing
+
+            report = tmp_path / response.headers["x-profile-report"]
+            assert report.name.endswith("-GET-api_capabilities.folded")
+            lines = report.read_text().splitlines()
+            assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == int(response.headers["x-profile-samples"])
+            assert all(re.fullmatch(r"[^ ;]+(;[^ ;]+)* \d+", line) for line in lines)
+            # The build runs in a worker thread, which is sampled instead of the loop
+            assert any("app.hierarchy:" in line for line in lines)
+            response_cache.clear()
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_sampler(self):
+        """Test that the sampler records the stacks of the sampled thread."""
+        import threading
+        import time
+        from app.profiling import Sampler
+
+        def busy_wait():
+            end = time.perf_counter() + 0.05
+            while time.perf_counter() < end:
+                pass
+
+        sampler = Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_wait()
+        sampler.stop()
+        assert sampler.samples > 0
+        assert any(stack[-1] == "tests.test_api:busy_wait" for stack in sampler.stacks)
+        assert sum(sampler.breakdown().values()) == pytest.approx((sampler.stopped - sampler.started) * 1000)
+
+    def test_categorize(self):
+        """Test that samples are attributed by their innermost known frame."""
+        from app.profiling import categorize
+        route = ("starlette.routing:handle", "app.routes:list_capabilities", "app.hierarchy:load_capabilities")
+        assert categorize(route + ("sqlalchemy.orm.query:all", "sqlalchemy.engine.base:execute")) == "sql"
+        assert categorize(route + ("sqlalchemy.orm.loading:instances", "sqlalchemy.util.langhelpers:go")) == "orm"
+        assert categorize(route + ("pydantic.main:__init__",)) == "serialization"
+        assert categorize(("asyncio.base_events:_run_once", "selectors:select")) == "wait"
+        assert categorize(route) == "other"
+        assert categorize(("jsonschema:validate",)) == "other"
+
+
+class TestQueryPlans:
+    # Read in full by design: one revision row per dataset, read by every
+    # catalog version check
+    ALWAYS_SCANNED = {"seed_state"}
+
+    # Hot routes as (method, url, body, tables they may read in full)
+    HOT_ROUTES = [
+        ("GET", "/api/capabilities", None, {"capabilities"}),
+        ("GET", "/api/capabilities?depth=process", None, {"capabilities"}),
+        ("GET", "/api/capabilities?dataset=pe", None, set()),
+        ("GET", "/api/capabilities?limit=5&cursor=3", None, set()),
+        ("GET", "/api/capabilities/export", None, {"capabilities"}),
+        ("GET", "/api/capability/Capability%207", None, set()),
+        ("POST", "/api/capabilities/batch", {"names": ["Capability 2", "Capability 9"]}, set()),
+        ("GET", "/api/capabilities/search?keyword=Capability", None, set()),
+        ("GET", "/api/applications/Application%207.0.1.1/capabilities", None, set()),
+        ("GET", "/api/apis/API%207.0.1.1/capabilities", None, set()),
+        ("GET", "/api/hierarchy/api/7/ancestors", None, set()),
+        ("GET", "/api/hierarchy/vertical/1/counts", None, set()),
+    ]
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(20)
+        db = TestingSessionLocal()
+        try:
+            rebuild_closure(db)
+            db.commit()
+        finally:
+            db.close()
+
+    @pytest.mark.parametrize("method, url, body, allowed", HOT_ROUTES)
+    def test_no_full_table_scans(self, method, url, body, allowed):
+        """Test that hot route queries search indexes rather than reading whole tables."""
+        response_cache.clear()
+        with QueryPlanChecker() as checker:
+            response = client.request(method, url, json=body)
+        assert response.status_code == 200
+        assert checker.statements
+        scans = {
+            table: statement for table, statement in checker.full_scans().items()
+            if table not in allowed | self.ALWAYS_SCANNED
+        }
+        assert not scans
+
+    @pytest.mark.parametrize("detail, table", [
+        ("SCAN capabilities", "capabilities"),
+        ("SCAN processes USING INDEX ix_processes_capability_id_name", "processes"),
+        ("SCAN seed_state USING COVERING INDEX sqlite_autoindex_seed_state_1", "seed_state"),
+        ("SCAN catalog_closure AS c", "catalog_closure"),
+        ("SEARCH processes USING INDEX ix_processes_capability_id_name (capability_id=?)", None),
+        ("SCAN CONSTANT ROW", None),
+        ("SCAN (subquery-1)", None),
+        ("SCAN capability_search VIRTUAL TABLE INDEX 0:M6", None),
+    ])
+    def test_full_scan_pattern(self, detail, table):
+        """Test that walks of a whole table through an index count as full scans."""
+        match = QueryPlanChecker.FULL_SCAN.fullmatch(detail)
+        assert (match.group(1) if match else None) == table
+
+    def test_upgrade_adds_foreign_key_indexes(self, tmp_path):
+        """Test that databases created before the foreign key indexes get them."""
+        old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        Base.metadata.create_all(bind=old)
+        with old.begin() as conn:
+            conn.execute(text("DROP INDEX ix_processes_capability_id_name"))
+            conn.execute(text("DELETE FROM schema_version"))
+        assert ensure_schema(old)
+
+        indexes = {index["name"]: index for index in inspect(old).get_indexes("processes")}
+        assert indexes["ix_processes_capability_id_name"]["column_names"] == ["capability_id", "name"]
+        old.dispose()
+
+
+class TestCompression:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(5)
+
+    def setup_method(self):
+        response_cache.clear()
+
+    def test_negotiate(self, monkeypatch):
+        """Test that the accepted encoding with the highest q-value is chosen."""
+        from app import compression
+        from app.compression import negotiate
+        monkeypatch.setattr(compression, "ENCODINGS", ("br", "gzip"))
+        assert negotiate("gzip, deflate, br") == "br"
+        assert negotiate("gzip;q=1.0, br;q=0.5") == "gzip"
+        assert negotiate("br;q=0, *") == "gzip"
+        assert negotiate("deflate, identity") is None
+        assert negotiate("gzip;q=0") is None
+        assert negotiate(None) is None
+        monkeypatch.setattr(compression, "ENCODINGS", ("gzip",))
+        assert negotiate("br") is None
+        assert negotiate("br, gzip;q=0.1") == "gzip"
+
+    def test_cached_list_compressed_once(self, monkeypatch):
+        """Test that a cached body is compressed once and served with its own ETag."""
+        import gzip
+        from app import cache
+        calls = []
+
+        def counting_compress(body, encoding):
+            calls.append(encoding)
+            return gzip.compress(body, mtime=0)
+
+        monkeypatch.setattr(cache, "compress", counting_compress)
+        plain = client.get("/api/capabilities", headers={"Accept-Encoding": "identity"})
+        first = client.get("/api/capabilities", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/api/capabilities", headers={"Accept-Encoding": "gzip"})
+        assert calls == ["gzip"]
+
+        assert "content-encoding" not in plain.headers
+        assert first.headers["content-encoding"] == "gzip"
+        assert first.headers["vary"] == "Accept-Encoding"
+        assert int(first.headers["content-length"]) < len(plain.content)
+        assert first.content == second.content == plain.content
+        assert first.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+        not_modified = client.get("/api/capabilities", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]
+        })
+        assert not_modified.status_code == 304
+        other_encoding = client.get("/api/capabilities", headers={
+            "Accept-Encoding": "identity", "If-None-Match": first.headers["etag"]
+        })
+        assert other_encoding.status_code == 200
+
+    def test_size_threshold(self, monkeypatch):
+        """Test that bodies below the threshold are sent uncompressed."""
+        from app.config import settings
+        detail = client.get("/api/capability/Capability%201", headers={"Accept-Encoding": "gzip"})
+        assert detail.headers["content-encoding"] == "gzip"
+        assert "content-encoding" not in client.get("/api/health").headers
+
+        monkeypatch.setattr(settings, "COMPRESSION_MIN_BYTES", 10 ** 9)
+        assert "content-encoding" not in client.get("/api/capability/Capability%201").headers
+        assert "content-encoding" not in client.get("/api/capabilities").headers
+
+    def test_streamed_export(self):
+        """Test that a streamed body is compressed chunk by chunk into one gzip stream."""
+        import gzip
+        with client.stream("GET", "/api/capabilities/export", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            raw = b"".join(response.iter_raw())
+        lines = gzip.decompress(raw).splitlines()
+        assert [json.loads(line)["name"] for line in lines] == [f"Capability {i}" for i in range(5)]
+
+    def test_disabled(self, monkeypatch):
+        """Test that nothing is compressed with COMPRESSION off."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "COMPRESSION", False)
+        for url in ("/api/capabilities", "/api/capability/Capability%201", "/api/capabilities/export"):
+            response = client.get(url, headers={"Accept-Encoding": "gzip"})
+            assert "content-encoding" not in response.headers
+
+
+class TestResponseCache:
+    @classmethod
+    def setup_class(cls):
+        """Reset the database and the response cache."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_catalog(3)
+
+    def test_cached_body_skips_hierarchy_load(self):
+        """Test that a cached response only runs the data version query."""
+        first = client.get("/api/capabilities")
+        with QueryCounter() as counter:
+            second = client.get("/api/capabilities")
+        assert second.content == first.content
+        assert counter.count == 1
+
+    def test_etag_not_modified(self):
+        """Test that a matching If-None-Match returns 304."""
+        response = client.get("/api/capabilities")
+        etag = response.headers["etag"]
+        assert etag.startswith('"') and etag.endswith('"')
+
+        response = client.get("/api/capabilities", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+        response = client.get("/api/capabilities", headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+
+    def test_data_change_invalidates(self):
+        """Test that new data produces a new body and ETag."""
+        before = client.get("/api/capabilities")
+        seed_catalog(1, start=500)
+        after = client.get("/api/capabilities", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.headers["etag"] != before.headers["etag"]
+        assert len(after.json()) == len(before.json()) + 1
+
+
+class TestPagination:
+    @classmethod
+    def setup_class(cls):
+        """Seed a catalog spanning several pages."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_catalog(7)
+
+    def collect_pages(self, url, limit):
+        names, cursor = [], None
+        while True:
+            params = {"limit": limit}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get(url, params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= limit
+            names.extend(c["name"] for c in page)
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                assert "link" not in response.headers
+                return names
+            assert 'rel="next"' in response.headers["link"]
+
+    @pytest.mark.parametrize("url", ["/api/capabilities", "/api/capabilities/search?keyword=Capability"])
+    def test_pages_cover_catalog(self, url):
+        """Test that walking the cursors returns every capability once."""
+        everything = [c["name"] for c in client.get(url).json()]
+        assert self.collect_pages(url, 3) == everything
+        assert self.collect_pages(url, 7) == everything
+
+    def test_pages_in_snapshot_mode(self):
+        """Test that snapshot pagination matches database pagination."""
+        from_database = self.collect_pages("/api/capabilities/search?keyword=Capability", 2)
+        db = TestingSessionLocal()
+        rebuild_snapshot(db)
+        db.close()
+        try:
+            assert self.collect_pages("/api/capabilities", 2) == from_database
+            assert self.collect_pages("/api/capabilities/search?keyword=Capability", 2) == from_database
+        finally:
+            clear_snapshot()
+
+    def test_page_query_count(self):
+        """Test that a page loads in a fixed number of queries."""
+        response_cache.clear()
+        with QueryCounter() as counter:
+            response = client.get("/api/capabilities?limit=2")
+        assert len(response.json()) == 2
+        assert counter.count <= 7
+
+    def test_cursor_past_end(self):
+        """Test that a cursor past the last capability returns an empty page."""
+        response = client.get("/api/capabilities?limit=5&cursor=100000")
+        assert response.status_code == 200
+        assert response.json() == []
+
+    @pytest.mark.parametrize("url", ["/api/capabilities", "/api/capabilities/search?keyword=Capability"])
+    def test_default_page_size(self, url, monkeypatch):
+        """Test that a request without a limit still loads one bounded page only."""
+        import app.routes
+        from app.config import settings
+        limits = []
+
+        def recording(function):
+            def record(*args, **kwargs):
+                limits.append(kwargs["limit"])
+                return function(*args, **kwargs)
+            return record
+
+        monkeypatch.setattr(app.routes, "build_capability_page", recording(app.routes.build_capability_page))
+        monkeypatch.setattr(app.routes, "page_matches", recording(app.routes.page_matches))
+        response_cache.clear()
+        assert client.get(url).status_code == 200
+        assert limits == [settings.MAX_PAGE_SIZE]
+
+    def test_limit_bounds(self):
+        """Test that the page size is validated."""
+        assert client.get("/api/capabilities?limit=0").status_code == 422
+        assert client.get("/api/capabilities?limit=100000").status_code == 422
+
+
+class TestExport:
+    @classmethod
+    def setup_class(cls):
+        """Seed a catalog spanning several export chunks."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_catalog(5)
+
+    def test_ndjson_matches_list(self, monkeypatch):
+        """Test that the export streams one capability per line."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+
+        response = client.get("/api/capabilities/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        lines = response.text.splitlines()
+        assert [json.loads(line) for line in lines] == client.get("/api/capabilities").json()
+
+    def test_chunked_reads(self, monkeypatch):
+        """Test that the database is read in chunks rather than all at once."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+
+        with QueryCounter() as chunked:
+            client.get("/api/capabilities/export")
+        monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 100)
+        with QueryCounter() as single:
+            client.get("/api/capabilities/export")
+        assert chunked.count == 3 * single.count
+
+
+class TestProjection:
+    @classmethod
+    def setup_class(cls):
+        """Seed a small catalog."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_catalog(3)
+
+    def test_depth_process(self):
+        """Test that depth=process stops below the processes."""
+        response = client.get("/api/capabilities?depth=process")
+        assert response.status_code == 200
+        process = response.json()[0]["processes"][0]
+        assert process["name"] == "Process 0.0"
+        assert process["process_level"] == "Level 0"
+        assert "sub_processes" not in process
+
+    def test_depth_capability(self):
+        """Test that depth=capability leaves out processes entirely."""
+        capability = client.get("/api/capability/Capability%201?depth=capability").json()
+        assert capability["goal"] == "Catalog Goal"
+        assert "processes" not in capability
+
+    def test_depth_application(self):
+        """Test an intermediate depth."""
+        capability = client.get("/api/capability/Capability%201?depth=application").json()
+        application = capability["processes"][0]["sub_processes"][0]["data_entities"][0]["applications"][0]
+        assert application["name"] == "Application 1.0.0.0"
+        assert "apis" not in application
+
+    def test_fields(self):
+        """Test that fields restricts the capability fields."""
+        response = client.get("/api/capabilities/search?keyword=Capability&fields=id,name")
+        assert response.status_code == 200
+        assert all(set(c) == {"id", "name", "score"} for c in response.json())
+
+    def test_unknown_field(self):
+        """Test that unknown fields are rejected."""
+        response = client.get("/api/capabilities?fields=id,bogus")
+        assert response.status_code == 422
+
+    def test_contradictory_depth(self):
+        """Test that processes cannot be asked for below a depth that leaves them out."""
+        response = client.get("/api/capabilities?fields=name,processes&depth=capability")
+        assert response.status_code == 422
+        assert "depth" in response.json()["detail"]
+        response = client.get("/api/capabilities?fields=name,processes&depth=process")
+        assert all(set(c) == {"name", "processes"} and c["processes"] for c in response.json())
+
+    def test_skipped_levels_are_not_queried(self):
+        """Test that levels below the requested depth are not loaded."""
+        with QueryCounter() as full:
+            client.get("/api/capability/Capability%202")
+        with QueryCounter() as shallow:
+            client.get("/api/capability/Capability%202?depth=process")
+        with QueryCounter() as flat:
+            client.get("/api/capability/Capability%202?fields=id,name")
+        assert full.count == 6
+        assert shallow.count == 2
+        assert flat.count == 1
+
+    def test_snapshot_projection(self):
+        """Test that snapshot responses are projected the same way."""
+        urls = [
+            "/api/capabilities?depth=sub_process",
+            "/api/capability/Capability%200?depth=process&fields=name,goal,processes",
+            "/api/capabilities/export?depth=capability",
+        ]
+        from_database = [client.get(url).content for url in urls]
+        db = TestingSessionLocal()
+        rebuild_snapshot(db)
+        db.close()
+        response_cache.clear()
+        try:
+            assert [client.get(url).content for url in urls] == from_database
+        finally:
+            clear_snapshot()
+
+
+class TestFullTextSearch:
+    @classmethod
+    def setup_class(cls):
+        """Seed capabilities whose text sits at different levels."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_test_data()
+        seed_catalog(3)
+
+        db = TestingSessionLocal()
+        sub_vertical = db.query(SubVertical).first()
+        by_api = Capability(name="Cash Management", sub_vertical=sub_vertical)
+        process = Process(name="Reconcile", capability=by_api)
+        sub_process = SubProcess(name="Match", process=process)
+        data_entity = DataEntity(name="Statement", sub_process=sub_process)
+        application = Application(name="Treasury", data_entity=data_entity)
+        API(name="Ledger API", application=application)
+        db.add(by_api)
+        db.add(Capability(name="Ledger Sync", sub_vertical=sub_vertical))
+        db.flush()
+        rebuild_search_index(db)
+        bump_revision(db)
+        db.commit()
+        db.close()
+
+    def search(self, keyword, **params):
+        return client.get("/api/capabilities/search", params={"keyword": keyword, **params})
+
+    def test_ranked_by_relevance(self):
+        """Test that a match on the capability outranks a match on an API."""
+        names = [c["name"] for c in self.search("ledger").json()]
+        assert names == ["Ledger Sync", "Cash Management"]
+
+    def test_matches_deep_levels(self):
+        """Test that text below the capability is searchable."""
+        names = [c["name"] for c in self.search("Test Data Entity").json()]
+        assert names == ["Test Capability"]
+        names = [c["name"] for c in self.search("treasury").json()]
+        assert names == ["Cash Management"]
+
+    def test_prefix_match(self):
+        """Test that words match as prefixes."""
+        names = [c["name"] for c in self.search("recon").json()]
+        assert names == ["Cash Management"]
+
+    def test_operators_are_literal(self):
+        """Test that FTS5 syntax in the keyword does not raise."""
+        assert [c["name"] for c in self.search('ledger "sync').json()] == ["Ledger Sync"]
+        assert self.search("*").status_code == 404
+
+    def test_ranked_pages(self):
+        """Test paging through ranked results."""
+        first = self.search("ledger", limit=1)
+        assert [c["name"] for c in first.json()] == ["Ledger Sync"]
+        second = self.search("ledger", limit=1, cursor=first.headers["x-next-cursor"])
+        assert [c["name"] for c in second.json()] == ["Cash Management"]
+        assert "x-next-cursor" not in second.headers
+
+    def test_like_fallback(self, monkeypatch):
+        """Test the LIKE search used when full-text search is unavailable."""
+        monkeypatch.setattr("app.search.fts_enabled", lambda db: False)
+        names = [c["name"] for c in self.search("capability 1").json()]
+        assert names == ["Capability 1"]
+
+    def test_ensure_builds_empty_index(self):
+        """Test that an empty index is rebuilt for an already seeded catalog."""
+        db = TestingSessionLocal()
+        db.execute(text("DELETE FROM capability_search"))
+        db.commit()
+        assert self.search("ledger").status_code == 404
+        ensure_search_index(db)
+        db.close()
+        assert self.search("ledger").status_code == 200
+
+    def test_ensure_completes_partial_index(self):
+        """Test that an index holding only some capabilities is rebuilt."""
+        db = TestingSessionLocal()
+        # As left by an incremental load refreshing the capabilities it changed
+        db.execute(text("DELETE FROM capability_search"))
+        rebuild_search_index(db, [db.query(Capability.id).filter(Capability.name == "Cash Management").scalar()])
+        db.commit()
+        assert self.search("ledger").status_code == 200
+        assert self.search("sync").status_code == 404
+        ensure_search_index(db)
+        db.close()
+        assert self.search("sync").json()[0]["name"] == "Ledger Sync"
+
+
+class TestFuzzySearch:
+    @classmethod
+    def setup_class(cls):
+        """Seed capabilities with distinct names."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        db = TestingSessionLocal()
+        goal = Goal(name="Fuzzy Goal")
+        sub_vertical = SubVertical(name="Fuzzy Sub-Vertical", vertical=Vertical(name="Fuzzy Vertical", goal=goal))
+        db.add(Capability(
+            name="Portfolio Monitoring",
+            description="Track portfolio company performance",
+            sub_vertical=sub_vertical,
+        ))
+        reporting = Capability(name="Investor Reporting", sub_vertical=sub_vertical)
+        Process(name="Quarterly Valuation", capability=reporting)
+        db.add(reporting)
+        bump_revision(db)
+        db.commit()
+        db.close()
+
+    def fuzzy(self, keyword, **params):
+        return client.get(
+            "/api/capabilities/search", params={"keyword": keyword, "fuzzy": "true", **params}
+        )
+
+    def test_misspelt_name(self):
+        """Test that a misspelt keyword still matches."""
+        response = self.fuzzy("portfolo monitring")
+        assert response.status_code == 200
+        result = response.json()
+        assert result[0]["name"] == "Portfolio Monitoring"
+        assert 0 < result[0]["score"] <= 1
+
+    def test_process_match(self):
+        """Test that process names are matched."""
+        names = [c["name"] for c in self.fuzzy("quartely valuaton").json()]
+        assert names == ["Investor Reporting"]
+
+    def test_no_match(self):
+        """Test that unrelated keywords do not match."""
+        assert self.fuzzy("zzzz qqqq").status_code == 404
+
+    def test_index_refreshes_on_data_change(self):
+        """Test that new data is picked up incrementally."""
+        self.fuzzy("portfolio")
+        db = TestingSessionLocal()
+        db.add(Capability(name="Deal Sourcing", sub_vertical=db.query(SubVertical).first()))
+        bump_revision(db)
+        db.commit()
+        db.close()
+        size = len(fuzzy_index)
+        names = [c["name"] for c in self.fuzzy("deal sorcing").json()]
+        assert names == ["Deal Sourcing"]
+        assert len(fuzzy_index) == size + 1
+
+
+class TestTrigramIndex:
+    def test_incremental_update(self):
+        """Test that update only touches changed documents."""
+        index = TrigramIndex()
+        assert index.update([(("capability", 1, "name"), 1, "Alpha"), (("capability", 2, "name"), 2, "Beta")]) == (2, 0)
+        assert index.update([(("capability", 1, "name"), 1, "Alpha"), (("capability", 2, "name"), 2, "Gamma")]) == (1, 1)
+        assert index.search("gamma") == [(2, 1.0)]
+        assert index.search("beta") == []
+        assert index.update([]) == (0, 2)
+        assert len(index) == 0
+
+    def test_exact_match_ranks_first(self):
+        """Test that closer matches rank ahead of partial ones."""
+        index = TrigramIndex()
+        index.update([
+            (("capability", 1, "name"), 1, "Capability 10"),
+            (("capability", 2, "name"), 2, "Capability 1"),
+        ])
+        assert [capability_id for capability_id, _ in index.search("capability 1")] == [2, 1]
+
+
+class TestBatchLookup:
+    @classmethod
+    def setup_class(cls):
+        """Seed a small catalog."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+        seed_catalog(10)
+
+    def test_names_and_ids(self):
+        """Test lookup by names and ids in request order."""
+        ids = {c["name"]: c["id"] for c in client.get("/api/capabilities?fields=id,name").json()}
+        response = client.post("/api/capabilities/batch", json={
+            "names": ["Capability 3", "Missing", "Capability 1"],
+            "ids": [ids["Capability 5"], ids["Capability 3"], 99999],
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert [c["name"] for c in data["capabilities"]] == ["Capability 3", "Capability 1", "Capability 5"]
+        assert data["missing_names"] == ["Missing"]
+        assert data["missing_ids"] == [99999]
+        assert data["capabilities"][0]["processes"][0]["sub_processes"]
+
+    def test_matches_single_lookup(self):
+        """Test that batch results match the single capability endpoint."""
+        single = client.get("/api/capability/Capability%204").json()
+        batch = client.post("/api/capabilities/batch", json={"names": ["Capability 4"]}).json()
+        assert batch["capabilities"] == [single]
+
+    def test_query_count_is_constant(self):
+        """Test that the batch is resolved with a fixed number of queries."""
+        with QueryCounter() as small:
+            client.post("/api/capabilities/batch", json={"names": ["Capability 0"]})
+        with QueryCounter() as large:
+            client.post("/api/capabilities/batch", json={"names": [f"Capability {i}" for i in range(10)]})
+        assert large.count == small.count
+
+    def test_projection(self):
+        """Test that depth and fields apply to batch results."""
+        response = client.post(
+            "/api/capabilities/batch?fields=name", json={"names": ["Capability 2"]}
+        )
+        assert response.json()["capabilities"] == [{"name": "Capability 2"}]
+
+    def test_empty_and_oversized(self):
+        """Test empty batches and the batch size limit."""
+        response = client.post("/api/capabilities/batch", json={})
+        assert response.json() == {"capabilities": [], "missing_names": [], "missing_ids": []}
+        response = client.post("/api/capabilities/batch", json={"ids": list(range(501))})
+        assert response.status_code == 422
+
+    def test_snapshot_mode(self):
+        """Test that snapshot batches match database batches without SQL."""
+        body = {"names": ["Capability 7", "Missing"], "ids": [1]}
+        from_database = client.post("/api/capabilities/batch", json=body).json()
+        db = TestingSessionLocal()
+        rebuild_snapshot(db)
+        db.close()
+        try:
+            with QueryCounter() as counter:
+                from_snapshot = client.post("/api/capabilities/batch", json=body).json()
+        finally:
+            clear_snapshot()
+        assert from_snapshot == from_database
+        assert counter.count == 0
+
+
+class TestSeeder:
+    CSV = (
+        "Goal,Vertical,Sub-Vertical,Capability,Capability Description ,Process,"
+        "Process Description,Process Level,Process Category,Sub-Process,"
+        "Sub-Process Description,Data Entity,Application,API (Assumption)\n"
+        "G1,V1,SV1,Cap A,First, P1,Desc 1,L1,C1,SP1,SP desc,DE1,App 1; App 2,Api 1;Api 2\n"
+        "G1,V1,SV1,Cap A,Ignored,P1,Ignored,L2,C2,SP1,Ignored,DE1,App 2,Api 2\n"
+        "G1,V1,SV1,Cap A,,P2,,,C1,SP1,,DE2,,\n"
+        "G1,V1,SV1,Cap B,Second,P1,,L2,,,,,,\n"
+        "G2,,SV2,Cap C,Skipped,P1,,,,,,,,\n"
+    )
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+
+    def test_catalog_rows(self, tmp_path):
+        """Test that each level is deduplicated and keyed like the source rows."""
+        path = tmp_path / "catalog.csv"
+        path.write_text(self.CSV)
+        rows = catalog_rows(read_catalog(str(path)))
+
+        assert [goal["name"] for goal in rows[Goal]] == ["G1", "G2"]
+        assert [capability["name"] for capability in rows[Capability]] == ["Cap A", "Cap B"]
+        assert rows[Capability][0]["description"] == "First"
+        assert [(p["name"], p["capability_id"]) for p in rows[Process]] == [
+            ("P1", 1), ("P2", 1), ("P1", 2)
+        ]
+        assert rows[Process][0]["description"] == "Desc 1"
+        assert [level["name"] for level in rows[ProcessLevel]] == ["L1", "L2"]
+        assert [p["process_level_id"] for p in rows[Process]] == [1, None, 2]
+        assert [p["process_category_id"] for p in rows[Process]] == [1, 1, None]
+        assert [(a["name"], a["data_entity_id"]) for a in rows[Application]] == [
+            ("App 1", 1), ("App 2", 1)
+        ]
+        assert sorted((a["name"], a["application_id"]) for a in rows[API]) == [
+            ("Api 1", 1), ("Api 1", 2), ("Api 2", 1), ("Api 2", 2)
+        ]
+
+    def test_seed_database(self, tmp_path):
+        """Test that a seeded catalog is served by the API."""
+        path = tmp_path / "catalog.csv"
+        path.write_text(self.CSV)
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([SeedSource("pe", str(path))], db)
+        finally:
+            db.close()
+
+        response = client.get("/api/capability/Cap A")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["description"] == "First"
+        assert data["goal"] == "G1"
+        assert [process["name"] for process in data["processes"]] == ["P1", "P2"]
+        entity = data["processes"][0]["sub_processes"][0]["data_entities"][0]
+        assert [app["name"] for app in entity["applications"]] == ["App 1", "App 2"]
+        assert client.get("/api/capabilities/search?keyword=Second").json()[0]["name"] == "Cap B"
+
+    def test_missing_file(self, tmp_path):
+        """Test that a missing CSV is reported rather than raised."""
+        assert seed_database([SeedSource("pe", str(tmp_path / "missing.csv"))]) is False
+
+    def test_parse_sources_in_process(self, monkeypatch, tmp_path):
+        """Test that only sources past the size threshold go to worker processes."""
+        from concurrent.futures import ThreadPoolExecutor
+        import app.seed
+        from app.config import settings
+
+        pools = []
+
+        def recording_pool(workers, mp_context=None):
+            pools.append(workers)
+            return ThreadPoolExecutor(workers)
+
+        monkeypatch.setattr(app.seed, "ProcessPoolExecutor", recording_pool)
+        monkeypatch.setattr(settings, "SEED_WORKERS", 4)
+        header, row = self.CSV.splitlines(keepends=True)[:2]
+        sources = []
+        for dataset, rows in (("small", 1), ("large", 200), ("larger", 300), ("tiny", 1)):
+            path = tmp_path / f"{dataset}.csv"
+            path.write_text(header + row * rows)
+            sources.append(SeedSource(dataset, str(path)))
+        expected = [parse_source(source) for source in sources]
+
+        monkeypatch.setattr(settings, "SEED_PARALLEL_MIN_BYTES", 32 * 1024 * 1024)
+        assert list(_parse_sources(sources)) == expected
+        assert pools == []
+
+        monkeypatch.setattr(settings, "SEED_PARALLEL_MIN_BYTES", os.path.getsize(sources[1].path))
+        assert list(_parse_sources(sources)) == expected
+        assert pools == [2]
+
+
+class TestIncrementalSeed:
+    HEADER = (
+        "Goal,Vertical,Sub-Vertical,Capability,Capability Description,Process,"
+        "Process Description,Process Level,Process Category,Sub-Process,"
+        "Sub-Process Description,Data Entity,Application,API (Assumption)\n"
+    )
+    ROWS = [
+        "G1,V1,SV1,Ledger,Books,P1,Post,L1,C1,SP1,Desc,DE1,App 1,Api 1\n",
+        "G1,V1,SV1,Ledger,Books,P2,Close,L1,C1,SP2,Desc,DE2,App 2,Api 2\n",
+        "G1,V1,SV1,Treasury,Cash,P1,Sweep,L2,C1,SP1,Desc,DE1,App 3,Api 3\n",
+    ]
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+
+    def seed(self, path, rows):
+        path.write_text(self.HEADER + "".join(rows))
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([SeedSource("pe", str(path))], db)
+            return catalog_version(db)
+        finally:
+            db.close()
+
+    def ids(self, model):
+        db = TestingSessionLocal()
+        try:
+            return {row.name: row.id for row in db.query(model.id, model.name)}
+        finally:
+            db.close()
+
+    def test_reseed_applies_changes_only(self, tmp_path):
+        """Test that a reseed inserts, updates and removes only what changed."""
+        path = tmp_path / "catalog.csv"
+        version = self.seed(path, self.ROWS)
+        capability_ids = self.ids(Capability)
+
+        with QueryCounter() as counter:
+            assert self.seed(path, self.ROWS) == version
+        assert counter.count <= 3
+
+        rows = [self.ROWS[0].replace("Books", "General ledger"), self.ROWS[2]]
+        rows.append("G1,V1,SV1,Payments,Wires,P1,Send,L1,C1,,,,,\n")
+        updated = self.seed(path, rows)
+        assert updated != version
+
+        assert self.ids(Capability) == {**capability_ids, "Payments": max(capability_ids.values()) + 1}
+        data = client.get("/api/capability/Ledger").json()
+        assert data["description"] == "General ledger"
+        assert [process["name"] for process in data["processes"]] == ["P1"]
+        assert sorted(self.ids(Application)) == ["App 1", "App 3"]
+        assert client.get("/api/capabilities/search?keyword=wires").json()[0]["name"] == "Payments"
+        assert client.get("/api/capabilities/search?keyword=close").status_code == 404
+
+        db = TestingSessionLocal()
+        try:
+            assert db.query(SeedState).one().revision == 2
+            assert db.query(SeedNode).count() == sum(
+                db.query(model).count()
+                for model in (Goal, Vertical, SubVertical, Capability, ProcessLevel,
+                              ProcessCategory, Process, SubProcess, DataEntity,
+                              Application, API)
+            )
+        finally:
+            db.close()
+
+    def test_removed_capability(self, tmp_path):
+        """Test that removing a capability removes its hierarchy and index row."""
+        path = tmp_path / "catalog.csv"
+        self.seed(path, self.ROWS)
+        self.seed(path, self.ROWS[2:])
+
+        assert list(self.ids(Capability)) == ["Treasury"]
+        assert list(self.ids(Process)) == ["P1"]
+        assert client.get("/api/capabilities/search?keyword=ledger").status_code == 404
+        assert client.get("/api/capabilities/search?keyword=treasury").status_code == 200
+
+    def test_catalog_without_fingerprints(self, tmp_path):
+        """Test that a catalog loaded before fingerprints were kept is diffed in place."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        path = tmp_path / "catalog.csv"
+        path.write_text(self.HEADER + "".join(self.ROWS))
+        db = TestingSessionLocal()
+        try:
+            write_catalog(db, catalog_rows(read_catalog(str(path))))
+            db.commit()
+            counts = apply_catalog(db, catalog_rows(read_catalog(str(path))))
+            db.commit()
+            assert counts == {"inserted": 0, "updated": 0, "removed": 0}
+            assert db.query(SeedNode).count() > 0
+        finally:
+            db.close()
+
+        self.seed(path, self.ROWS[:2])
+        assert list(self.ids(Capability)) == ["Ledger"]
+
+
+class TestStreamingSeed:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+
+    def tables(self):
+        db = TestingSessionLocal()
+        try:
+            return {
+                model.__tablename__: sorted(tuple(row) for row in db.execute(model.__table__.select()))
+                for model in SEED_ORDER
+            }
+        finally:
+            db.close()
+
+    def test_chunks_match_whole_file(self, tmp_path):
+        """Test that chunked rows match the rows of the whole file."""
+        path = tmp_path / "catalog.csv"
+        path.write_text(TestIncrementalSeed.HEADER + "".join(TestIncrementalSeed.ROWS * 2))
+        whole = catalog_rows(read_catalog(str(path)))
+
+        known = {model: IdMap() for model in SEED_ORDER}
+        chunked = {model: [] for model in SEED_ORDER}
+        for chunk in iter_catalog(str(path), 2):
+            for model, rows in catalog_rows(chunk, known).items():
+                chunked[model].extend(rows)
+        assert chunked == whole
+        assert known[Capability] == {"Ledger": 1, "Treasury": 2}
+        assert known[Process] == {(1, "P1"): 1, (1, "P2"): 2, (2, "P1"): 3}
+
+    def test_streaming_seed(self, tmp_path):
+        """Test that a streamed seed loads the same catalog and reloads it when changed."""
+        path = tmp_path / "catalog.csv"
+        rows = TestIncrementalSeed.ROWS
+        path.write_text(TestIncrementalSeed.HEADER + "".join(rows))
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([SeedSource("pe", str(path))], db, chunk_size=1)
+        finally:
+            db.close()
+        streamed = self.tables()
+        assert len(streamed["capabilities"]) == 2
+        assert client.get("/api/capabilities/search?keyword=treasury").status_code == 200
+
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([SeedSource("pe", str(path))], db)
+        finally:
+            db.close()
+        assert self.tables() == streamed
+
+        path.write_text(TestIncrementalSeed.HEADER + "".join(rows[2:]))
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([SeedSource("pe", str(path))], db, chunk_size=1)
+        finally:
+            db.close()
+        assert [name for _, name, *_ in self.tables()["capabilities"]] == ["Treasury"]
+        assert client.get("/api/capabilities/search?keyword=ledger").status_code == 404
+
+
+class TestDatasets:
+    PE_HEADER = TestIncrementalSeed.HEADER.replace("API (Assumption)", "API")
+    PE_ROWS = TestIncrementalSeed.ROWS
+    EBRD_ROWS = [
+        "G9,V9,SV9,Ledger,Bank ledger,P9,Reconcile,L9,C9,SP9,Desc,DE9,App 9,Api 9\n",
+        "G9,V9,SV9,Trade Finance,Guarantees,P8,Issue,L9,C9,SP8,Desc,DE8,App 8,Api 8\n",
+    ]
+
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        response_cache.clear()
+
+    def seed(self, tmp_path, pe_rows=PE_ROWS, ebrd_rows=EBRD_ROWS):
+        pe = tmp_path / "pe.csv"
+        pe.write_text(self.PE_HEADER + "".join(pe_rows))
+        ebrd = tmp_path / "ebrd.csv"
+        ebrd.write_text(TestIncrementalSeed.HEADER + "".join(ebrd_rows))
+        db = TestingSessionLocal()
+        try:
+            assert seed_database([
+                SeedSource("pe", str(pe), {"API": "API (Assumption)"}),
+                SeedSource("ebrd", str(ebrd)),
+            ], db)
+        finally:
+            db.close()
+
+    def names(self, response):
+        return [capability["name"] for capability in response.json()]
+
+    def test_datasets_share_names(self, tmp_path):
+        """Test that each dataset keeps its own copy of a shared capability name."""
+        self.seed(tmp_path)
+
+        assert self.names(client.get("/api/capabilities")) == [
+            "Ledger", "Treasury", "Ledger", "Trade Finance"
+        ]
+        assert self.names(client.get("/api/capabilities?dataset=ebrd")) == ["Ledger", "Trade Finance"]
+        assert client.get("/api/capabilities?dataset=other").status_code == 404
+
+        assert client.get("/api/capability/Ledger").json()["description"] == "Books"
+        data = client.get("/api/capability/Ledger?dataset=ebrd").json()
+        assert data["description"] == "Bank ledger"
+        assert data["dataset"] == "ebrd"
+        assert client.get("/api/capability/Treasury?dataset=ebrd").status_code == 404
+
+        apis = client.get("/api/capability/Ledger?dataset=pe").json()
+        entity = apis["processes"][0]["sub_processes"][0]["data_entities"][0]
+        assert entity["applications"][0]["apis"][0]["name"] == "Api 1"
+
+    def test_dataset_filters(self, tmp_path):
+        """Test that search, batch and export honour the dataset filter."""
+        self.seed(tmp_path)
+
+        search = client.get("/api/capabilities/search?keyword=ledger&dataset=ebrd")
+        assert [c["description"] for c in search.json()] == ["Bank ledger"]
+        fuzzy = client.get("/api/capabilities/search?keyword=ledgr&fuzzy=true&dataset=pe")
+        assert [c["description"] for c in fuzzy.json()] == ["Books"]
+
+        batch = client.post(
+            "/api/capabilities/batch?dataset=ebrd", json={"names": ["Ledger", "Treasury"]}
+        ).json()
+        assert [c["description"] for c in batch["capabilities"]] == ["Bank ledger"]
+        assert batch["missing_names"] == ["Treasury"]
+
+        lines = client.get("/api/capabilities/export?dataset=pe").text.splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["Ledger", "Treasury"]
+
+    def test_dataset_filters_snapshot(self, tmp_path):
+        """Test that snapshot mode serves the same dataset partitions."""
+        self.seed(tmp_path)
+        rebuild_snapshot(TestingSessionLocal())
+        try:
+            assert self.names(client.get("/api/capabilities?dataset=ebrd")) == ["Ledger", "Trade Finance"]
+            assert client.get("/api/capability/Ledger").json()["description"] == "Books"
+            assert client.get("/api/capability/Ledger?dataset=ebrd").json()["description"] == "Bank ledger"
+            search = client.get("/api/capabilities/search?keyword=ledger&dataset=pe")
+            assert [c["description"] for c in search.json()] == ["Books"]
+        finally:
+            clear_snapshot()
+
+    def test_reseed_one_dataset(self, tmp_path):
+        """Test that changing one source leaves the other dataset untouched."""
+        self.seed(tmp_path)
+        db = TestingSessionLocal()
+        try:
+            ebrd = {row.id for row in db.query(Capability.id).filter(Capability.dataset == "ebrd")}
+        finally:
+            db.close()
+
+        self.seed(tmp_path, pe_rows=self.PE_ROWS[2:])
+
+        db = TestingSessionLocal()
+        try:
+            revisions = dict(db.query(SeedState.dataset, SeedState.revision))
+            assert {row.id for row in db.query(Capability.id).filter(Capability.dataset == "ebrd")} == ebrd
+        finally:
+            db.close()
+        assert revisions["ebrd"] < revisions["pe"]
+        assert self.names(client.get("/api/capabilities?dataset=pe")) == ["Treasury"]
+
+    def test_upgrade_schema(self, tmp_path):
+        """Test that a database created before datasets is upgraded in place."""
+        old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        with old.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE capabilities (id INTEGER PRIMARY KEY, name VARCHAR(255), "
+                "description TEXT, sub_vertical_id INTEGER)"
+            ))
+            conn.execute(text("CREATE UNIQUE INDEX ix_capabilities_name ON capabilities (name)"))
+            conn.execute(text("INSERT INTO capabilities (id, name) VALUES (1, 'Ledger')"))
+            conn.execute(text(
+                "CREATE TABLE seed_state (id INTEGER PRIMARY KEY, content_hash VARCHAR(64))"
+            ))
+        Base.metadata.create_all(bind=old)
+        upgrade_schema(old)
+        upgrade_schema(old)
+
+        indexes = {index["name"]: index for index in inspect(old).get_indexes("capabilities")}
+        assert not indexes["ix_capabilities_name"]["unique"]
+        assert indexes["ix_capabilities_dataset_name"]["column_names"] == ["dataset", "name"]
+        assert {column["name"] for column in inspect(old).get_columns("seed_state")} == {
+            "dataset", "content_hash", "revision"
+        }
+        with old.begin() as conn:
+            assert conn.execute(text("SELECT dataset FROM capabilities")).scalar() == "pe"
+            conn.execute(text("INSERT INTO capabilities (id, name, dataset) VALUES (2, 'Ledger', 'ebrd')"))
+        old.dispose()
+
+
+class TestImpactLookup:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(3)
+        db = TestingSessionLocal()
+        try:
+            # A second application named like one under Capability 0
+            capability = db.query(Capability).filter(Capability.name == "Capability 2").one()
+            data_entity = capability.processes[0].sub_processes[0].data_entities[0]
+            db.add(Application(name="Application 0.0.0.0", data_entity=data_entity))
+            db.add(Application(name="Orphan Application"))
+            db.commit()
+        finally:
+            db.close()
+
+    def names(self, response):
+        assert response.status_code == 200
+        return [capability["name"] for capability in response.json()]
+
+    def test_application_capabilities(self):
+        """Test that every application with the name leads to its capability, once."""
+        response = client.get("/api/applications/Application 0.0.0.0/capabilities")
+        assert self.names(response) == ["Capability 0", "Capability 2"]
+        assert set(response.json()[0]) == {"id", "name", "description"}
+        assert self.names(client.get("/api/applications/Application 1.1.1.0/capabilities")) == [
+            "Capability 1"
+        ]
+
+    def test_api_capabilities(self):
+        """Test that APIs resolve through their application to capabilities."""
+        assert self.names(client.get("/api/apis/API 2.0.1.1/capabilities")) == ["Capability 2"]
+
+    def test_dataset_filter(self):
+        """Test that capabilities outside the requested dataset are left out."""
+        url = "/api/applications/Application 0.0.0.0/capabilities"
+        assert self.names(client.get(f"{url}?dataset=pe")) == ["Capability 0", "Capability 2"]
+        assert self.names(client.get(f"{url}?dataset=ebrd")) == []
+
+    def test_unknown_and_orphaned(self):
+        """Test that unknown names are 404 and applications without a capability give none."""
+        assert client.get("/api/applications/Nonexistent/capabilities").status_code == 404
+        assert client.get("/api/apis/Nonexistent/capabilities").status_code == 404
+        assert self.names(client.get("/api/applications/Orphan Application/capabilities")) == []
+
+    def test_single_query(self):
+        """Test that a lookup is one statement."""
+        with QueryCounter() as counter:
+            client.get("/api/apis/API 1.0.0.0/capabilities")
+        assert counter.count == 1
+
+
+class TestClosure:
+    @classmethod
+    def setup_class(cls):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(3)
+        db = TestingSessionLocal()
+        try:
+            rebuild_closure(db)
+            db.commit()
+        finally:
+            db.close()
+
+    def goal_id(self, name, dataset):
+        db = TestingSessionLocal()
+        try:
+            return db.query(Goal.id).filter(Goal.name == name, Goal.dataset == dataset).scalar()
+        finally:
+            db.close()
+
+    def test_ancestors(self):
+        """Test that the ancestor chain of a node is returned nearest first."""
+        response = client.get("/api/hierarchy/api/1/ancestors")
+        assert response.status_code == 200
+        ancestors = [(node["level"], node["depth"]) for node in response.json()]
+        assert ancestors == [
+            ("application", 1), ("data_entity", 2), ("sub_process", 3), ("process", 4),
+            ("capability", 5), ("process_category", 5), ("process_level", 5),
+            ("sub_vertical", 6), ("vertical", 7), ("goal", 8),
+        ]
+        assert response.json()[4]["name"] == "Capability 0"
+        assert response.json()[-1]["name"] == "Catalog Goal"
+        assert client.get("/api/hierarchy/goal/1/ancestors").json() == []
+
+    def test_subtree_counts(self):
+        """Test that descendants are counted per level, in hierarchy order."""
+        response = client.get("/api/hierarchy/vertical/1/counts")
+        assert response.status_code == 200
+        assert response.json() == {
+            "level": "vertical",
+            "id": 1,
+            "counts": {
+                "sub_vertical": 1, "capability": 3, "process": 6, "sub_process": 12,
+                "data_entity": 12, "application": 24, "api": 24,
+            },
+        }
+        counts = client.get("/api/hierarchy/process_level/1/counts").json()["counts"]
+        assert counts["process"] == 6 and "capability" not in counts
+        assert client.get("/api/hierarchy/api/1/counts").json()["counts"] == {}
+
+    def test_single_query(self):
+        """Test that ancestors and counts each cost one statement."""
+        for url in ("/api/hierarchy/api/5/ancestors", "/api/hierarchy/goal/1/counts"):
+            with QueryCounter() as counter:
+                assert client.get(url).status_code == 200
+            assert counter.count == 1
+
+    def test_unknown_node(self):
+        """Test that unknown nodes are 404 and unknown levels 422."""
+        assert client.get("/api/hierarchy/capability/999/ancestors").status_code == 404
+        assert client.get("/api/hierarchy/capability/999/counts").status_code == 404
+        assert client.get("/api/hierarchy/division/1/counts").status_code == 422
+
+    def test_seeder_maintains_closure(self, tmp_path):
+        """Test that loads rebuild the closure rows of the datasets they changed."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        datasets = TestDatasets()
+        datasets.seed(tmp_path)
+        pe, ebrd = self.goal_id("G1", "pe"), self.goal_id("G9", "ebrd")
+        assert client.get(f"/api/hierarchy/goal/{pe}/counts").json()["counts"]["capability"] == 2
+        assert client.get(f"/api/hierarchy/goal/{ebrd}/counts").json()["counts"]["capability"] == 2
+
+        datasets.seed(tmp_path, ebrd_rows=datasets.EBRD_ROWS[:1])
+        assert client.get(f"/api/hierarchy/goal/{ebrd}/counts").json()["counts"] == {
+            "vertical": 1, "sub_vertical": 1, "capability": 1, "process": 1, "sub_process": 1,
+            "data_entity": 1, "application": 1, "api": 1,
+        }
+        assert client.get(f"/api/hierarchy/goal/{pe}/counts").json()["counts"]["api"] == 3
+
+    def node_id(self, model, name):
+        db = TestingSessionLocal()
+        try:
+            return db.query(model.id).filter(model.name == name).scalar()
+        finally:
+            db.close()
+
+    def closure_rows(self):
+        db = TestingSessionLocal()
+        try:
+            return set(db.execute(select(*CatalogClosure.__table__.columns)).all())
+        finally:
+            db.close()
+
+    def test_incremental_updates(self, tmp_path, monkeypatch):
+        """Test that reseeds rewrite only the changed subtrees, matching a full rebuild."""
+        import app.seed
+        # Most of this small catalog changes; keep it on the incremental path
+        monkeypatch.setattr(app.seed, "CLOSURE_REBUILD_SHARE", 1.0)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        datasets = TestDatasets()
+        datasets.seed(tmp_path)
+        ebrd = {row for row in self.closure_rows() if row.dataset == "ebrd"}
+
+        rows = [
+            # Process moved to another level and an API removed; the second
+            # row's process and everything below it removed
+            datasets.PE_ROWS[0].replace(",L1,", ",L2,").replace(",Api 1", ""),
+            # Capability moved to another vertical, taking its subtree along
+            datasets.PE_ROWS[2].replace("G1,V1,SV1,", "G1,V2,SV2,"),
+            "G1,V1,SV1,Payments,Wires,P1,Send,L3,C1,SP1,,DE3,App 4,Api 4\n",
+        ]
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            datasets.seed(tmp_path, pe_rows=rows)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert not [statement for statement in statements if "INDEX" in statement]
+        assert not [
+            statement for statement in statements
+            if statement.startswith("DELETE FROM catalog_closure") and "IN (" not in statement
+        ]
+
+        incremental = self.closure_rows()
+        assert {row for row in incremental if row.dataset == "ebrd"} == ebrd
+        db = TestingSessionLocal()
+        try:
+            rebuild_closure(db)
+            db.commit()
+        finally:
+            db.close()
+        assert incremental == self.closure_rows()
+
+        treasury = self.node_id(Capability, "Treasury")
+        ancestors = client.get(f"/api/hierarchy/capability/{treasury}/ancestors").json()
+        assert [node["name"] for node in ancestors] == ["SV2", "V2", "G1"]
+
+    def test_update_plans(self):
+        """Test that rewriting a chunk of nodes looks their parents up by id."""
+        from app.closure import _closure_statements
+        from app.seed import DELETE_CHUNK_SIZE
+        # Walking every closure row of the parent's table per chunk makes
+        # large loads quadratic
+        walks = re.compile(r"SEARCH catalog_closure USING (COVERING )?INDEX \w+ \(descendant_table=\?\)")
+        chunk = list(range(1, DELETE_CHUNK_SIZE + 1))
+        plans = []
+        with engine.connect() as conn:
+            for model in SEED_ORDER:
+                for statement in _closure_statements(model, ids=chunk):
+                    sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+                    plans.extend(row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+        assert plans
+        assert not [detail for detail in plans if walks.fullmatch(detail)]
+
+    def test_fresh_dataset_rebuilt(self, tmp_path, monkeypatch):
+        """Test that loading a whole dataset rebuilds its closure rows in one pass."""
+        import app.closure
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        calls = []
+        for name in ("rebuild_closure", "update_closure"):
+            function = getattr(app.closure, name)
+            monkeypatch.setattr(
+                app.closure, name,
+                lambda *args, name=name, function=function: calls.append(name) or function(*args)
+            )
+        TestDatasets().seed(tmp_path)
+        assert calls == ["rebuild_closure", "rebuild_closure"]
+
+    def test_ensure_closure(self):
+        """Test that a catalog seeded before the closure table existed gets one."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(2)
+        db = TestingSessionLocal()
+        try:
+            ensure_closure(db)
+            with QueryCounter() as counter:
+                ensure_closure(db)
+            assert counter.count == 2
+        finally:
+            db.close()
+        assert client.get("/api/hierarchy/goal/1/counts").json()["counts"]["capability"] == 2
+
+    def test_ensure_incomplete_closure(self):
+        """Test that a closure pairing nodes only with themselves is rebuilt."""
+        from sqlalchemy import delete
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        seed_catalog(2)
+        db = TestingSessionLocal()
+        try:
+            rebuild_closure(db)
+            # As left by a seeder rewriting only changed nodes of a catalog
+            # that had no closure rows yet
+            db.execute(delete(CatalogClosure).where(CatalogClosure.depth > 0))
+            db.commit()
+            ensure_closure(db)
+        finally:
+            db.close()
+        ancestors = client.get("/api/hierarchy/capability/1/ancestors").json()
+        assert [node["level"] for node in ancestors] == ["sub_vertical", "vertical", "goal"]
+
+
+class TestStartup:
+    def test_schema_version_short_circuit(self, tmp_path):
+        """Test that a database with the current schema version skips the DDL checks."""
+        fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        assert ensure_schema(fresh)
+
+        statements = []
+        event.listen(fresh, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        assert not ensure_schema(fresh)
+        assert len(statements) == 1
+
+        with fresh.begin() as conn:
+            conn.execute(text("DELETE FROM schema_version"))
+        assert ensure_schema(fresh)
+        assert not ensure_schema(fresh)
+        fresh.dispose()
+
+    def test_import_without_pandas(self):
+        """Test that starting the app does not import pandas until a source is parsed."""
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, main; print('pandas' in sys.modules)"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "False"
+
+
+class TestAsyncDatabaseUrl:
+    @pytest.mark.parametrize("url, expected", [
+        ("sqlite:///./PE_compass.db", "sqlite+aiosqlite:///./PE_compass.db"),
+        ("postgresql://u:p@db/pe", "postgresql+asyncpg://u:p@db/pe"),
+        ("postgresql+psycopg2://u:p@db/pe", "postgresql+asyncpg://u:p@db/pe"),
+        ("postgres://u:p@db/pe", "postgresql+asyncpg://u:p@db/pe"),
+        ("mssql+pyodbc://db/pe", "mssql+pyodbc://db/pe"),
+    ])
+    def test_async_driver(self, url, expected):
+        """Test that sync URLs map to their async drivers."""
+        assert async_database_url(url) == expected
+
+
+class TestSqliteTuning:
+    def test_profile_applied(self, tmp_path):
+        """Test that new connections get the tuning profile."""
+        tuned = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+        configure_sqlite(tuned)
+        with tuned.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+            assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2
+            assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == -65536
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 0
+
+    def test_read_only_readers(self, tmp_path):
+        """Test that reader connections refuse writes."""
+        url = f"sqlite:///{tmp_path / 'readers.db'}"
+        writer = create_engine(url)
+        configure_sqlite(writer)
+        Base.metadata.create_all(bind=writer)
+
+        reader = create_engine(url)
+        configure_sqlite(reader, read_only=True)
+        with reader.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+            assert conn.exec_driver_sql("SELECT count(*) FROM goals").scalar() == 0
+            with pytest.raises(Exception, match="readonly"):
+                conn.exec_driver_sql("INSERT INTO goals (name) VALUES ('x')")
+
+    def test_disabled(self, tmp_path, monkeypatch):
+        """Test that the profile can be switched off."""
+        from app.config import settings
+        monkeypatch.setattr(settings, "SQLITE_TUNING", False)
+        plain = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+        configure_sqlite(plain)
+        with plain.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])